@@ -66,6 +66,11 @@ Example usage:
         # In your activity's do_expose_event, put in a call to redraw_sprites
         self.sprites.redraw_sprites(event.area, cairo_context)
 
+        # Changes to sprites are collected as damaged rectangles, which
+        # are merged and queued for redraw once per main-loop iteration.
+        # Other drawing can add its own damage.
+        self.sprites.add_damage(x, y, width, height)
+
 # method for converting SVG to a gtk pixbuf
 def svg_str_to_pixbuf(svg_string):
     pl = GdkPixbuf.PixbufLoader('svg')
@@ -75,13 +80,43 @@ def svg_str_to_pixbuf(svg_string):
     return pixbuf
 
 '''
+from collections import OrderedDict
+
 import cairo
 
 from gi.repository import Gdk
 from gi.repository import GdkPixbuf
+from gi.repository import GLib
 from gi.repository import Pango
 from gi.repository import PangoCairo
 
+# Size (in pixels) of the cells of the grid used to find sprites by position
+GRID_SIZE = 128
+
+# Label sizes, shared by all of the sprites:
+# (text, font, Pango size) -> (width, height) in pixels
+_label_sizes = OrderedDict()
+_LABEL_SIZES = 4096
+_LABEL_PADDING = 4  # Room around the rendered label for overhanging glyphs
+
+
+def _label_size(cr, text, fd, font, size):
+    ''' The size of text in font fd (named font) at size (in Pango
+    units) '''
+    key = (text, font, size)
+    wh = _label_sizes.get(key)
+    if wh is None:
+        pl = PangoCairo.create_layout(cr)
+        pl.set_text(text, -1)
+        fd.set_size(size)
+        pl.set_font_description(fd)
+        w, h = pl.get_size()
+        wh = (w / Pango.SCALE, h / Pango.SCALE)
+        _label_sizes[key] = wh
+        if len(_label_sizes) > _LABEL_SIZES:
+            _label_sizes.popitem(last=False)
+    return wh
+
 
 class Sprites:
 
@@ -93,6 +128,11 @@ class Sprites:
         self.list = []
         self.cr = None
         self.defer_draw = False
+        self._damage = None  # cairo.Region waiting to be queued
+        # Spatial index: grid cell -> sprites whose rect overlaps it
+        self._grid = {}
+        self._cells = {}  # sprite -> the grid cells it occupies
+        self._positions = None  # sprite -> index in list (built lazily)
 
     def set_defer_draw(self, state):
         self.defer_draw = state
@@ -115,6 +155,9 @@ class Sprites:
     def append_to_list(self, spr):
         ''' Append a new sprite to the end of the list. '''
         self.list.append(spr)
+        self._positions = None
+        self._cells.setdefault(spr, [])
+        self.reindex(spr)
 
     def insert_in_list(self, spr, i):
         ''' Insert a sprite at position i. '''
@@ -124,24 +167,99 @@ class Sprites:
             self.list.append(spr)
         else:
             self.list.insert(i, spr)
+        self._positions = None
+        self._cells.setdefault(spr, [])
+        self.reindex(spr)
 
     def find_in_list(self, spr):
-        return (spr in self.list)
+        return (spr in self._cells)
 
     def remove_from_list(self, spr):
         ''' Remove a sprite from the list. '''
-        if spr in self.list:
+        if spr in self._cells:
             self.list.remove(spr)
+            self._positions = None
+            for cell in self._cells.pop(spr):
+                self._grid[cell].discard(spr)
+
+    def _get_cells(self, x, y, width, height):
+        ''' The grid cells covered by a rectangle (edges included) '''
+        return [(i, j)
+                for i in range(int(x) // GRID_SIZE,
+                               int(x + width) // GRID_SIZE + 1)
+                for j in range(int(y) // GRID_SIZE,
+                               int(y + height) // GRID_SIZE + 1)]
+
+    def reindex(self, spr):
+        ''' Update the spatial index after a sprite's rect changes '''
+        old_cells = self._cells.get(spr)
+        if old_cells is None:
+            return  # Hidden sprites are not indexed.
+        rect = spr.rect
+        cells = self._get_cells(rect.x, rect.y, rect.width, rect.height)
+        if cells == old_cells:
+            return
+        for cell in old_cells:
+            self._grid[cell].discard(spr)
+        for cell in cells:
+            if cell in self._grid:
+                self._grid[cell].add(spr)
+            else:
+                self._grid[cell] = set([spr])
+        self._cells[spr] = cells
+
+    def _sprites_in_area(self, x, y, width, height):
+        ''' The indexed sprites near a rectangle, in list (layer) order '''
+        candidates = set()
+        for cell in self._get_cells(x, y, width, height):
+            if cell in self._grid:
+                candidates.update(self._grid[cell])
+        if self._positions is None:
+            self._positions = dict(
+                (spr, i) for i, spr in enumerate(self.list))
+        return sorted(candidates, key=self._positions.__getitem__)
+
+    def find_sprites_in_area(self, x, y, width, height):
+        ''' Return the sprites that overlap a rectangle, bottom first '''
+        x2 = x + width
+        y2 = y + height
+        found = []
+        for spr in self._sprites_in_area(x, y, width, height):
+            rect = spr.rect
+            if rect.x <= x2 and rect.y <= y2 and \
+               rect.x + rect.width >= x and rect.y + rect.height >= y:
+                found.append(spr)
+        return found
 
     def find_sprite(self, pos, region=False):
         ''' Search based on (x, y) position. Return the 'top/first' one. '''
-        list = self.list[:]
-        list.reverse()
-        for spr in list:
+        candidates = self._sprites_in_area(pos[0], pos[1], 0, 0)
+        candidates.reverse()
+        for spr in candidates:
             if spr.hit(pos, readpixel=not region):
                 return spr
         return None
 
+    def add_damage(self, x, y, width, height):
+        ''' Add a rectangle to the region repainted on the next frame '''
+        if width <= 0 or height <= 0:
+            return
+        rect = cairo.RectangleInt(int(x), int(y), int(width), int(height))
+        if self._damage is None:
+            self._damage = cairo.Region(rect)
+            GLib.idle_add(self._queue_damage,
+                          priority=GLib.PRIORITY_HIGH_IDLE)
+        else:
+            self._damage.union(rect)
+
+    def _queue_damage(self):
+        ''' Hand the coalesced damage region to gtk '''
+        region = self._damage
+        self._damage = None
+        if region is not None:
+            self.widget.queue_draw_region(region)
+        return False
+
     def redraw_sprites(self, area=None, cr=None):
         ''' Redraw the sprites that intersect area. '''
         # I think I need to do this to save Cairo some work
@@ -153,13 +271,17 @@ class Sprites:
         if cr is None:
             print('sprites.redraw_sprites: no Cairo context')
             return
-        for spr in self.list:
-            if area is None:
+        if area is None:
+            for spr in self.list:
+                spr.draw(cr=cr)
+            return
+        x1, y1 = area.x, area.y
+        x2, y2 = x1 + area.width, y1 + area.height
+        for spr in self._sprites_in_area(x1, y1, area.width, area.height):
+            rect = spr.rect
+            if rect.x < x2 and rect.y < y2 and \
+               rect.x + rect.width > x1 and rect.y + rect.height > y1:
                 spr.draw(cr=cr)
-            else:
-                intersection = spr.rect.intersect(area)
-                if intersection.width > 0 or intersection.height > 0:
-                    spr.draw(cr=cr)
 
 
 class Sprite:
@@ -182,6 +304,8 @@ class Sprite:
         self._x_pos = [None]
         self._y_pos = [None]
         self._fd = None
+        self._font = None  # Family etc. of the font, without the size
+        self._label_surfaces = []  # [(key, surface, w, h)] per label
         self._bold = False
         self._italic = False
         self._color = None
@@ -189,6 +313,7 @@ class Sprite:
         self.layer = 100
         self.labels = []
         self.cached_surfaces = []
+        self._pixels = []  # cached pixel data of the surfaces, for hit()
         self._dx = []  # image offsets
         self._dy = []
         self.type = None
@@ -199,6 +324,7 @@ class Sprite:
         ''' Add an image to the sprite. '''
         while len(self.cached_surfaces) < i + 1:
             self.cached_surfaces.append(None)
+            self._pixels.append(None)
             self._dx.append(0)
             self._dy.append(0)
         self._dx[i] = dx
@@ -227,11 +353,14 @@ class Sprite:
             context.rectangle(0, 0, self.rect.width, self.rect.height)
             context.fill()
             self.cached_surfaces[i] = surface
+        self._pixels[i] = None
+        self._sprites.reindex(self)
 
     def move(self, pos):
         ''' Move to new (x, y) position '''
         self.inval()
         self.rect.x, self.rect.y = int(pos[0]), int(pos[1])
+        self._sprites.reindex(self)
         self.inval()
 
     def move_relative(self, pos):
@@ -239,6 +368,7 @@ class Sprite:
         self.inval()
         self.rect.x += int(pos[0])
         self.rect.y += int(pos[1])
+        self._sprites.reindex(self)
         self.inval()
 
     def get_xy(self):
@@ -305,6 +435,8 @@ class Sprite:
     def set_font(self, font):
         ''' Set the font for a label '''
         self._fd = Pango.FontDescription(font)
+        self._fd.unset_fields(Pango.FontMask.SIZE)
+        self._font = self._fd.to_string()
 
     def set_label_color(self, rgb):
         ''' Set the font color for a label '''
@@ -343,10 +475,8 @@ class Sprite:
 
     def inval(self):
         ''' Invalidate a region for gtk '''
-        self._sprites.widget.queue_draw_area(self.rect.x,
-                                             self.rect.y,
-                                             self.rect.width,
-                                             self.rect.height)
+        self._sprites.add_damage(self.rect.x, self.rect.y,
+                                 self.rect.width, self.rect.height)
 
     def draw(self, cr=None):
         ''' Draw the sprite (and label) '''
@@ -387,6 +517,38 @@ class Sprite:
                 return False
         return self._sprites.find_in_list(self)
 
+    def _label_surface(self, cr, i, my_width):
+        ''' The label, rendered onto a surface that is kept until the label
+        or its attributes change '''
+        while len(self._label_surfaces) < len(self.labels):
+            self._label_surfaces.append(None)
+        key = (self.labels[i], self._font, self._scale[i], self._rescale[i],
+               my_width, self._color)
+        cached = self._label_surfaces[i]
+        if cached is not None and cached[0] == key:
+            return cached
+        size = int(self._scale[i] * Pango.SCALE)
+        w, h = _label_size(cr, self.labels[i], self._fd, self._font, size)
+        if w > my_width and self._rescale[i]:
+            size = int(self._scale[i] * Pango.SCALE * my_width / w)
+            w, h = _label_size(cr, self.labels[i], self._fd, self._font,
+                               size)
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                     int(w) + 2 * _LABEL_PADDING + 1,
+                                     int(h) + 2 * _LABEL_PADDING + 1)
+        context = cairo.Context(surface)
+        context.translate(_LABEL_PADDING, _LABEL_PADDING)
+        context.set_source_rgb(self._color[0], self._color[1], self._color[2])
+        pl = PangoCairo.create_layout(context)
+        pl.set_text(self.labels[i], -1)
+        self._fd.set_size(size)
+        pl.set_font_description(self._fd)
+        PangoCairo.show_layout(context, pl)
+        surface.flush()
+        cached = (key, surface, w, h)
+        self._label_surfaces[i] = cached
+        return cached
+
     def draw_label(self, cr):
         ''' Draw the label based on its attributes '''
 
@@ -395,22 +557,7 @@ class Sprite:
             my_width = 0
         my_height = self.rect.height - self._margins[1] - self._margins[3]
         for i in range(len(self.labels)):
-            pl = PangoCairo.create_layout(cr)
-            pl.set_text(self.labels[i], -1)
-            self._fd.set_size(int(self._scale[i] * Pango.SCALE))
-            pl.set_font_description(self._fd)
-            w = pl.get_size()[0] / Pango.SCALE
-            if w > my_width:
-                if self._rescale[i]:
-                    self._fd.set_size(
-                        int(self._scale[i] * Pango.SCALE * my_width / w))
-                    pl.set_font_description(self._fd)
-                    w = pl.get_size()[0] / Pango.SCALE
-                else:
-                    pl.set_ellipsize(Pango.EllipsizeMode.MIDDLE)
-                    self._fd.set_size(int(self._scale[i] * Pango.SCALE))
-                    pl.set_font_description(self._fd)
-                    w = pl.get_size()[0] / Pango.SCALE
+            key, surface, w, h = self._label_surface(cr, i, my_width)
             if self._x_pos[i] is not None:
                 x = int(self.rect.x + self._x_pos[i])
             elif self._horiz_align[i] == 'center':
@@ -419,7 +566,6 @@ class Sprite:
                 x = int(self.rect.x + self._margins[0])
             else:  # right
                 x = int(self.rect.x + self.rect.width - w - self._margins[2])
-            h = pl.get_size()[1] / Pango.SCALE
             if self._y_pos[i] is not None:
                 y = int(self.rect.y + self._y_pos[i])
             elif self._vert_align[i] == 'middle':
@@ -429,13 +575,11 @@ class Sprite:
             else:  # bottom
                 y = int(self.rect.y + self.rect.height - h - self._margins[3])
 
-            cr.save()
-            cr.translate(x, y)
-            cr.set_source_rgb(self._color[0], self._color[1], self._color[2])
-            PangoCairo.update_layout(cr, pl)
-            PangoCairo.show_layout(cr, pl)
-
-            cr.restore()
+            cr.set_source_surface(surface, x - _LABEL_PADDING,
+                                  y - _LABEL_PADDING)
+            cr.rectangle(x - _LABEL_PADDING, y - _LABEL_PADDING,
+                         surface.get_width(), surface.get_height())
+            cr.fill()
 
     def label_width(self):
         ''' Calculate the width of a label '''
@@ -443,11 +587,8 @@ class Sprite:
         if cr is not None:
             max = 0
             for i in range(len(self.labels)):
-                pl = PangoCairo.create_layout(cr)
-                pl.set_text(self.labels[i], -1)
-                self._fd.set_size(int(self._scale[i] * Pango.SCALE))
-                pl.set_font_description(self._fd)
-                w = pl.get_size()[0] / Pango.SCALE
+                w = _label_size(cr, self.labels[i], self._fd, self._font,
+                                int(self._scale[i] * Pango.SCALE))[0]
                 if w > max:
                     max = w
             return max
@@ -473,6 +614,22 @@ class Sprite:
         if x < 0 or x > (self.rect.width - 1) or \
                 y < 0 or y > (self.rect.height - 1):
             return(-1, -1, -1, -1)
+        surface = self.cached_surfaces[i]
+        if self._pixels[i] is None and \
+           isinstance(surface, cairo.ImageSurface) and \
+           surface.get_format() in (cairo.FORMAT_ARGB32,
+                                    cairo.FORMAT_RGB24):
+            surface.flush()
+            self._pixels[i] = (surface.get_stride(), surface.get_width(),
+                               surface.get_height(), surface.get_data())
+        if self._pixels[i] is not None:
+            # Read straight from the cached (native-endian BGRA) pixel data.
+            stride, w, h, pixels = self._pixels[i]
+            if x > w - 1 or y > h - 1:
+                return (0, 0, 0, 0)
+            offset = y * stride + x * 4
+            return (pixels[offset + 2], pixels[offset + 1], pixels[offset],
+                    0)
         # Create a new 1x1 cairo surface.
         cs = cairo.ImageSurface(cairo.FORMAT_RGB24, 1, 1)
         cr = cairo.Context(cs)
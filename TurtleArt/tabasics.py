@@ -1101,6 +1101,34 @@ buttons'))
         self.tw.lc.def_prim('stack', 1,
                             primitive_dictionary['stack'], True)
 
+        palette.add_block('startstack',
+                          style='basic-style-1arg',
+                          label=_('start action'),
+                          string_or_number=True,
+                          prim_name='startstack',
+                          default=_('action'),
+                          help_string=_('runs named action stack alongside \
+the rest of the program'))
+        self.tw.lc.def_prim(
+            'startstack', 1,
+            Primitive(self.tw.lc.prim_start_stack,
+                      arg_descs=[ArgSlot(TYPE_OBJECT)],
+                      export_me=False))
+
+        palette.add_block('stopstartedstack',
+                          style='basic-style-1arg',
+                          label=_('stop started action'),
+                          string_or_number=True,
+                          prim_name='stopstartedstack',
+                          default=_('action'),
+                          help_string=_('stops named action stack that was \
+started with "start action"'))
+        self.tw.lc.def_prim(
+            'stopstartedstack', 1,
+            Primitive(self.tw.lc.prim_stop_started_stack,
+                      arg_descs=[ArgSlot(TYPE_OBJECT)],
+                      export_me=False))
+
         palette.add_block('storeinbox1',
                           hidden=True,
                           style='basic-style-1arg',
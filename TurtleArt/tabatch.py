@@ -0,0 +1,309 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Render Turtle Blocks projects (.ta/.tb) to PNG or SVG files without a
+display, with a pool of worker processes. From the top directory run:
+
+    python3 -m TurtleArt.tabatch [options] directory|manifest|project...
+
+or turtleflags.py --batch [options] ...
+
+A manifest is a text file listing one project per line, relative to the
+manifest; empty lines and lines starting with # are ignored.
+'''
+
+import getopt
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+from time import time
+
+from .taconstants import PROJECT_SUFFIXES
+
+DEFAULT_SIZE = (1024, 768)
+DEFAULT_TIMEOUT = 60  # Seconds allowed for running each project
+
+_HELP_MSG = '''usage: tabatch.py [options] directory|manifest|project...
+  -o, --output DIR     where to write the images (default: .)
+  -s, --size WxH       canvas size in pixels (default: %dx%d)
+      --svg            save SVG instead of PNG
+  -j, --jobs N         number of worker processes (default: one per core)
+  -t, --timeout SECS   give up on a project after SECS (default: %d)
+  -r, --report FILE    also write the report to FILE as JSON''' % (
+    DEFAULT_SIZE[0], DEFAULT_SIZE[1], DEFAULT_TIMEOUT)
+
+
+class ProjectTimeout(Exception):
+    pass
+
+
+class BatchRenderer:
+
+    ''' Render projects, one after another, with a single non-interactive
+    TurtleArtWindow. The renderer is also the window's activity. '''
+
+    def __init__(self, share_path, width, height):
+        import cairo
+        from .tawindow import TurtleArtWindow
+
+        self.init_complete = True
+        self.error_list = []
+        turtle_canvas = cairo.ImageSurface(cairo.FORMAT_RGB24, width, height)
+        self.tw = TurtleArtWindow(None, share_path, share_path,
+                                  activity=self, turtle_canvas=turtle_canvas,
+                                  running_sugar=False,
+                                  canvas_size=(width, height))
+        # Each worker needs its own scratch file for the SVG output.
+        fd, self._tmp_svg_path = tempfile.mkstemp(suffix='.svg')
+        os.close(fd)
+
+    def restore_state(self):
+        ''' Nothing needs restoring after a clear screen '''
+        pass
+
+    def _reset(self):
+        ''' Forget the previous project '''
+        tw = self.tw
+        tw.lc.stop_logo()
+        for blk in tw.block_list.list[:]:
+            if blk.type in ['block', 'trash']:
+                tw.block_list.remove_from_list(blk)
+        tw.lc.boxes = {'box1': 0, 'box2': 0}
+        tw.lc.reset_heap()
+        tw.lc.prim_clear()
+        tw.canvas.svg_reset()
+        self.error_list = []
+
+    def render(self, ta_file, output, svg=False):
+        ''' Run a project and save the canvas to output. Returns the list
+        of error messages reported while running. '''
+        from .tautils import save_picture
+
+        self._reset()
+        tw = self.tw
+        if svg:
+            tw.canvas.svg_path = output
+        else:
+            tw.canvas.svg_path = self._tmp_svg_path
+        tw.load_start(ta_file)
+        tw.lc.trace = 0
+        tw.run_button(0)
+        if svg:
+            if tw.canvas.cr_svg is None:  # Nothing was run
+                tw.canvas.setup_svg_surface()
+            tw.canvas.svg_close()
+            tw.canvas.svg_reset()
+        else:
+            save_picture(tw.canvas, output)
+        return self.error_list[:]
+
+
+# State of a worker process
+_renderer = None
+_worker_args = None
+
+
+def _init_worker(share_path, width, height, svg, timeout):
+    global _renderer, _worker_args
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The parent handles ^C
+    _worker_args = (share_path, width, height, svg, timeout)
+    _renderer = BatchRenderer(share_path, width, height)
+
+
+def _timeout_cb(signum, frame):
+    raise ProjectTimeout()
+
+
+def _render_job(job):
+    ''' Render one project in a worker process '''
+    global _renderer
+    ta_file, output = job
+    share_path, width, height, svg, timeout = _worker_args
+    use_alarm = timeout > 0 and hasattr(signal, 'SIGALRM')
+    start = time()
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _timeout_cb)
+        signal.alarm(timeout)
+    try:
+        errors = _renderer.render(ta_file, output, svg)
+    except ProjectTimeout:
+        errors = ['timed out after %d seconds' % (timeout)]
+        output = None
+    except Exception as e:
+        errors = ['%s: %s' % (type(e).__name__, str(e))]
+        output = None
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+    if output is None:
+        # Start the next project from a clean window
+        _renderer = BatchRenderer(share_path, width, height)
+    return {'file': ta_file, 'output': output,
+            'seconds': round(time() - start, 3), 'errors': errors}
+
+
+def find_projects(paths):
+    ''' Return (path, name) pairs for the projects found in directories,
+    manifests and project files; name is the path relative to the
+    directory or manifest. '''
+    projects = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(PROJECT_SUFFIXES):
+                        filepath = os.path.join(root, name)
+                        projects.append(
+                            (filepath, os.path.relpath(filepath, path)))
+        elif path.endswith(PROJECT_SUFFIXES):
+            projects.append((path, os.path.basename(path)))
+        else:
+            base = os.path.dirname(path)
+            with open(path, 'r') as manifest:
+                for line in manifest:
+                    line = line.strip()
+                    if line == '' or line[0] == '#':
+                        continue
+                    filepath = os.path.join(base, line)
+                    name = os.path.normpath(line)
+                    if name.startswith('..') or os.path.isabs(name):
+                        name = os.path.basename(name)
+                    projects.append((filepath, name))
+    return projects
+
+
+def batch_render(projects, output_dir, width=DEFAULT_SIZE[0],
+                 height=DEFAULT_SIZE[1], svg=False, jobs=None,
+                 timeout=DEFAULT_TIMEOUT, share_path=None, progress=None):
+    ''' Render the (path, name) pairs from find_projects into output_dir
+    and return a report entry for each of them. progress, if given, is
+    called with each entry as soon as it is done. '''
+    if share_path is None:
+        share_path = os.path.dirname(
+            os.path.dirname(os.path.abspath(__file__)))
+    if svg:
+        suffix = '.svg'
+    else:
+        suffix = '.png'
+    work = []
+    for filepath, name in projects:
+        output = os.path.join(output_dir, os.path.splitext(name)[0] + suffix)
+        if not os.path.exists(os.path.dirname(output)):
+            os.makedirs(os.path.dirname(output))
+        work.append((os.path.abspath(filepath), os.path.abspath(output)))
+
+    report = []
+    pool = multiprocessing.Pool(
+        processes=jobs, initializer=_init_worker,
+        initargs=(share_path, width, height, svg, timeout))
+    try:
+        for entry in pool.imap_unordered(_render_job, work):
+            report.append(entry)
+            if progress is not None:
+                progress(entry)
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return report
+
+
+def _print_entry(entry):
+    if entry['errors']:
+        print('%8.3fs  FAILED  %s: %s' % (entry['seconds'], entry['file'],
+                                          '; '.join(entry['errors'])))
+    else:
+        print('%8.3fs  ok      %s -> %s' % (entry['seconds'], entry['file'],
+                                            entry['output']))
+
+
+def main(args):
+    try:
+        opts, args = getopt.getopt(
+            args, 'ho:s:j:t:r:',
+            ['help', 'output=', 'size=', 'svg', 'jobs=', 'timeout=',
+             'report='])
+    except getopt.GetoptError as err:
+        print(err.msg)
+        print(_HELP_MSG)
+        return 2
+    output_dir = '.'
+    width, height = DEFAULT_SIZE
+    svg = False
+    jobs = None
+    timeout = DEFAULT_TIMEOUT
+    report_path = None
+    try:
+        for o, a in opts:
+            if o in ('-h', '--help'):
+                print(_HELP_MSG)
+                return 0
+            elif o in ('-o', '--output'):
+                output_dir = a
+            elif o in ('-s', '--size'):
+                width, height = [int(n) for n in a.lower().split('x')]
+            elif o == '--svg':
+                svg = True
+            elif o in ('-j', '--jobs'):
+                jobs = int(a)
+            elif o in ('-t', '--timeout'):
+                timeout = int(a)
+            elif o in ('-r', '--report'):
+                report_path = a
+    except ValueError:
+        print('bad value for %s: %s' % (o, a))
+        print(_HELP_MSG)
+        return 2
+    if not args:
+        print(_HELP_MSG)
+        return 2
+
+    # Work around for the import behavior of gst in tagplay, which would
+    # otherwise see our options.
+    sys.argv[1:] = []
+
+    projects = find_projects(args)
+    start = time()
+    report = batch_render(projects, output_dir, width, height, svg, jobs,
+                          timeout, progress=_print_entry)
+    elapsed = time() - start
+
+    failed = [entry for entry in report if entry['errors']]
+    busy = sum([entry['seconds'] for entry in report])
+    print('%d projects, %d failed, %.3fs rendering, %.3fs elapsed' %
+          (len(report), len(failed), busy, elapsed))
+    if report_path is not None:
+        with open(report_path, 'w') as f:
+            json.dump({'projects': report, 'failed': len(failed),
+                       'seconds': round(elapsed, 3)}, f, indent=1)
+    if failed:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
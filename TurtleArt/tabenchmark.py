@@ -0,0 +1,241 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Benchmarks for some of the hot paths of Turtle Blocks. From the top
+directory run:
+
+    python3 -m TurtleArt.tabenchmark [benchmark...]
+
+The benchmarks use real blocks and sprites, so they need Gtk and a display.
+'''
+
+import os
+import sys
+import random
+import timeit
+
+# Blocks per stack in the generated projects
+_STACK_HEIGHT = 20
+_STACK_SPACING = 200
+
+
+def _make_turtle_window():
+    ''' Build an interactive TurtleArtWindow in an offscreen window '''
+    import cairo
+    from .tawindow import TurtleArtWindow
+    from gi.repository import Gtk
+
+    path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    win = Gtk.OffscreenWindow()
+    canvas = Gtk.DrawingArea()
+    win.add(canvas)
+    win.show_all()
+    turtle_canvas = cairo.ImageSurface(cairo.FORMAT_RGB24, 1024, 768)
+    return TurtleArtWindow(canvas, path, path, parent=win,
+                           turtle_canvas=turtle_canvas, running_sugar=False)
+
+
+def _build_stacks(tw, n):
+    ''' Add n 'forward' blocks to the canvas, in connected stacks '''
+    from .tablock import Block
+
+    blocks = []
+    columns = max(1, int((n / _STACK_HEIGHT) ** 0.5))
+    x = y = 0
+    previous = None
+    for i in range(n):
+        if i % _STACK_HEIGHT == 0:
+            stack = i // _STACK_HEIGHT
+            x = (stack % columns) * _STACK_SPACING
+            y = (stack // columns) * _STACK_HEIGHT * 50
+            previous = None
+        blk = Block(tw.block_list, tw.sprite_list, 'forward', x, y,
+                    'block', [100], tw.block_scale)
+        if previous is not None:
+            # Position the block under the previous one and connect them
+            (px, py) = previous.spr.get_xy()
+            blk.spr.move((px + previous.docks[-1][2] - blk.docks[0][2],
+                          py + previous.docks[-1][3] - blk.docks[0][3]))
+            previous.connections[-1] = blk
+            blk.connections[0] = previous
+        blocks.append(blk)
+        previous = blk
+    return blocks
+
+
+def _clear_blocks(tw, blocks):
+    for blk in blocks:
+        blk.spr.hide()
+        tw.block_list.remove_from_list(blk)
+
+
+def benchmark_snap_to_dock(sizes=(100, 1000, 5000), drops=200):
+    ''' Time the search for a dock when a block is dropped next to a
+    random block in projects of various sizes '''
+    from .tablock import Block
+
+    tw = _make_turtle_window()
+    dragged = Block(tw.block_list, tw.sprite_list, 'forward', 0, 0,
+                    'block', [100], tw.block_scale)
+    tw.drag_group = [dragged]
+    for n in sizes:
+        blocks = _build_stacks(tw, n)
+        random.seed(n)
+        targets = []
+        for i in range(drops):
+            blk = random.choice(blocks)
+            (bx, by) = blk.spr.get_xy()
+            targets.append(
+                (bx + blk.docks[-1][2] - dragged.docks[0][2] +
+                 random.randint(-5, 5),
+                 by + blk.docks[-1][3] - dragged.docks[0][3] +
+                 random.randint(-5, 5)))
+
+        def drop():
+            for pos in targets:
+                dragged.spr.move(pos)
+                tw._find_dock(dragged)
+
+        seconds = min(timeit.repeat(drop, number=1, repeat=3))
+        print('snap_to_dock: %5d blocks: %8.3f ms per drop' %
+              (n, 1000 * seconds / drops))
+        _clear_blocks(tw, blocks)
+
+
+def benchmark_primitive_call(calls=20000):
+    ''' Calls per second of a few primitives with constant arguments, with
+    and without call plans '''
+    from .taprimitive import Primitive
+
+    tw = _make_turtle_window()
+    tw.lc.start_time = 0
+    primitives = [('forward 1', 'forward', (tw.lc, 1)),
+                  ('right 1', 'right', (tw.lc, 1)),
+                  ('plus 1 2.5', 'plus', (tw.lc, 1, 2.5)),
+                  ('less 1 2', 'less', (tw.lc, 1, 2))]
+    for label, name, args in primitives:
+        prim = tw.lc.get_prim_callable(name)
+        rates = []
+        for use_plans in (False, True):
+            Primitive._USE_CALL_PLANS = use_plans
+
+            def call():
+                for i in range(calls):
+                    prim(*args)
+
+            seconds = min(timeit.repeat(call, number=1, repeat=3))
+            rates.append(calls / seconds)
+        Primitive._USE_CALL_PLANS = True
+        print('primitive_call: %-12s %10.0f calls/s (%10.0f without plans,'
+              ' %.1fx)' % (label, rates[1], rates[0], rates[1] / rates[0]))
+
+
+def benchmark_share_events(moves=20000, per_frame=100):
+    ''' Events per second and bytes per move of the events of a drawing
+    loop (forward, right, a color now and then) sent to a loopback
+    receiver, one message per event and in batches '''
+    import json
+    from .taeventstream import (BATCH_ACTION, EventBatch, decode)
+    from .tautils import (data_from_string, data_to_string)
+
+    nick = 'turtle'
+    events = []
+    for i in range(moves):
+        events.append(('f', data_to_string([nick, 10])))
+        events.append(('r', data_to_string([nick, (i * 7) % 360])))
+        if i % 50 == 0:
+            events.append(('c', data_to_string([nick, i % 100])))
+
+    def one_by_one():
+        sent = [json.dumps({'action': action, 'event': event})
+                for action, event in events]
+        for text in sent:
+            msg = json.loads(text)
+            data_from_string(msg['event'])
+        return sum(len(text) for text in sent)
+
+    def batched():
+        sent = []
+        batch = EventBatch()
+        for i, (action, event) in enumerate(events):
+            batch.add(action, *data_from_string(event))
+            if i % per_frame == per_frame - 1:
+                sent.append(json.dumps({'action': BATCH_ACTION,
+                                        'event': batch.encode()}))
+        sent.append(json.dumps({'action': BATCH_ACTION,
+                                'event': batch.encode()}))
+        for text in sent:
+            for event in decode(json.loads(text)['event']):
+                pass
+        return sum(len(text) for text in sent)
+
+    for label, run in (('one by one', one_by_one), ('batched', batched)):
+        size = run()
+        seconds = min(timeit.repeat(run, number=1, repeat=3))
+        print('share_events: %-10s %10.0f events/s, %6.1f bytes per move' %
+              (label, len(events) / seconds, size / float(moves)))
+
+
+def benchmark_compile_lines(samples=('math-sierptri.ta',
+                                     'graphics-candyvortex.ta')):
+    ''' Time a run of some sample projects with the Logo lines compiled
+    into closures and with the interpreter alone '''
+    from .tautils import find_start_stack
+
+    tw = _make_turtle_window()
+    tw.step_time = 0
+    for name in samples:
+        tw.load_files(os.path.join(tw.share_path, 'samples', name))
+        top = [blk for blk in tw.just_blocks() if find_start_stack(blk)][0]
+        times = []
+        for compile_lines in (False, True):
+            tw.lc.compile_lines = compile_lines
+
+            def run():
+                tw.lc.run_blocks(tw.lc.generate_code(top, tw.just_blocks()))
+                while tw.lc.doevalstep():
+                    pass
+
+            times.append(min(timeit.repeat(run, number=1, repeat=3)))
+        tw.lc.compile_lines = True
+        print('compile_lines: %-24s %8.3f s (%8.3f s interpreted, %.1fx)' %
+              (name, times[1], times[0], times[0] / times[1]))
+
+
+BENCHMARKS = {
+    'compile_lines': benchmark_compile_lines,
+    'primitive_call': benchmark_primitive_call,
+    'share_events': benchmark_share_events,
+    'snap_to_dock': benchmark_snap_to_dock,
+}
+
+
+def main(names):
+    for name in names or sorted(BENCHMARKS):
+        if name not in BENCHMARKS:
+            print('Unknown benchmark %s (try one of %s)' %
+                  (name, ', '.join(sorted(BENCHMARKS))))
+            continue
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
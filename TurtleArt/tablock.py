@@ -20,6 +20,7 @@
 # THE SOFTWARE.
 
 import cairo
+import os
 
 from gi.repository import Gdk
 from gi.repository import GdkPixbuf
@@ -33,6 +34,7 @@ from .tapalette import palette_blocks, block_colors, expandable_blocks, \
     content_blocks, block_names, block_primitives, \
     block_styles, special_block_colors
 
+from .taimagecache import SurfaceCache, CACHE_HOME
 from .tasprite_factory import SVG, svg_str_to_pixbuf
 from . import sprites
 
@@ -40,6 +42,8 @@ from .tautils import debug_output, error_output
 
 
 media_blocks_dictionary = {}  # new media blocks get added here
+# Rendered block shapes, shared by all blocks
+_shape_cache = SurfaceCache(os.path.join(CACHE_HOME, 'blocks'))
 
 
 class Media(object):
@@ -80,6 +84,7 @@ class Blocks:
 
     def __init__(self, font_scale_factor=1, decimal_point='.'):
         self.list = []
+        self._spr_to_block = {}
         self.max_width = 400
         self.font_scale_factor = font_scale_factor
         self.decimal_point = decimal_point
@@ -101,10 +106,14 @@ class Blocks:
 
     def append_to_list(self, block):
         self.list.append(block)
+        if block.spr is not None:
+            self._spr_to_block[block.spr] = block
 
     def remove_from_list(self, block):
         if block in self.list:
             self.list.remove(block)
+            if self._spr_to_block.get(block.spr) is block:
+                del self._spr_to_block[block.spr]
 
     def print_list(self, block_type=None):
         for i, block in enumerate(self.list):
@@ -118,6 +127,8 @@ class Blocks:
         self.font_scale_factor = scale
 
     def spr_to_block(self, spr):
+        if spr is not None:
+            return self._spr_to_block.get(spr)
         for b in self.list:
             if spr == b.spr:
                 return b
@@ -1341,21 +1352,29 @@ class Block:
         self.svg.set_gradient(True, GRADIENT_COLOR)
         self.svg.clear_docks()
         if arg is None:
-            pixbuf = svg_str_to_pixbuf(function())
+            svg_string = function()
         else:
-            pixbuf = svg_str_to_pixbuf(function(arg))
+            svg_string = function(arg)
         self.width = self.svg.get_width()
         self.height = self.svg.get_height()
-        self.shapes[0] = _pixbuf_to_cairo_surface(pixbuf,
-                                                  self.width, self.height)
+        self.shapes[0] = _svg_str_to_cairo_surface(svg_string,
+                                                   self.width, self.height)
         self.svg.set_gradient(False)
         self.svg.clear_docks()
         if arg is None:
-            pixbuf = svg_str_to_pixbuf(function())
+            svg_string = function()
         else:
-            pixbuf = svg_str_to_pixbuf(function(arg))
-        self.shapes[1] = _pixbuf_to_cairo_surface(pixbuf,
-                                                  self.width, self.height)
+            svg_string = function(arg)
+        self.shapes[1] = _svg_str_to_cairo_surface(svg_string,
+                                                   self.width, self.height)
+
+
+def _svg_str_to_cairo_surface(svg_string, width, height):
+    ''' Render a block shape, or reuse one rendered from the same SVG '''
+    return _shape_cache.lookup(
+        svg_string, width, height,
+        lambda: _pixbuf_to_cairo_surface(svg_str_to_pixbuf(svg_string),
+                                         width, height))
 
 
 def _pixbuf_to_cairo_surface(image, width, height):
@@ -23,9 +23,10 @@
 import cairo
 import os
 
-from math import pi
+from math import pi, hypot
 
 from gi.repository import Gdk
+from gi.repository import GLib
 from gi.repository import Pango
 from gi.repository import PangoCairo
 from .tautils import get_path
@@ -72,6 +73,8 @@ def calc_gray(c, g, invert=False):
 
 
 colors = {}
+# Stroke the batched pen segments once this many have been collected
+MAX_BATCHED_SEGMENTS = 4096
 DEGTOR = pi / 180.
 RTODEG = 180. / pi
 
@@ -97,6 +100,15 @@ COLOR_TABLE = (
     0xFF00FF, 0xFF00E6, 0xFF00CC, 0xFF00B3, 0xFF0099,
     0xFF0080, 0xFF0066, 0xFF004D, 0xFF0033, 0xFF001A)
 
+# COLOR_TABLE as (r, g, b)
+_COLOR_TABLE_RGB = tuple(((c >> 16) & 0xFF, (c >> 8) & 0xFF, c & 0xFF)
+                         for c in COLOR_TABLE)
+# Closest COLOR_TABLE entry of (r, g, b) colors looked up before
+_color_indexes = {}
+MAX_CACHED_COLOR_INDEXES = 65536
+# (shade, gray) -> table undoing the shade and gray of an 8-bit channel
+_unshade_tables = {}
+
 
 class TurtleGraphics:
 
@@ -115,6 +127,16 @@ class TurtleGraphics:
         self._color = 0
         self._gray = 100
         self.cr_svg = None  # Surface used for saving to SVG
+        self.svg_path = None  # Overrides the default SVG file
+
+        # Pen segments drawn with the current pen state, waiting to be
+        # stroked as a single path: a list of polylines [x0, y0, x1, y1...]
+        self._pen_path = []
+        self._pen_end = None
+        self._pen_segments = 0
+        self._pen_bbox = None
+        self._flush_id = None
+        self._pen_rgb = None
 
         # Build a cairo.Context from a cairo.XlibSurface
         self.canvas = cairo.Context(self.turtle_window.turtle_canvas)
@@ -122,6 +144,7 @@ class TurtleGraphics:
 
     def setup_svg_surface(self):
         ''' Set up a surface for saving to SVG '''
+        self.flush()
         svg_surface = cairo.SVGSurface(self.get_svg_path(),
                                        self.width, self.height)
         self.svg_surface = svg_surface
@@ -131,6 +154,8 @@ class TurtleGraphics:
     def get_svg_path(self):
         '''We use a separate file for the svg used for generating Sugar icons
         '''
+        if self.svg_path is not None:
+            return self.svg_path
         if self.turtle_window.running_sugar:
             return os.path.join(get_path(self.turtle_window.activity,
                                          'instance'), 'output.svg')
@@ -139,6 +164,8 @@ class TurtleGraphics:
 
     def fill_polygon(self, poly_points):
         ''' Draw the polygon... '''
+        self.flush()
+
         def _fill_polygon(cr, poly_points):
             cr.new_path()
             for i, p in enumerate(poly_points):
@@ -156,12 +183,23 @@ class TurtleGraphics:
             cr.fill()
 
         _fill_polygon(self.canvas, poly_points)
-        self.inval()
+        xs = []
+        ys = []
+        for p in poly_points:
+            if p[0] in ['rarc', 'larc']:
+                xs.extend((p[1] - p[3], p[1] + p[3]))
+                ys.extend((p[2] - p[3], p[2] + p[3]))
+            else:
+                xs.append(p[1])
+                ys.append(p[2])
+        if xs:
+            self.inval_bbox(min(xs), min(ys), max(xs), max(ys))
         if self.cr_svg is not None:
             _fill_polygon(self.cr_svg, poly_points)
 
     def clearscreen(self):
         '''Clear the canvas and reset most graphics attributes to defaults.'''
+        self.flush()
 
         def _clearscreen(cr):
             cr.move_to(0, 0)
@@ -179,29 +217,35 @@ class TurtleGraphics:
 
     def rarc(self, x, y, r, a, heading):
         ''' draw a clockwise arc '''
+        self.flush()
+
         def _rarc(cr, x, y, r, a, h):
             cr.arc(x, y, r, (h - 180) * DEGTOR, (h - 180 + a) * DEGTOR)
             cr.stroke()
 
         _rarc(self.canvas, x, y, r, a, heading)
-        self.inval()
+        self.inval_bbox(x - r, y - r, x + r, y + r)
 
         if self.cr_svg is not None:
             _rarc(self.cr_svg, x, y, r, a, heading)
 
     def larc(self, x, y, r, a, heading):
         ''' draw a counter-clockwise arc '''
+        self.flush()
+
         def _larc(cr, x, y, r, a, h):
             cr.arc_negative(x, y, r, h * DEGTOR, (h - a) * DEGTOR)
             cr.stroke()
 
         _larc(self.canvas, x, y, r, a, heading)
-        self.inval()
+        self.inval_bbox(x - r, y - r, x + r, y + r)
         if self.cr_svg is not None:
             _larc(self.cr_svg, x, y, r, a, heading)
 
     def set_pen_size(self, pen_size):
         ''' Set the pen size '''
+        if self._pen_path and pen_size != self.canvas.get_line_width():
+            self.flush()
         self.canvas.set_line_width(pen_size)
         if self.cr_svg is not None:
             self.cr_svg.set_line_width(pen_size)
@@ -212,6 +256,7 @@ class TurtleGraphics:
 
     def fillscreen_with_gray(self, color, shade, gray):
         ''' Fill screen with color/shade/gray and reset to defaults '''
+        self.flush()
 
         save_rgb = self._fgrgb[:]
 
@@ -275,6 +320,7 @@ class TurtleGraphics:
 
     def draw_surface(self, surface, x, y, w, h):
         ''' Draw a surface '''
+        self.flush()
 
         def _draw_surface(cc, surface, x, y, w, h):
             cc.set_source_surface(surface, x, y)
@@ -282,12 +328,13 @@ class TurtleGraphics:
             cc.fill()
 
         _draw_surface(self.canvas, surface, x, y, w, h)
-        self.inval()
+        self.inval_bbox(x, y, x + w, y + h)
         if self.cr_svg is not None:
             _draw_surface(self.cr_svg, surface, x, y, w, h)
 
     def draw_pixbuf(self, pixbuf, a, b, x, y, w, h, heading):
         ''' Draw a pixbuf '''
+        self.flush()
 
         def _draw_pixbuf(cc, pixbuf, a, b, x, y, w, h, heading):
             # Build a Gdk.CairoContext from a cairo.Context to access
@@ -303,7 +350,10 @@ class TurtleGraphics:
             cc.restore()
 
         _draw_pixbuf(self.canvas, pixbuf, a, b, x, y, w, h, heading)
-        self.inval()
+        # The image is rotated about its center
+        r = hypot(w, h) / 2.
+        self.inval_bbox(x + w / 2. - r, y + h / 2. - r,
+                        x + w / 2. + r, y + h / 2. + r)
         if self.cr_svg is not None:
             _draw_pixbuf(self.cr_svg, pixbuf, a, b, x, y, w, h, heading)
 
@@ -313,6 +363,7 @@ class TurtleGraphics:
 
     def draw_text(self, label, x, y, size, width, heading, scale):
         ''' Draw text '''
+        self.flush()
 
         def _draw_text(cc, label, x, y, size, width, scale, heading, rgb,
                        wrap=False):
@@ -356,81 +407,190 @@ class TurtleGraphics:
         r = self._fgrgb[0] / 255.
         g = self._fgrgb[1] / 255.
         b = self._fgrgb[2] / 255.
+        if self._pen_path:
+            # Called before every segment; only a new color ends the batch
+            if self._pen_rgb == (r, g, b):
+                return
+            self.flush()
+        self._pen_rgb = (r, g, b)
         self.canvas.set_source_rgb(r, g, b)
         if self.cr_svg is not None:
             self.cr_svg.set_source_rgb(r, g, b)
 
     def draw_line(self, x1, y1, x2, y2):
-        ''' Draw a line '''
+        ''' Draw a line: the segment is added to the pending pen path,
+        which is stroked by flush() '''
+        if self._pen_end == (x1, y1):
+            self._pen_path[-1].extend((x2, y2))
+        else:
+            self._pen_path.append([x1, y1, x2, y2])
+        self._pen_end = (x2, y2)
+        self._pen_segments += 1
 
-        def _draw_line(cr, x1, y1, x2, y2):
+        if self._pen_bbox is None:
+            self._pen_bbox = [min(x1, x2), min(y1, y2),
+                              max(x1, x2), max(y1, y2)]
+        else:
+            bbox = self._pen_bbox
+            bbox[0] = min(bbox[0], x1, x2)
+            bbox[1] = min(bbox[1], y1, y2)
+            bbox[2] = max(bbox[2], x1, x2)
+            bbox[3] = max(bbox[3], y1, y2)
+
+        if self._pen_segments >= MAX_BATCHED_SEGMENTS:
+            self.flush()
+        elif self._flush_id is None and self.turtle_window.interactive_mode:
+            # Stroke once per main-loop iteration, ahead of the redraw
+            self._flush_id = GLib.idle_add(self._flush_cb,
+                                           priority=GLib.PRIORITY_HIGH_IDLE)
+
+    def _flush_cb(self):
+        self._flush_id = None
+        self.flush()
+        return False
+
+    def flush(self):
+        ''' Stroke the pending pen path and invalidate its bounding box '''
+        if not self._pen_path:
+            return
+
+        def _stroke_path(cr, path):
             cr.set_line_cap(1)  # Set the line cap to be round
-            cr.move_to(x1, y1)
-            cr.line_to(x2, y2)
+            cr.set_line_join(cairo.LINE_JOIN_ROUND)
+            cr.new_path()
+            for line in path:
+                cr.move_to(line[0], line[1])
+                for i in range(2, len(line), 2):
+                    cr.line_to(line[i], line[i + 1])
             cr.stroke()
 
-        _draw_line(self.canvas, x1, y1, x2, y2)
+        _stroke_path(self.canvas, self._pen_path)
         if self.cr_svg is not None:
-            _draw_line(self.cr_svg, x1, y1, x2, y2)
-        self.inval()
+            _stroke_path(self.cr_svg, self._pen_path)
+
+        x1, y1, x2, y2 = self._pen_bbox
+        self._pen_path = []
+        self._pen_end = None
+        self._pen_segments = 0
+        self._pen_bbox = None
+        self.inval_bbox(x1, y1, x2, y2)
+
+    def _unshade(self, c):
+        ''' Undo the current shade and gray of an 8-bit color channel '''
+        c <<= 8
+        if self._shade != 50:
+            c = calc_shade(c, (wrap100(self._shade) - 50) / 50., True)
+        if self._gray != 100:
+            c = calc_gray(c, self._gray, True)
+        return c >> 8
 
     def get_color_index(self, r, g, b, a=0):
         ''' Find the closest palette entry to the rgb triplet '''
         if self._shade != 50 or self._gray != 100:
-            r <<= 8
-            g <<= 8
-            b <<= 8
-            if self._shade != 50:
-                sh = (wrap100(self._shade) - 50) / 50.
-                r = calc_shade(r, sh, True)
-                g = calc_shade(g, sh, True)
-                b = calc_shade(b, sh, True)
-            if self._gray != 100:
-                r = calc_gray(r, self._gray, True)
-                g = calc_gray(g, self._gray, True)
-                b = calc_gray(b, self._gray, True)
-            r >>= 8
-            g >>= 8
-            b >>= 8
+            key = (self._shade, self._gray)
+            if key not in _unshade_tables:
+                if len(_unshade_tables) > 64:
+                    _unshade_tables.clear()
+                _unshade_tables[key] = [self._unshade(c) for c in range(256)]
+            table = _unshade_tables[key]
+            if 0 <= r < 256 and 0 <= g < 256 and 0 <= b < 256:
+                r, g, b = table[r], table[g], table[b]
+            else:
+                r, g, b = self._unshade(r), self._unshade(g), \
+                    self._unshade(b)
+        rgb = (r, g, b)
+        if rgb in _color_indexes:
+            return _color_indexes[rgb]
         min_distance = 1000000
         closest_color = -1
-        for i, c in enumerate(COLOR_TABLE):
-            cr = int((c & 0xff0000) >> 16)
-            cg = int((c & 0x00ff00) >> 8)
-            cb = int((c & 0x0000ff))
+        for i, (cr, cg, cb) in enumerate(_COLOR_TABLE_RGB):
             distance_squared = \
                 ((cr - r) ** 2) + ((cg - g) ** 2) + ((cb - b) ** 2)
             if distance_squared == 0:
-                return i
+                closest_color = i
+                break
             if distance_squared < min_distance:
                 min_distance = distance_squared
                 closest_color = i
+        if len(_color_indexes) > MAX_CACHED_COLOR_INDEXES:
+            _color_indexes.clear()
+        _color_indexes[rgb] = closest_color
         return closest_color
 
     def get_pixel(self, x, y):
         ''' Read the pixel at x, y '''
+        self.flush()
         if self.turtle_window.interactive_mode:
             x = int(x)
             y = int(y)
-            w = self.turtle_window.turtle_canvas.get_width()
-            h = self.turtle_window.turtle_canvas.get_height()
+            surface = self.turtle_window.turtle_canvas
+            w = surface.get_width()
+            h = surface.get_height()
             if x < 0 or x > (w - 1) or y < 0 or y > (h - 1):
                 return(-1, -1, -1, -1)
-            # create a new 1x1 cairo surface
-            cs = cairo.ImageSurface(cairo.FORMAT_RGB24, 1, 1)
-            cr = cairo.Context(cs)
-            cr.set_source_surface(self.turtle_window.turtle_canvas, -x, -y)
-            cr.rectangle(0, 0, 1, 1)
-            cr.set_operator(cairo.OPERATOR_SOURCE)
-            cr.fill()
-            cs.flush()  # ensure all writing is done
-            pixels = cs.get_data()  # Read the pixel
-            return (pixels[2], pixels[1], pixels[0], 0)
+            if isinstance(surface, cairo.ImageSurface):
+                # Read straight from the pixels of the canvas
+                surface.flush()
+                pixels = surface.get_data()
+                i = y * surface.get_stride() + x * 4
+            else:
+                pixels = self._copy_pixels(surface, x, y, 1, 1).get_data()
+                i = 0
+            return (pixels[i + 2], pixels[i + 1], pixels[i], 0)
         else:
             return(-1, -1, -1, -1)
 
+    def get_pixels(self, x, y, w, h):
+        ''' Read the pixels in a rectangle as a list of rows of (r, g, b, a)
+        tuples, like get_pixel. Pixels outside of the canvas are
+        (-1, -1, -1, -1). '''
+        self.flush()
+        x, y, w, h = int(x), int(y), int(w), int(h)
+        outside = (-1, -1, -1, -1)
+        if not self.turtle_window.interactive_mode:
+            return [[outside] * w for row in range(h)]
+        surface = self.turtle_window.turtle_canvas
+        # The part of the rectangle on the canvas
+        x1, y1 = max(x, 0), max(y, 0)
+        x2 = min(x + w, surface.get_width())
+        y2 = min(y + h, surface.get_height())
+        if x2 <= x1 or y2 <= y1:
+            return [[outside] * w for row in range(h)]
+        if isinstance(surface, cairo.ImageSurface):
+            surface.flush()
+            image = surface
+            ox, oy = x1, y1
+        else:
+            image = self._copy_pixels(surface, x1, y1, x2 - x1, y2 - y1)
+            ox, oy = 0, 0
+        pixels = image.get_data()
+        stride = image.get_stride()
+        left = [outside] * (x1 - x)
+        right = [outside] * (x + w - x2)
+        rows = [[outside] * w for row in range(y1 - y)]
+        for row in range(oy, oy + y2 - y1):
+            start = row * stride + ox * 4
+            data = pixels[start:start + (x2 - x1) * 4]
+            rows.append(left + list(zip(data[2::4], data[1::4], data[0::4],
+                                        [0] * (x2 - x1))) + right)
+        rows.extend([[outside] * w for row in range(y + h - y2)])
+        return rows
+
+    def _copy_pixels(self, surface, x, y, w, h):
+        ''' Copy a rectangle of a surface that cannot be read directly into
+        an image surface '''
+        cs = cairo.ImageSurface(cairo.FORMAT_RGB24, w, h)
+        cr = cairo.Context(cs)
+        cr.set_source_surface(surface, -x, -y)
+        cr.rectangle(0, 0, w, h)
+        cr.set_operator(cairo.OPERATOR_SOURCE)
+        cr.fill()
+        cs.flush()  # ensure all writing is done
+        return cs
+
     def svg_close(self):
         ''' Close current SVG graphic '''
+        self.flush()
         self.cr_svg.show_page()
         self.svg_surface.flush()
         self.svg_surface.finish()
@@ -439,6 +599,15 @@ class TurtleGraphics:
         ''' Reset svg flags '''
         self.cr_svg = None
 
-    def inval(self):
-        ''' Invalidate a region for gtk '''
-        self.turtle_window.inval_all()
+    def inval_bbox(self, x1, y1, x2, y2):
+        ''' Invalidate a bounding box, padded by the pen width '''
+        pad = self.canvas.get_line_width() / 2. + 1
+        self.inval(int(x1 - pad), int(y1 - pad),
+                   int(x2 - x1 + 2 * pad) + 1, int(y2 - y1 + 2 * pad) + 1)
+
+    def inval(self, x=None, y=None, w=None, h=None):
+        ''' Invalidate a region for gtk (the whole window by default) '''
+        if x is None:
+            self.turtle_window.inval_all()
+        else:
+            self.turtle_window.inval_area(x, y, w, h)
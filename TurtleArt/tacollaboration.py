@@ -19,15 +19,25 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
+import io
 import os
+import base64
+import hashlib
+import json
+import cairo
+from collections import OrderedDict
 
 from gettext import gettext as _
 
 from gi.repository import GdkPixbuf
+from gi.repository import GLib
 
-from TurtleArt.tautils import data_to_string, data_from_string, get_path, \
-    base64_to_image, debug_output, error_output
+from TurtleArt.tautils import data_to_string, data_from_string, \
+    pixbuf_to_png, png_to_pixbuf, copy_canvas_surface, debug_output, \
+    error_output
 from TurtleArt.taconstants import DEFAULT_TURTLE_COLORS
+from TurtleArt.taeventstream import (BATCH_ACTION, MOTION_ACTIONS, EventBatch,
+                                     decode)
 
 from sugar3 import profile
 from sugar3.presence import presenceservice
@@ -38,6 +48,20 @@ from .textchannelwrapper import CollabWrapper
 SERVICE = 'org.laptop.TurtleArtActivity'
 IFACE = SERVICE
 PATH = '/org/laptop/TurtleArtActivity'
+# How often batched turtle events are sent
+_BATCH_MS = 16
+# A batch is sent at once when it gets this long, as the timer does not
+# fire while a run holds the main loop
+_BATCH_EVENTS = 256
+# Images up to this size (PNG bytes) are sent in the text channel; larger
+# ones by a file transfer to each buddy
+_INLINE_IMAGE_SIZE = 16384
+# How many received images are kept
+_IMAGE_CACHE_SIZE = 64
+# Asks the sharer for a snapshot of the canvas and turtles
+SNAPSHOT_REQUEST = 'Q'
+# How long a joiner waits for the snapshot before it gives up on it
+_SNAPSHOT_TIMEOUT_MS = 15000
 
 
 class Collaboration():
@@ -46,8 +70,19 @@ class Collaboration():
         """ A simplistic sharing model: the sharer is the master """
         self._tw = tw
         self._tw.send_event = self.send_event
+        self._tw.share_image = self.share_image
         self._tw.remote_turtle_dictionary = {}
         self._activity = activity
+        self._batch = EventBatch()
+        self._batch_id = None
+        self._buddies = set()  # keys of the other buddies
+        self._shared_images = {}  # image key -> buddies that have it
+        self._images = OrderedDict()  # image key -> pixbuf, received
+        self._waiting_images = {}  # image key -> callbacks
+        self._seq = 0  # sequence number of the last message I sent
+        self._seqs = {}  # buddy key -> sequence number of its last message
+        self._tail = None  # (buddy, message), while waiting for a snapshot
+        self._snapshot_id = None
         self._setup_dispatch_table()
 
     def setup(self):
@@ -66,6 +101,9 @@ class Collaboration():
         self.collab = CollabWrapper(self._activity)
         self.collab.connect('message', self._message_cb)
         self.collab.connect('joined', self._joined_cb)
+        self.collab.connect('buddy_joined', self._buddy_joined_cb)
+        self.collab.connect('buddy_left', self._buddy_left_cb)
+        self.collab.connect('incoming_file', self._incoming_file_cb)
         self.collab.setup()
 
     def _setup_dispatch_table(self):
@@ -85,9 +123,22 @@ class Collaboration():
             'p': self._set_pen_state,
             'F': self._fill_polygon,
             'P': self._draw_pixbuf,
+            'I': self._receive_image,
             'B': self._paste,
             'S': self._speak
         }
+        # Events in batches, applied to the turtle that sent them
+        self._batch_methods = {
+            'f': lambda turtle, x: turtle.forward(x, False),
+            'a': lambda turtle, ar: turtle.arc(ar[0], ar[1], False),
+            'r': lambda turtle, h: turtle.set_heading(h, False),
+            'x': lambda turtle, xy: turtle.set_xy(xy[0], xy[1], share=False),
+            'c': lambda turtle, x: turtle.set_color(x, False),
+            'g': lambda turtle, x: turtle.set_gray(x, False),
+            's': lambda turtle, x: turtle.set_shade(x, False),
+            'w': lambda turtle, x: turtle.set_pen_size(x, False),
+            'p': lambda turtle, x: turtle.set_pen_state(x, False)
+        }
 
     def _activity_shared_cb(self, activity):
         self._tw.set_sharing(True)
@@ -103,6 +154,8 @@ class Collaboration():
         self.initiating = False
         # Joiner is to request current state from sharer.
         self.waiting_for_turtles = True
+        # Messages are held back until the snapshot is here
+        self._tail = []
         self._enable_share_button()
 
     def _joined_cb(self, collab):
@@ -114,6 +167,16 @@ class Collaboration():
         event = data_to_string([self._get_nick(), colors])
         debug_output(event, self._tw.running_sugar)
         self.send_event('t', event)
+        if self._tail is not None:
+            self.collab.post({'action': SNAPSHOT_REQUEST})
+            self._snapshot_id = GLib.timeout_add(_SNAPSHOT_TIMEOUT_MS,
+                                                 self._snapshot_timeout_cb)
+
+    def _buddy_joined_cb(self, collab, buddy):
+        self._buddies.add(buddy.props.key)
+
+    def _buddy_left_cb(self, collab, buddy):
+        self._buddies.discard(buddy.props.key)
 
     def _enable_share_button(self):
         self._activity.share_button.set_icon_name('shareon')
@@ -128,6 +191,22 @@ class Collaboration():
 
         action = msg.get('action')
 
+        if action == SNAPSHOT_REQUEST:
+            if self.initiating and buddy is not None:
+                self._send_snapshot(buddy)
+            return
+
+        if self._tail is not None:
+            self._tail.append((buddy, msg))
+            return
+
+        if buddy is not None and 'seq' in msg:
+            self._seqs[buddy.props.key] = msg['seq']
+
+        if action == BATCH_ACTION:
+            self._receive_batch(msg.get('event'))
+            return
+
         if action in self._processing_methods:
             save_active_turtle = self._tw.turtles.get_active_turtle()
             self._processing_methods[action](msg.get('event'))
@@ -141,10 +220,55 @@ class Collaboration():
         error_output('unhandled action %r' % action)
 
     def send_event(self, action, event):
-        """ Send event through the tube. """
-        event = {'action': action, 'event': event}
+        """ Send event through the tube. Turtle motion and pen events are
+        batched, and sent once per frame or once a batch is full. """
+        if action in MOTION_ACTIONS:
+            [nick, value] = data_from_string(event)
+            self._batch.add(action, nick, value)
+            if len(self._batch) >= _BATCH_EVENTS:
+                self.flush_events()
+            elif self._batch_id is None:
+                self._batch_id = GLib.timeout_add(_BATCH_MS, self._batch_cb)
+            return
 
-        self.collab.post(event)
+        self.flush_events()  # The batched events come first
+        self._post({'action': action, 'event': event})
+
+    def _post(self, msg):
+        """ Post a message, numbered so that a joiner can tell whether it
+        came before or after its snapshot """
+        self._seq += 1
+        msg['seq'] = self._seq
+        self.collab.post(msg)
+
+    def flush_events(self):
+        """ Send the batched events now """
+        if self._batch_id is not None:
+            GLib.source_remove(self._batch_id)
+            self._batch_id = None
+        if len(self._batch) > 0:
+            self._post({'action': BATCH_ACTION,
+                        'event': self._batch.encode()})
+
+    def _batch_cb(self):
+        self._batch_id = None
+        self.flush_events()
+        return False
+
+    def _receive_batch(self, payload):
+        """ Apply a batch of motion and pen events, turtle by turtle """
+        save_active_turtle = self._tw.turtles.get_active_turtle()
+        current_nick = None
+        for action, nick, value in decode(payload):
+            if nick == self._tw.nick:
+                continue
+            if nick != current_nick:
+                self._tw.turtles.set_turtle(nick)
+                turtle = self._tw.turtles.get_active_turtle()
+                current_nick = nick
+            self._batch_methods[action](turtle, value)
+        self._tw.turtles.set_turtle(
+            self._tw.turtles.get_turtle_key(save_active_turtle))
 
     def _turtle_request(self, payload):
         ''' incoming turtle from a joiner '''
@@ -224,35 +348,206 @@ class Collaboration():
                 [self._get_nick(),
                  int(self._tw.turtles.get_active_turtle().get_heading())]))
 
+    def share_image(self, pixbuf):
+        """ Make sure every buddy has an image; returns the key to send in
+        its place. Each image is sent once, small ones through the text
+        channel and larger ones by file transfer. """
+        key = 'sha1:' + hashlib.sha1(
+            b'%d,%d,%d,' % (pixbuf.get_width(), pixbuf.get_height(),
+                            pixbuf.get_rowstride()) +
+            pixbuf.get_pixels()).hexdigest()
+        have = self._shared_images.setdefault(key, set())
+        missing = self._buddies - have
+        if not missing and have:
+            return key
+        data = pixbuf_to_png(pixbuf)
+        if len(data) <= _INLINE_IMAGE_SIZE:
+            self.send_event('I', data_to_string(
+                [self._get_nick(),
+                 [key, base64.b64encode(data).decode('ascii')]]))
+        else:
+            for buddy in self.collab.shared_activity.get_joined_buddies():
+                if buddy.props.key in missing:
+                    self.collab.send_file_memory(buddy, data, {'image': key})
+        have.update(self._buddies)
+        return key
+
+    def _add_image(self, key, pixbuf):
+        self._images[key] = pixbuf
+        if len(self._images) > _IMAGE_CACHE_SIZE:
+            self._images.popitem(last=False)
+        callbacks = self._waiting_images.pop(key, [])
+        if callbacks:
+            save_active_turtle = self._tw.turtles.get_active_turtle()
+            for callback in callbacks:
+                callback(pixbuf)
+            self._tw.turtles.set_turtle(
+                self._tw.turtles.get_turtle_key(save_active_turtle))
+
+    def _receive_image(self, payload):
+        if len(payload) > 0:
+            [nick, [key, data]] = data_from_string(payload)
+            if nick != self._tw.nick:
+                self._add_image(key, png_to_pixbuf(base64.b64decode(data)))
+
+    def _incoming_file_cb(self, collab, ft, desc):
+        if not isinstance(desc, dict):
+            return
+        if 'snapshot' in desc:
+            if self._tail is None:
+                return  # Too late, or not asked for
+
+            def _ready_cb(ft, stream):
+                stream.close(None)
+                self._receive_snapshot(stream.steal_as_bytes().get_data())
+        elif 'image' in desc:
+            def _ready_cb(ft, stream):
+                stream.close(None)
+                data = stream.steal_as_bytes().get_data()
+                self._add_image(desc['image'], png_to_pixbuf(data))
+        else:
+            return
+
+        ft.connect('ready', _ready_cb)
+        ft.accept_to_memory()
+
+    def _with_image(self, data, width, height, callback):
+        """ Call back with the pixbuf of a shared image, when it is here:
+        data is an image key, or the image itself, base64 encoded, from
+        older versions. """
+        def _scaled(pixbuf):
+            callback(pixbuf.scale_simple(width, height,
+                                         GdkPixbuf.InterpType.BILINEAR))
+
+        if ':' not in data:
+            _scaled(png_to_pixbuf(base64.b64decode(data)))
+        elif data in self._images:
+            self._images.move_to_end(data)
+            _scaled(self._images[data])
+        else:
+            self._waiting_images.setdefault(data, []).append(_scaled)
+
+    def _send_snapshot(self, buddy):
+        """ Send a joiner the canvas and the turtles as they are, with the
+        sequence number of the last message seen from everyone, so that
+        it only needs to apply the messages that come after it """
+        self.flush_events()
+        seqs = dict(self._seqs)
+        seqs[self.owner.props.key] = self._seq
+        turtles = {}
+        for nick, turtle in self._tw.turtles.dict.items():
+            if nick not in self._tw.remote_turtle_dictionary:
+                continue
+            xy = turtle.get_xy()
+            turtles[nick] = {'colors': self._tw.remote_turtle_dictionary[nick],
+                             'xy': [xy[0], xy[1]],
+                             'heading': turtle.get_heading(),
+                             'color': turtle.get_color(),
+                             'gray': turtle.get_gray(),
+                             'shade': turtle.get_shade(),
+                             'pen_size': turtle.get_pen_size(),
+                             'pen': turtle.get_pen_state()}
+        png = io.BytesIO()
+        copy_canvas_surface(self._tw.canvas).write_to_png(png)
+        header = json.dumps({'seqs': seqs, 'turtles': turtles})
+        debug_output('Sending a snapshot (%d bytes) to %s' %
+                     (len(header) + png.tell(), buddy.props.nick),
+                     self._tw.running_sugar)
+        self.collab.send_file_memory(
+            buddy, header.encode('utf-8') + b'\n' + png.getvalue(),
+            {'snapshot': 1})
+
+    def _receive_snapshot(self, data):
+        """ Start from the sharer's snapshot, then catch up with the
+        messages that came after it """
+        if self._tail is None:
+            return
+        try:
+            header, png = data.split(b'\n', 1)
+            header = json.loads(header.decode('utf-8'))
+            surface = cairo.ImageSurface.create_from_png(io.BytesIO(png))
+        except Exception as e:
+            error_output('Could not read the snapshot: %s' % e,
+                         self._tw.running_sugar)
+            self._finish_snapshot({})
+            return
+
+        # The snapshot is centered, as turtle coordinates are
+        w, h = surface.get_width(), surface.get_height()
+        self._tw.canvas.draw_surface(
+            surface, (self._tw.canvas.width - w) / 2.0,
+            (self._tw.canvas.height - h) / 2.0, w, h)
+
+        save_active_turtle = self._tw.turtles.get_active_turtle()
+        for nick, state in header['turtles'].items():
+            if nick == self._tw.nick:
+                continue
+            if nick not in self._tw.remote_turtle_dictionary:
+                self._tw.remote_turtle_dictionary[nick] = state['colors']
+                self._tw.turtles.set_turtle(nick, state['colors'])
+                self._tw.label_remote_turtle(nick, state['colors'])
+            self._tw.turtles.set_turtle(nick)
+            turtle = self._tw.turtles.get_active_turtle()
+            turtle.set_xy(state['xy'][0], state['xy'][1], share=False,
+                          pendown=False, dragging=True)
+            turtle.set_heading(state['heading'], False)
+            turtle.set_pen_size(state['pen_size'], False)
+            turtle.set_shade(state['shade'], False)
+            turtle.set_gray(state['gray'], False)
+            turtle.set_color(state['color'], False)
+            turtle.set_pen_state(state['pen'], False)
+        self._tw.turtles.set_turtle(
+            self._tw.turtles.get_turtle_key(save_active_turtle))
+        # The turtle dictionary may be in the snapshot rather than the tail
+        self.waiting_for_turtles = False
+        self.send_my_xy()
+        self._finish_snapshot(header['seqs'])
+
+    def _snapshot_timeout_cb(self):
+        self._snapshot_id = None
+        debug_output('No snapshot from the sharer', self._tw.running_sugar)
+        self._finish_snapshot({})
+        return False
+
+    def _finish_snapshot(self, seqs):
+        """ Apply the messages held back that are not in the snapshot """
+        if self._snapshot_id is not None:
+            GLib.source_remove(self._snapshot_id)
+            self._snapshot_id = None
+        tail, self._tail = self._tail, None
+        for buddy, msg in tail:
+            # Images only fill the cache, and may be used after the
+            # snapshot, as they are not sent again
+            if buddy is not None and msg.get('action') != 'I' and \
+                    msg.get('seq', 0) <= seqs.get(buddy.props.key, -1):
+                continue  # Already drawn in the snapshot
+            self._message_cb(self.collab, buddy, msg)
+
     def _reskin_turtle(self, payload):
         if len(payload) > 0:
             [nick, [width, height, data]] = data_from_string(payload)
             if nick != self._tw.nick:
-                if self._tw.running_sugar:
-                    tmp_path = get_path(self._tw.activity, 'instance')
-                else:
-                    tmp_path = '/tmp'
-                file_name = base64_to_image(data, tmp_path)
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(file_name,
-                                                                width, height)
-                self._tw.turtles.set_turtle(nick)
-                self._tw.turtles.get_active_turtle().set_shapes([pixbuf])
+
+                def _reskin(pixbuf):
+                    self._tw.turtles.set_turtle(nick)
+                    self._tw.turtles.get_active_turtle().set_shapes([pixbuf])
+
+                self._with_image(data, width, height, _reskin)
 
     def _draw_pixbuf(self, payload):
         if len(payload) > 0:
             [nick, [a, b, x, y, w, h, width, height, data]] =\
                 data_from_string(payload)
             if nick != self._tw.nick:
-                if self._tw.running_sugar:
-                    tmp_path = get_path(self._tw.activity, 'instance')
-                else:
-                    tmp_path = '/tmp'
-                file_name = base64_to_image(data, tmp_path)
-                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(file_name,
-                                                                width, height)
-                pos = self._tw.turtles.turtle_to_screen_coordinates((x, y))
-                self._tw.turtles.get_active_turtle().draw_pixbuf(
-                    pixbuf, a, b, pos[0], pos[1], w, h, file_name, False)
+                turtle = self._tw.turtles.get_active_turtle()
+
+                def _draw(pixbuf):
+                    pos = self._tw.turtles.turtle_to_screen_coordinates(
+                        (x, y))
+                    turtle.draw_pixbuf(
+                        pixbuf, a, b, pos[0], pos[1], w, h, None, False)
+
+                self._with_image(data, width, height, _draw)
 
     def _move_forward(self, payload):
         if len(payload) > 0:
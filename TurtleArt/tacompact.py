@@ -0,0 +1,330 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+A compact binary form of the project data that is saved as JSON in .ta
+and .tb files (see TurtleArtWindow.assemble_data_to_save), for fast
+saving and loading; compact projects are saved as .tbc files. Converting
+JSON -> compact -> JSON gives back the same data. From the top directory
+run:
+
+    python3 -m TurtleArt.tacompact input output
+
+or turtleblocks.py --convert input output. The output is compact unless
+the input already is, in which case it is converted back to JSON.
+
+The file starts with a header (magic number; number of rows, floats,
+connections and strings), followed by little-endian columns:
+
+    floats      float64, positions that are not integers
+    x, y        int32 per row, the position or an index in the floats
+    id          int32 per row
+    name        int32 per row, index of the block name in the strings
+    value       int32 per row, index of the JSON of the value, or -1
+    extra       int32 per row, index of the JSON list of the fields after
+                the connections (e.g. private data), or -1
+    flags       int32 per row (see _X_IS_FLOAT...)
+    connection offsets
+                int32 per row + 1, into the connections
+    connections int32 (-1 for None)
+    string offsets
+                int32 per string + 1, into the UTF-8 string data
+
+Rows that do not look like blocks (turtles, saved font scale) are kept
+whole, as JSON, in the name column.
+'''
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+MAGIC = b'TBCMPCT1'
+# magic, rows, floats, connections, strings
+_HEADER = struct.Struct('<8sIIII')
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+# flags
+_X_IS_FLOAT = 1  # x is an index in the floats
+_Y_IS_FLOAT = 2
+_NO_CONNECTIONS = 4  # connections is None
+_WHOLE_ROW = 8  # name is the JSON of the whole row
+
+
+def _tuplify(value):
+    ''' JSON lists as tuples, like tautils.json_load '''
+    if isinstance(value, list):
+        return tuple(_tuplify(v) for v in value)
+    return value
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_position(value):
+    if _is_int(value):
+        return -2 ** 31 <= value < 2 ** 31
+    return isinstance(value, float)
+
+
+def _is_block_row(row):
+    ''' Can the row be stored in the columns? '''
+    if not isinstance(row, (list, tuple)) or len(row) < 5:
+        return False
+    if not _is_int(row[0]) or not -2 ** 31 <= row[0] < 2 ** 31:
+        return False
+    name = row[1]
+    if isinstance(name, (list, tuple)):
+        if len(name) != 2 or not isinstance(name[0], str):
+            return False
+    elif not isinstance(name, str):
+        return False
+    if not (_is_position(row[2]) and _is_position(row[3])):
+        return False
+    if row[4] is not None:
+        if not isinstance(row[4], (list, tuple)):
+            return False
+        for c in row[4]:
+            if c is not None and (not _is_int(c) or not 0 <= c < 2 ** 31):
+                return False
+    return True
+
+
+def encode(data):
+    ''' Pack project data (a list of rows) into bytes '''
+    strings = []
+    string_index = {}
+
+    def _add_string(text):
+        if text not in string_index:
+            string_index[text] = len(strings)
+            strings.append(text)
+        return string_index[text]
+
+    floats = array('d')
+    xs, ys = array('i'), array('i')
+    ids, names, values, extras, flags = (array('i') for i in range(5))
+    connection_offsets = array('i', [0])
+    connections = array('i')
+    for row in data:
+        if not _is_block_row(row):
+            xs.append(0)
+            ys.append(0)
+            ids.append(0)
+            names.append(_add_string(json.dumps(row)))
+            values.append(-1)
+            extras.append(-1)
+            flags.append(_WHOLE_ROW)
+            connection_offsets.append(len(connections))
+            continue
+        flag = 0
+        if _is_int(row[2]):
+            xs.append(row[2])
+        else:
+            flag |= _X_IS_FLOAT
+            xs.append(len(floats))
+            floats.append(row[2])
+        if _is_int(row[3]):
+            ys.append(row[3])
+        else:
+            flag |= _Y_IS_FLOAT
+            ys.append(len(floats))
+            floats.append(row[3])
+        ids.append(row[0])
+        if isinstance(row[1], str):
+            names.append(_add_string(row[1]))
+            values.append(-1)
+        else:
+            names.append(_add_string(row[1][0]))
+            values.append(_add_string(json.dumps(row[1][1])))
+        if len(row) > 5:
+            extras.append(_add_string(json.dumps(list(row[5:]))))
+        else:
+            extras.append(-1)
+        if row[4] is None:
+            flag |= _NO_CONNECTIONS
+        else:
+            for c in row[4]:
+                connections.append(-1 if c is None else c)
+        connection_offsets.append(len(connections))
+        flags.append(flag)
+
+    encoded = [s.encode('utf-8') for s in strings]
+    string_offsets = array('i', [0])
+    for s in encoded:
+        string_offsets.append(string_offsets[-1] + len(s))
+
+    columns = [floats, xs, ys, ids, names, values, extras, flags,
+               connection_offsets, connections, string_offsets]
+    if not _LITTLE_ENDIAN:
+        for column in columns:
+            column.byteswap()
+    chunks = [_HEADER.pack(MAGIC, len(ids), len(floats), len(connections),
+                           len(strings)),
+              b'\0' * (-_HEADER.size % 8)]  # Align the floats
+    for column in columns:
+        chunks.append(column.tobytes())
+    chunks.extend(encoded)
+    return b''.join(chunks)
+
+
+class CompactProject(object):
+
+    ''' Read-only sequence of the rows of a compact project, decoded from
+    the buffer (bytes, mmap...) only when they are asked for '''
+
+    def __init__(self, buffer):
+        self._buffer = buffer  # Keep it alive while the views are in use
+        view = memoryview(buffer)
+        magic, rows, n_floats, n_connections, n_strings = \
+            _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError('not a compact project')
+        pos = _HEADER.size + (-_HEADER.size % 8)
+
+        def _column(code, n):
+            nonlocal pos
+            size = n * struct.calcsize(code)
+            if pos + size > len(view):
+                raise ValueError('truncated compact project')
+            column = view[pos:pos + size]
+            pos += size
+            if _LITTLE_ENDIAN:
+                return column.cast(code)
+            column = array(code, column.tobytes())
+            column.byteswap()
+            return column
+
+        self._floats = _column('d', n_floats)
+        self._x = _column('i', rows)
+        self._y = _column('i', rows)
+        self._ids = _column('i', rows)
+        self._names = _column('i', rows)
+        self._values = _column('i', rows)
+        self._extras = _column('i', rows)
+        self._flags = _column('i', rows)
+        self._connection_offsets = _column('i', rows + 1)
+        self._connections = _column('i', n_connections)
+        self._string_offsets = _column('i', n_strings + 1)
+        self._string_data = view[pos:]
+        if len(self._string_data) < self._string_offsets[-1]:
+            raise ValueError('truncated compact project')
+        self._strings = {}
+        self._json_values = {}
+        self._rows = rows
+
+    def _string(self, i):
+        if i not in self._strings:
+            self._strings[i] = str(self._string_data[
+                self._string_offsets[i]:self._string_offsets[i + 1]],
+                'utf-8')
+        return self._strings[i]
+
+    def _json(self, i):
+        ''' The value of the JSON in string i (shared, as it is immutable) '''
+        if i not in self._json_values:
+            self._json_values[i] = _tuplify(json.loads(self._string(i)))
+        return self._json_values[i]
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._rows))]
+        if i < 0:
+            i += self._rows
+        if not 0 <= i < self._rows:
+            raise IndexError('row index out of range')
+        flag = self._flags[i]
+        if flag & _WHOLE_ROW:
+            return self._json(self._names[i])
+        name = self._string(self._names[i])
+        if self._values[i] != -1:
+            name = (name, self._json(self._values[i]))
+        x, y = self._x[i], self._y[i]
+        if flag & _X_IS_FLOAT:
+            x = self._floats[x]
+        if flag & _Y_IS_FLOAT:
+            y = self._floats[y]
+        if flag & _NO_CONNECTIONS:
+            connections = None
+        else:
+            connections = tuple(
+                None if c == -1 else c for c in self._connections[
+                    self._connection_offsets[i]:
+                    self._connection_offsets[i + 1]])
+        row = (self._ids[i], name, x, y, connections)
+        if self._extras[i] != -1:
+            row += self._json(self._extras[i])
+        return row
+
+    def __iter__(self):
+        for i in range(self._rows):
+            yield self[i]
+
+
+def is_compact_file(path):
+    ''' Does the file hold a compact project? '''
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def load(path):
+    ''' Map a compact project file into memory and return its rows as a
+    CompactProject '''
+    with open(path, 'rb') as f:
+        return CompactProject(mmap.mmap(f.fileno(), 0,
+                                        access=mmap.ACCESS_READ))
+
+
+def save(data, path):
+    ''' Write project data to a compact project file '''
+    encoded = encode(data)
+    with open(path, 'wb') as f:
+        f.write(encoded)
+
+
+def main(args):
+    ''' Convert between compact projects and .ta JSON '''
+    if len(args) != 2:
+        print('usage: tacompact.py input output')
+        return 2
+    from .tautils import data_from_file, data_to_file
+
+    source, destination = args
+    if is_compact_file(source):
+        data_to_file(list(load(source)), destination)
+    else:
+        data = data_from_file(source)
+        if data is None:
+            print('could not read %s' % (source))
+            return 1
+        save(data, destination)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
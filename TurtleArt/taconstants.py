@@ -26,6 +26,8 @@ from gettext import gettext as _
 
 # Packaging constants
 SUFFIX = ('.ta', '.tb')
+COMPACT_SUFFIX = '.tbc'  # Compact projects (see tacompact)
+PROJECT_SUFFIXES = SUFFIX + (COMPACT_SUFFIX,)  # Projects that can be loaded
 MAGICNUMBER = 'TB'
 MIMETYPE = ['application/x-turtle-art', 'application/vnd.turtleblocks']
 
@@ -0,0 +1,182 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Batches of turtle motion and pen events for sharing.
+
+Rather than one message per forward, right, setxy... the events are added
+to an EventBatch, which is sent once per frame as a single BATCH_ACTION
+message. Adjacent events of a turtle are coalesced: forwards add up, and
+only the last of a run of headings or pen settings is kept. The events
+are packed as variable-length integers (setxy as the difference from the
+turtle's previous position in the batch), base64 encoded for the text
+channel. Events with values that are not integers are kept as they are.
+
+    batch.add('f', nick, 10)
+    ...
+    payload = batch.encode()
+    for action, nick, value in decode(payload):
+        ...
+'''
+
+import base64
+
+BATCH_ACTION = 'E'
+# Actions that can be batched, by their code in the packed events
+MOTION_ACTIONS = 'frxacgswp'
+_CODES = dict((action, i) for i, action in enumerate(MOTION_ACTIONS))
+# Only the last of a run of these matters
+_ABSOLUTE_ACTIONS = 'rcgswp'
+
+
+def _is_int(value):
+    return isinstance(value, int)  # bool too, for the pen state
+
+
+def _zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def _put_varint(out, n):
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _values(action, value):
+    ''' The integers to pack for an event, or None if it cannot be
+    packed '''
+    if action in 'xa':
+        if isinstance(value, (list, tuple)) and len(value) == 2 and \
+                _is_int(value[0]) and _is_int(value[1]):
+            return [int(value[0]), int(value[1])]
+        return None
+    if _is_int(value):
+        return [int(value)]
+    return None
+
+
+class EventBatch(object):
+
+    ''' Motion and pen events waiting to be sent '''
+
+    def __init__(self):
+        self._events = []  # [action, nick, value]
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, action, nick, value):
+        ''' Add an event (action in MOTION_ACTIONS), coalescing it with the
+        previous one if possible '''
+        if self._events:
+            last = self._events[-1]
+            if last[0] == action and last[1] == nick:
+                if action in _ABSOLUTE_ACTIONS:
+                    last[2] = value
+                    return
+                if action == 'f' and _is_int(last[2]) and _is_int(value):
+                    last[2] += value
+                    return
+        self._events.append([action, nick, value])
+
+    def encode(self):
+        ''' Encode the events as a JSON-encodable payload, and empty the
+        batch: [nicks, chunks], where each chunk is a base64 string of
+        packed events or an [action, nick index, value] event '''
+        nicks = []
+        nick_index = {}
+        positions = {}  # nick -> last (x, y) in the batch
+        chunks = []
+        packed = bytearray()
+        for action, nick, value in self._events:
+            if nick not in nick_index:
+                nick_index[nick] = len(nicks)
+                nicks.append(nick)
+            i = nick_index[nick]
+            values = _values(action, value)
+            if values is None:
+                if packed:
+                    chunks.append(base64.b64encode(packed).decode('ascii'))
+                    packed = bytearray()
+                chunks.append([action, i, value])
+                if action == 'x':
+                    positions.pop(nick, None)
+                continue
+            if action == 'x':
+                x, y = values
+                last_x, last_y = positions.get(nick, (0, 0))
+                positions[nick] = (x, y)
+                values = [x - last_x, y - last_y]
+            packed.append(_CODES[action])
+            _put_varint(packed, i)
+            for n in values:
+                _put_varint(packed, _zigzag(n))
+        if packed:
+            chunks.append(base64.b64encode(packed).decode('ascii'))
+        self._events = []
+        return [nicks, chunks]
+
+
+def decode(payload):
+    ''' Yield the (action, nick, value) events of an encoded batch '''
+    nicks, chunks = payload
+    positions = {}
+    for chunk in chunks:
+        if not isinstance(chunk, str):
+            action, i, value = chunk
+            if action == 'x':
+                positions.pop(nicks[i], None)
+            yield action, nicks[i], value
+            continue
+        data = base64.b64decode(chunk)
+        pos = 0
+        while pos < len(data):
+            action = MOTION_ACTIONS[data[pos]]
+            i, pos = _get_varint(data, pos + 1)
+            nick = nicks[i]
+            n, pos = _get_varint(data, pos)
+            value = _unzigzag(n)
+            if action in 'xa':
+                n, pos = _get_varint(data, pos)
+                value = [value, _unzigzag(n)]
+                if action == 'x':
+                    last_x, last_y = positions.get(nick, (0, 0))
+                    value = [last_x + value[0], last_y + value[1]]
+                    positions[nick] = tuple(value)
+            elif action == 'p':
+                value = bool(value)
+            yield action, nick, value
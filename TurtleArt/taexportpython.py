@@ -21,6 +21,8 @@
 """ Python export tool """
 
 import ast
+import hashlib
+from collections import OrderedDict
 from gettext import gettext as _
 from os import linesep
 from os import path, pardir
@@ -31,6 +33,8 @@ from .util import codegen
 # from ast_pprint import * # only used for debugging, safe to comment out
 
 from .talogo import LogoCode
+from .tablock import Media
+from .taconstants import (CONSTANTS, Color, Vector)
 from .taprimitive import (ast_yield_true, Primitive, PyExportError,
                           value_to_ast)
 from .tautils import (find_group, find_top_block, get_stack_name)
@@ -119,6 +123,13 @@ ACTION["%s"] = %s
 # character that is illegal in a Python identifier
 PAT_IDENTIFIER_ILLEGAL_CHAR = re.compile("[^A-Za-z0-9_]")
 
+# Compiled action stacks, by the hash of their blocks
+_CODE_CACHE_SIZE = 64
+# Blocks that the exported code gets wrong: there is no AST for 'return',
+# and the value of 'returnstack' is not returned (see Primitive.get_ast)
+_NOT_COMPILABLE = ('return', 'returnstack')
+_code_cache = OrderedDict()
+
 
 def save_python(tw):
     """ Find all the action stacks and turn each into Python code """
@@ -156,9 +167,10 @@ def save_python(tw):
     return ''.join(snippets)
 
 
-def _action_stack_to_python(block, tw, name='start'):
+def _action_stack_to_python(block, tw, name='start', setup=True):
     """ Turn a stack of blocks into Python code
-    name -- the name of the action stack (defaults to "start") """
+    name -- the name of the action stack (defaults to "start")
+    setup -- set up the plugins and the globals in the start stack? """
 
     if isinstance(name, int):
         name = float(name)
@@ -176,7 +188,7 @@ def _action_stack_to_python(block, tw, name='start'):
 
     # wrap the action stack setup code around everything
     name_id = _make_identifier(name)
-    if name == 'start':
+    if name == 'start' and setup:
         pre_preamble = _START_STACK_START_ADD
         for k in plugins_in_use:
             pre_preamble += '    global %s\n' % (k.lower(),)
@@ -197,6 +209,82 @@ def _action_stack_to_python(block, tw, name='start'):
     return ''.join(snippets)
 
 
+def _stack_hash(top_block, name):
+    """ Hash the structure of a stack of blocks: the names and values of
+    the blocks and how they are connected """
+    group = find_group(top_block)
+    index = dict((id(blk), i) for i, blk in enumerate(group))
+    parts = [repr(name)]
+    for blk in group:
+        connections = [None if c is None else index.get(id(c), -1)
+                       for c in blk.connections]
+        parts.append(repr((blk.name, blk.values, connections)))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def compile_action_stack(block, tw, name):
+    """ Compile a stack of blocks into code that, run in the namespace
+    from compiled_namespace, defines the generator function ACTION[name].
+    Raises PyExportError (or an error from the code generator) if the
+    stack cannot be compiled. """
+    for blk in find_group(block):
+        if blk.name in _NOT_COMPILABLE:
+            raise PyExportError(_('block is not exportable'), block=blk)
+    key = _stack_hash(block, name)
+    code = _code_cache.get(key)
+    if code is None:
+        source = _action_stack_to_python(block, tw, name=name, setup=False)
+        code = compile(source, '<%s>' % (name), 'exec')
+        _code_cache[key] = code
+        if len(_code_cache) > _CODE_CACHE_SIZE:
+            _code_cache.popitem(last=False)
+    else:
+        _code_cache.move_to_end(key)
+    return code
+
+
+def compile_action_stacks(top, tw):
+    """ Compile the stack of blocks that starts at top and all of the
+    action stacks. Returns the name of the stack in ACTION and the list of
+    code objects. """
+    name = get_stack_name(top)
+    if name is None:
+        name = ' run'  # Not the name of any action stack
+    codes = [compile_action_stack(top, tw, name)]
+    for block in tw.just_blocks():
+        if block is top or block.connections is None or \
+                (block.connections and block.connections[0] is not None):
+            continue
+        stack_name = get_stack_name(block)
+        if stack_name and stack_name != name:
+            codes.append(compile_action_stack(block, tw, stack_name))
+    return name, codes
+
+
+def compiled_namespace(tw):
+    """ The globals that compiled action stacks run with: the ones that the
+    exported Python code sets up, bound to the running window """
+    namespace = {}
+    exec('from time import *\n'
+         'from random import uniform\n'
+         'from math import *\n', namespace)
+    global_objects = tw.get_global_objects()
+    for key, value in global_objects.items():
+        namespace[key.lower()] = value
+    namespace.update({'tw': tw,
+                      'global_objects': global_objects,
+                      'turtles': tw.turtles,
+                      'canvas': tw.canvas,
+                      'logo': tw.lc,
+                      'BOX': tw.lc.boxes,
+                      'ACTION': {},
+                      'CONSTANTS': CONSTANTS,
+                      'Color': Color,
+                      'Vector': Vector,
+                      'Media': Media})
+    return namespace
+
+
 def _walk_action_stack(top_block, lc, convert_me=True):
     """ Turn a stack of blocks into a list of ASTs
     convert_me -- convert values and Primitives to ASTs or return them
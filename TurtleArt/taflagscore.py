@@ -0,0 +1,216 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Score how close a turtle drawing is to a reference image, such as a flag
+from samples/thumbnails.
+
+Pixels are kept as native-endian 32-bit cairo pixels (0xAARRGGBB) and all
+of the per-pixel work is done with NumPy, which is optional: HAS_NUMPY is
+False (and the scoring functions raise RuntimeError) when it is missing.
+
+    score = score_canvas(tw.canvas, 'samples/thumbnails/Chad.png',
+                         region=(x, y, w, h))
+    score['score']         # 0 (nothing alike) ... 1 (same colors, same place)
+    score['iou']           # {palette entry: intersection over union}
+    score['region_error']  # RMS color error of each cell of a grid
+'''
+
+import cairo
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+from .tacanvas import COLOR_TABLE
+from .taconstants import DEFAULT_BACKGROUND_COLOR
+from .tautils import get_canvas_data
+
+# Palette used to classify pixels into color bands: the 100 turtle colors
+# followed by black and white.
+PALETTE = COLOR_TABLE + (0x000000, 0xFFFFFF)
+BLACK = len(COLOR_TABLE)
+WHITE = BLACK + 1
+
+_MAX_DISTANCE = (3 * 255 ** 2) ** 0.5
+_palette_lut = None  # 15-bit RGB -> nearest palette entry
+_references = {}  # (path, width, height, background) -> pixels
+
+
+def _check_numpy():
+    if not HAS_NUMPY:
+        raise RuntimeError('NumPy is needed to score drawings')
+
+
+def _channels(pixels):
+    ''' Split 32-bit pixels into (r, g, b) int32 arrays '''
+    pixels = pixels.astype(numpy.int32)
+    return ((pixels >> 16) & 0xFF, (pixels >> 8) & 0xFF, pixels & 0xFF)
+
+
+def _get_palette_lut():
+    ''' Nearest palette entry for each color, at 5 bits per channel '''
+    global _palette_lut
+    if _palette_lut is None:
+        palette = numpy.array(PALETTE, dtype=numpy.uint32)
+        pr, pg, pb = _channels(palette)
+        # Centers of the 32 * 32 * 32 color cells
+        levels = numpy.arange(32, dtype=numpy.int32) * 8 + 4
+        g = levels[:, None, None]
+        b = levels[None, :, None]
+        lut = numpy.empty((32, 32 * 32), dtype=numpy.uint8)
+        for i, r in enumerate(levels):  # One red level at a time
+            distance = (r - pr) ** 2 + (g - pg) ** 2 + (b - pb) ** 2
+            lut[i] = distance.reshape(32 * 32, len(PALETTE)).argmin(axis=1)
+        _palette_lut = lut.ravel()
+    return _palette_lut
+
+
+def nearest_palette(pixels):
+    ''' Map 32-bit pixels to the index of the nearest PALETTE entry '''
+    _check_numpy()
+    pixels = pixels.astype(numpy.uint32, copy=False)
+    key = ((pixels >> 9) & 0x7C00) | ((pixels >> 6) & 0x3E0) | \
+        ((pixels >> 3) & 0x1F)
+    return _get_palette_lut()[key]
+
+
+def surface_data_to_pixels(data, width, height):
+    ''' View the data of a cairo RGB24/ARGB32 image surface as a
+    (height, width) array of 32-bit pixels '''
+    _check_numpy()
+    pixels = numpy.frombuffer(data, dtype=numpy.uint32)
+    stride = len(pixels) // height
+    return pixels.reshape(height, stride)[:, :width]
+
+
+def canvas_to_pixels(canvas):
+    ''' The turtle canvas (a TurtleGraphics) as an array of pixels '''
+    return surface_data_to_pixels(get_canvas_data(canvas), canvas.width,
+                                  canvas.height)
+
+
+def _resample(pixels, width, height):
+    ''' Nearest-neighbour scaling '''
+    src_height, src_width = pixels.shape
+    rows = numpy.arange(height) * src_height // height
+    cols = numpy.arange(width) * src_width // width
+    return pixels[rows[:, None], cols[None, :]]
+
+
+def load_reference(path, width, height,
+                   background=DEFAULT_BACKGROUND_COLOR):
+    ''' Load a PNG, composite it over the background color and scale it to
+    width x height. Results are cached. '''
+    _check_numpy()
+    key = (path, width, height, tuple(background))
+    if key in _references:
+        return _references[key]
+    surface = cairo.ImageSurface.create_from_png(path)
+    surface.flush()
+    pixels = surface_data_to_pixels(surface.get_data(), surface.get_width(),
+                                    surface.get_height())
+    pixels = _resample(pixels, width, height).astype(numpy.uint32)
+    if surface.get_format() == cairo.FORMAT_ARGB32:
+        # Colors are premultiplied by alpha
+        r, g, b = _channels(pixels)
+        transparency = 255 - ((pixels >> 24) & 0xFF).astype(numpy.int32)
+        r = r + transparency * background[0] // 255
+        g = g + transparency * background[1] // 255
+        b = b + transparency * background[2] // 255
+        pixels = ((r << 16) | (g << 8) | b).astype(numpy.uint32)
+    pixels.flags.writeable = False
+    _references[key] = pixels
+    return pixels
+
+
+def band_iou(drawing_bands, reference_bands):
+    ''' Intersection over union of each palette entry used in either
+    image, as {entry: iou} '''
+    _check_numpy()
+    n = len(PALETTE)
+    joint = numpy.bincount(
+        drawing_bands.ravel().astype(numpy.int32) * n +
+        reference_bands.ravel(), minlength=n * n).reshape(n, n)
+    intersection = numpy.diag(joint)
+    union = joint.sum(axis=0) + joint.sum(axis=1) - intersection
+    used = numpy.nonzero(union)[0]
+    return dict(zip(used.tolist(),
+                    (intersection[used] / union[used]).tolist()))
+
+
+def region_error(drawing, reference, grid=(4, 4)):
+    ''' RMS color distance (0...1) in each cell of a rows x columns grid '''
+    _check_numpy()
+    dr, dg, db = _channels(drawing)
+    rr, rg, rb = _channels(reference)
+    squared = ((dr - rr) ** 2 + (dg - rg) ** 2 + (db - rb) ** 2).astype(
+        numpy.float64)
+    height, width = squared.shape
+    grid = (min(grid[0], height), min(grid[1], width))
+    rows = numpy.arange(grid[0]) * height // grid[0]
+    cols = numpy.arange(grid[1]) * width // grid[1]
+    sums = numpy.add.reduceat(numpy.add.reduceat(squared, rows, axis=0),
+                              cols, axis=1)
+    counts = numpy.diff(numpy.append(rows, height))[:, None] * \
+        numpy.diff(numpy.append(cols, width))[None, :]
+    return numpy.sqrt(sums / numpy.maximum(counts, 1)) / _MAX_DISTANCE
+
+
+def score_pixels(drawing, reference, grid=(4, 4)):
+    ''' Compare two arrays of 32-bit pixels of the same shape '''
+    _check_numpy()
+    drawing_bands = nearest_palette(drawing)
+    reference_bands = nearest_palette(reference)
+    iou = band_iou(drawing_bands, reference_bands)
+    # Weigh each band by how much of the reference it covers
+    weights = numpy.bincount(reference_bands.ravel(), minlength=len(PALETTE))
+    total = float(weights.sum())
+    score = 0.
+    for entry, value in iou.items():
+        score += value * weights[entry] / total
+    errors = region_error(drawing, reference, grid)
+    return {'score': score,
+            'iou': iou,
+            'region_error': errors,
+            'color_error': float(errors.mean()),
+            'bands': drawing_bands}
+
+
+def score_canvas(canvas, reference_path, region=None, grid=(4, 4),
+                 background=DEFAULT_BACKGROUND_COLOR):
+    ''' Score the drawing on the turtle canvas (a TurtleGraphics) against
+    a reference image. region is the (x, y, width, height) of the canvas
+    that the reference should cover (default: all of it). '''
+    _check_numpy()
+    pixels = canvas_to_pixels(canvas)
+    if region is None:
+        region = (0, 0, canvas.width, canvas.height)
+    x, y, width, height = [int(n) for n in region]
+    x = max(0, x)
+    y = max(0, y)
+    drawing = pixels[y:y + height, x:x + width]
+    height, width = drawing.shape
+    if width == 0 or height == 0:
+        raise ValueError('region %s is outside of the canvas' % (region,))
+    reference = load_reference(reference_path, width, height, background)
+    return score_pixels(drawing, reference, grid)
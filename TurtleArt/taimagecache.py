@@ -0,0 +1,306 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Caches for decoded images.
+
+ImageCache keeps the most recently used pixbufs decoded from files in
+memory. ThumbnailCache keeps pre-scaled thumbnails of image files in a
+single file on disk, which is mapped into memory when it is read.
+SurfaceCache keeps rendered cairo surfaces (such as block shapes), keyed
+by the content they were rendered from, in memory and on disk.
+'''
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from collections import OrderedDict
+
+import cairo
+from gi.repository import GLib
+from gi.repository import GdkPixbuf
+
+from .tautils import debug_output
+
+try:
+    # Try to use XDG Base Directory standard for cache files.
+    import xdg.BaseDirectory
+    CACHE_HOME = os.path.join(xdg.BaseDirectory.xdg_cache_home, 'turtleart')
+except ImportError:
+    # Default to `.cache` per the spec.
+    CACHE_HOME = os.path.expanduser(os.path.join('~', '.cache', 'turtleart'))
+
+
+def _file_stamp(path):
+    ''' The modification time and size of a file (or None) '''
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+class ImageCache:
+
+    ''' A least-recently-used cache of pixbufs decoded from image files,
+    keyed by path and size. A file that changes is decoded again. '''
+
+    def __init__(self, max_items=8):
+        self._max_items = max_items
+        self._pixbufs = OrderedDict()
+
+    def load(self, path, width=None, height=None):
+        ''' Return the image in path, scaled to fit width x height (keeping
+        its aspect ratio) unless width is None. Raises GLib.Error if the file
+        cannot be loaded. '''
+        key = (path, width, height)
+        stamp = _file_stamp(path)
+        if key in self._pixbufs:
+            cached_stamp, pixbuf = self._pixbufs[key]
+            if cached_stamp == stamp:
+                self._pixbufs.move_to_end(key)
+                return pixbuf
+            del self._pixbufs[key]
+        if width is None:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file(path)
+        else:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(path, width,
+                                                            height)
+        self._pixbufs[key] = (stamp, pixbuf)
+        while len(self._pixbufs) > self._max_items:
+            self._pixbufs.popitem(last=False)
+        return pixbuf
+
+    def clear(self):
+        self._pixbufs.clear()
+
+
+class ThumbnailCache:
+
+    ''' Thumbnails (scaled to fit width x height) of image files, kept in
+    one file: a magic number, the length of a JSON index and the index,
+    followed by the raw pixel data of every thumbnail. The index maps each
+    image path to [mtime, size, offset, length, width, height, rowstride,
+    has_alpha] so that stale entries are noticed. '''
+
+    _MAGIC = b'TATHUMB1'
+
+    def __init__(self, cache_path, width, height):
+        self._cache_path = cache_path
+        self._width = width
+        self._height = height
+        self._entries = {}
+        self._data = None
+        self._data_offset = 0
+        self._new_entries = {}  # path -> (stamp, pixbuf)
+        self._read()
+
+    def _read(self):
+        try:
+            with open(self._cache_path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):
+            return  # Missing or empty
+        try:
+            if data[:len(self._MAGIC)] != self._MAGIC:
+                raise ValueError('not a thumbnail cache')
+            start = len(self._MAGIC) + 4
+            (length,) = struct.unpack('<I', data[len(self._MAGIC):start])
+            index = json.loads(data[start:start + length].decode('utf-8'))
+            if index['size'] != [self._width, self._height]:
+                raise ValueError('thumbnails of another size')
+        except (ValueError, KeyError, struct.error) as e:
+            debug_output('ignoring thumbnail cache %s: %s' %
+                         (self._cache_path, e))
+            data.close()
+            return
+        self._entries = index['entries']
+        self._data = data
+        self._data_offset = start + length
+
+    def get(self, path):
+        ''' The cached thumbnail of path, or None if it is missing or
+        stale '''
+        stamp = _file_stamp(path)
+        if stamp is None:
+            return None
+        if path in self._new_entries:
+            if self._new_entries[path][0] == stamp:
+                return self._new_entries[path][1]
+            return None
+        entry = self._entries.get(path)
+        if entry is None or entry[:2] != stamp:
+            return None
+        offset, length, width, height, rowstride, has_alpha = entry[2:]
+        offset += self._data_offset
+        pixels = GLib.Bytes.new(self._data[offset:offset + length])
+        return GdkPixbuf.Pixbuf.new_from_bytes(
+            pixels, GdkPixbuf.Colorspace.RGB, has_alpha, 8, width, height,
+            rowstride)
+
+    def load(self, path):
+        ''' The thumbnail of path, from the cache or decoded (and added to
+        the cache). Raises GLib.Error if the file cannot be loaded. '''
+        pixbuf = self.get(path)
+        if pixbuf is None:
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(
+                path, self._width, self._height)
+            self._new_entries[path] = (_file_stamp(path), pixbuf)
+        return pixbuf
+
+    def save(self):
+        ''' Write the cache file, if any thumbnails were added '''
+        if not self._new_entries:
+            return
+        entries = {}
+        chunks = []
+        offset = 0
+
+        def _add(path, stamp, pixels, width, height, rowstride, has_alpha):
+            entries[path] = stamp + [offset, len(pixels), width, height,
+                                     rowstride, has_alpha]
+            chunks.append(pixels)
+            return offset + len(pixels)
+
+        for path, entry in self._entries.items():
+            if path in self._new_entries or _file_stamp(path) != entry[:2]:
+                continue  # Replaced or stale
+            start = self._data_offset + entry[2]
+            offset = _add(path, entry[:2], self._data[start:start + entry[3]],
+                          *entry[4:])
+        for path, (stamp, pixbuf) in self._new_entries.items():
+            offset = _add(path, stamp, pixbuf.get_pixels(),
+                          pixbuf.get_width(), pixbuf.get_height(),
+                          pixbuf.get_rowstride(), pixbuf.get_has_alpha())
+
+        index = json.dumps({'size': [self._width, self._height],
+                            'entries': entries}).encode('utf-8')
+        tmp_path = self._cache_path + '.tmp'
+        try:
+            directory = os.path.dirname(self._cache_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(tmp_path, 'wb') as f:
+                f.write(self._MAGIC)
+                f.write(struct.pack('<I', len(index)))
+                f.write(index)
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, self._cache_path)
+        except (IOError, OSError) as e:
+            debug_output('could not write thumbnail cache %s: %s' %
+                         (self._cache_path, e))
+            return
+        # Continue from the file that was just written
+        if self._data is not None:
+            self._data.close()
+        self._data = None
+        self._entries = {}
+        self._new_entries = {}
+        self._read()
+
+
+class SurfaceCache:
+
+    ''' Rendered ARGB32 surfaces, looked up by the content (such as an SVG
+    string) and size they were rendered from. The most recently used
+    surfaces are kept in memory, up to max_bytes of pixel data, and every
+    surface is also saved in cache_dir (if it is not None) for later
+    sessions. Surfaces are shared, so they must not be drawn on. '''
+
+    _HEADER = struct.Struct('<8sIII')  # magic, width, height, stride
+    _MAGIC = b'TASURF01'
+
+    def __init__(self, cache_dir=None, max_bytes=32 * 1024 * 1024):
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._surfaces = OrderedDict()
+
+    def lookup(self, content, width, height, render):
+        ''' Return the surface for content at width x height, calling
+        render() to make it if it is not cached '''
+        width, height = int(width), int(height)
+        key = hashlib.sha1(('%dx%d\n' % (width, height) + content).encode(
+            'utf-8')).hexdigest()
+        if key in self._surfaces:
+            self._surfaces.move_to_end(key)
+            return self._surfaces[key]
+        surface = self._read(key, width, height)
+        if surface is None:
+            surface = render()
+            self._write(key, surface)
+        self._surfaces[key] = surface
+        self._bytes += surface.get_stride() * surface.get_height()
+        while self._bytes > self._max_bytes and len(self._surfaces) > 1:
+            old = self._surfaces.popitem(last=False)[1]
+            self._bytes -= old.get_stride() * old.get_height()
+        return surface
+
+    def clear(self):
+        self._surfaces.clear()
+        self._bytes = 0
+
+    def _path(self, key):
+        return os.path.join(self._cache_dir, key[:2], key)
+
+    def _read(self, key, width, height):
+        if self._cache_dir is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+        try:
+            magic, w, h, stride = self._HEADER.unpack_from(data)
+        except struct.error:
+            return None
+        if magic != self._MAGIC or (w, h) != (width, height) or \
+                stride != cairo.ImageSurface.format_stride_for_width(
+                    cairo.FORMAT_ARGB32, w) or \
+                len(data) != self._HEADER.size + stride * h:
+            return None
+        return cairo.ImageSurface.create_for_data(
+            bytearray(data[self._HEADER.size:]), cairo.FORMAT_ARGB32, w, h,
+            stride)
+
+    def _write(self, key, surface):
+        if self._cache_dir is None or \
+                surface.get_format() != cairo.FORMAT_ARGB32:
+            return
+        path = self._path(key)
+        tmp_path = path + '.tmp'
+        surface.flush()
+        try:
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(tmp_path, 'wb') as f:
+                f.write(self._HEADER.pack(
+                    self._MAGIC, surface.get_width(), surface.get_height(),
+                    surface.get_stride()))
+                f.write(surface.get_data())
+            os.replace(tmp_path, path)
+        except (IOError, OSError) as e:
+            # Keep working from memory only
+            debug_output('could not write surface cache %s: %s' % (path, e))
+            self._cache_dir = None
@@ -27,7 +27,7 @@ import tempfile
 import urllib.error
 import urllib.parse
 import urllib.request
-from collections import UserDict
+from collections import (UserDict, deque)
 from os.path import exists as os_path_exists
 from time import time, sleep
 
@@ -42,14 +42,16 @@ USER_HOME = os.path.expanduser('~')
 import traceback
 
 from .tablock import (Block, Media, media_blocks_dictionary)
+from .taimagecache import ImageCache
 from .taconstants import (TAB_LAYER, DEFAULT_SCALE, ICON_SIZE)
 from .tajail import (myfunc, myfunc_import)
+from .tapacer import FramePacer
 from .tapalette import (block_names, value_blocks)
 from .tatype import (TATypeError, TYPES_NUMERIC)
 from .tautils import (get_pixbuf_from_journal, data_from_file, get_stack_name,
                       movie_media_type, audio_media_type, image_media_type,
                       text_media_type, round_int, debug_output, find_group,
-                      get_path, image_to_base64, data_to_string, data_to_file,
+                      get_path, data_to_string, data_to_file,
                       get_load_name, chooser_dialog)
 
 try:
@@ -63,6 +65,11 @@ from gettext import gettext as _
 
 primitive_dictionary = {}  # new block primitives get added here
 
+# Number of steps a context runs before the next one gets a turn
+_CONTEXT_TURN_STEPS = 32
+# The wake time of a context that waits for the others to finish
+_FOREVER = float('inf')
+
 
 class noKeyError(UserDict):
 
@@ -94,6 +101,35 @@ class logoerror(Exception):
         return str(self.value)
 
 
+class _NotCompilable(Exception):
+    """ Raised when a run of tokens has to be left to the interpreter """
+    pass
+
+
+class _Context(object):
+    """ The state of one of the stacks that run side by side (see
+    LogoCode.start_context): the generator being stepped, the generators
+    that called it, the line being evaluated and the turtle it draws with.
+    The state of the running context is kept in LogoCode itself. """
+
+    __slots__ = ('name', 'step', 'istack', 'iline', 'cfun', 'arglist',
+                 'iresult', 'procstop', 'bindex', 'turtle', 'wake', 'stopped')
+
+    def __init__(self, name, step, turtle):
+        self.name = name
+        self.step = step
+        self.istack = []
+        self.iline = None
+        self.cfun = None
+        self.arglist = None
+        self.iresult = None
+        self.procstop = False
+        self.bindex = None
+        self.turtle = turtle
+        self.wake = None  # When it is done waiting, while it waits
+        self.stopped = False  # Set to stop it at the end of this step
+
+
 class NegativeRootError(BaseException):
     """ Similar to the ZeroDivisionError, this error is raised at runtime
     when trying to computer the square root of a negative number. """
@@ -190,6 +226,31 @@ class LogoCode:
         self.step = None
         self.bindex = None
 
+        # Stacks started with 'start action' take turns with the main
+        # program, each in a context of its own
+        self._contexts = deque()  # Waiting for their turn
+        self._context = None  # The running context
+        self._turn_steps = 0
+        self.yield_turn = False  # Set to let the next context run now
+        self._main_step = None  # Bottom of the main program's generators
+
+        # How long each slice of steps lasts; while the program waits,
+        # the main loop runs and doevalstep resumes at _wake_time
+        self.pacer = FramePacer()
+        self._wake_time = None
+        self._resume_id = None
+
+        # Turbo runs neither highlight blocks nor call their before and
+        # after hooks, and update value block labels once per slice
+        self.turbo = False
+        self._quiet = False  # Set while a turbo run is running
+        self._pending_labels = {}  # (name, label) -> value
+
+        # Compile lines of code into closures rather than evaluating
+        # them token by token
+        self.compile_lines = True
+        self._compiled_lines = {}
+
         self.hidden_turtle = None
 
         self.trace = 0
@@ -197,6 +258,8 @@ class LogoCode:
         self.gplay = None
         self.filepath = None
         self.pixbuf = None
+        # Recently shown image files, decoded
+        self._image_cache = ImageCache()
         self.dsobject = None
         self.start_time = None
         self._disable_help = False
@@ -211,6 +274,9 @@ class LogoCode:
         # Clear istack and iline of any code that was not executed due to Stop
         self.istack = []
         self.iline = None
+        self._reset_contexts()
+        self._cancel_wake()  # Do not resume after a wait
+        self._end_quiet()
         self.tw.stop_plugins()
         if self.tw.gst_available:
             from .tagplay import stop_media
@@ -248,11 +314,13 @@ class LogoCode:
         """Run code generated by generate_code().
         """
         self.start_time = time()
+        self.pacer.start()
         self._setup_cmd(code)
 
     def generate_code(self, blk, blocks):
         """ Generate code to be passed to run_blocks() from a stack of blocks.
         """
+        self._compiled_lines = {}
         self._save_all_connections = []
         for b in blocks:
             tmp = []
@@ -382,11 +450,68 @@ class LogoCode:
 
     def _setup_cmd(self, string):
         """ Execute the psuedocode. """
+        self._setup_run()
+        blklist = self._readline(string)
+        self.step = self._start_eval(blklist)
+        self._main_step = self.step
+
+    def _setup_run(self):
         self.hidden_turtle = self.tw.turtles.get_active_turtle()
         self.hidden_turtle.hide()  # Hide the turtle while we are running.
         self.procstop = False
-        blklist = self._readline(string)
-        self.step = self._start_eval(blklist)
+        self._reset_contexts()
+        self._cancel_wake()
+        self._quiet = self.turbo and self.tw.step_time == 0
+
+    def run_compiled(self, top):
+        """ Run the stack of blocks that starts at top as Python code
+        compiled from the blocks (see taexportpython), rather than
+        interpreting it. Returns False, and runs nothing, if some of the
+        blocks cannot be compiled. """
+        from .taexportpython import (compile_action_stacks,
+                                     compiled_namespace)
+        try:
+            name, codes = compile_action_stacks(top, self.tw)
+            namespace = compiled_namespace(self.tw)
+            namespace['sleep'] = self._compiled_wait
+            for code in codes:
+                exec(code, namespace)
+        except Exception as e:
+            debug_output('Interpreting the blocks, as they cannot be '
+                         'compiled: %s' % (e), self.tw.running_sugar)
+            return False
+        actions = namespace['ACTION']
+        for key in list(actions.keys()):
+            actions[key] = self._compiled_step(actions[key])
+        self.start_time = time()
+        self.pacer.start()
+        self._setup_run()
+        self._quiet = True
+        self.istack = []
+        self.step = self._start_eval(None, actions[name])
+        self._main_step = self.step
+        return True
+
+    def _compiled_step(self, fcn):
+        """ Make a compiled action stack, fcn, a step that returns to its
+        caller when it is done, as evline does """
+        def _step():
+            try:
+                yield from fcn()
+            except (logoerror, TATypeError, ZeroDivisionError,
+                    NegativeRootError, IndexError):
+                raise  # doevalstep shows these
+            except Exception as error:
+                raise logoerror('%s: %s' % (type(error).__name__, error))
+            self.ireturn()
+            yield True
+        return _step
+
+    def _compiled_wait(self, wait_time):
+        """ sleep() for compiled code, which yields right after it: end the
+        slice until the wait is over (see prim_wait) """
+        self.pacer.request_frame()
+        self._wake_time = _millisecond() + wait_time * 1000.
 
     def _readline(self, line):
         """
@@ -416,15 +541,18 @@ class LogoCode:
             elif token == '[':
                 res.append(self._readline(line))
             elif token == ']':
-                return res
+                break
             elif bindex is None or not isinstance(bindex, int):
                 res.append(self._intern(token))
             else:
                 res.append((self._intern(token), bindex))
+        # Remember the line so that evline can compile it once per run
+        self._compiled_lines[id(res)] = (res, {})
         return res
 
-    def _start_eval(self, blklist):
-        """ Step through the list. """
+    def _start_eval(self, blklist, step=None):
+        """ Step through the list (or, if it is given, run the step
+        instead) """
         if self.tw.running_sugar:
             self.tw.activity.stop_turtle_button.set_icon_name("stopiton")
             self.tw.activity.stop_turtle_button.set_tooltip(
@@ -432,8 +560,16 @@ class LogoCode:
         elif self.tw.interactive_mode:
             self.tw.toolbar_shapes['stopiton'].set_layer(TAB_LAYER)
         self.running = True
-        self.icall(self.evline, blklist)
+        if step is None:
+            self.icall(self.evline, blklist)
+        else:
+            self.icall(step)
         yield True
+        # Wait for the stacks that were started with 'start action'
+        while self._contexts:
+            self._context.wake = _FOREVER
+            self.yield_turn = True
+            yield True
         if self.tw.running_sugar:
             if self.tw.step_time == 0 and self.tw.selected_blk is None:
                 self.tw.activity.stop_turtle_button.set_icon_name("hideshowon")
@@ -454,6 +590,93 @@ class LogoCode:
             self._disable_help = False
         self.tw.display_coordinates()
 
+    def start_context(self, blklist, name=None):
+        """ Run blklist side by side with the rest of the program, in a
+        context of its own that starts out with the active turtle. The
+        contexts take turns of _CONTEXT_TURN_STEPS steps. """
+        if self._context is None:
+            self._context = _Context(None, self.step,
+                                     self.tw.turtles.get_active_turtle())
+        context = _Context(name, None, self.tw.turtles.get_active_turtle())
+        context.step = self._context_eval(blklist)
+        self._contexts.append(context)
+
+    def _context_eval(self, blklist):
+        """ Bottom of the stack of generators of a context """
+        self.icall(self.evline, blklist)
+        yield True
+
+    def _save_context(self, context):
+        context.step = self.step
+        context.istack = self.istack
+        context.iline = self.iline
+        context.cfun = self.cfun
+        context.arglist = self.arglist
+        context.iresult = self.iresult
+        context.procstop = self.procstop
+        context.bindex = self.bindex
+        context.turtle = self.tw.turtles.get_active_turtle()
+
+    def _load_context(self, context):
+        self.step = context.step
+        self.istack = context.istack
+        self.iline = context.iline
+        self.cfun = context.cfun
+        self.arglist = context.arglist
+        self.iresult = context.iresult
+        self.procstop = context.procstop
+        self.bindex = context.bindex
+        if context.turtle is not self.tw.turtles.get_active_turtle():
+            self.tw.turtles.set_active_turtle(context.turtle)
+            context.turtle.restore_pen()
+        self._context = context
+        self._turn_steps = 0
+        self.yield_turn = False
+
+    def _next_context(self):
+        """ Give the next context its turn """
+        self._save_context(self._context)
+        self._contexts.append(self._context)
+        self._load_context(self._contexts.popleft())
+
+    def _contexts_wake(self):
+        """ If every context is waiting, when the first of them is done
+        waiting; otherwise None """
+        wake = self._context.wake
+        for context in self._contexts:
+            if context.wake is None:
+                return None
+            wake = min(wake, context.wake)
+        if wake is None or wake == _FOREVER:
+            return None
+        return wake
+
+    def stop_context(self, name):
+        """ Stop the stacks started (with 'start action') from the named
+        action stack; the rest of the program carries on """
+        key = self._get_stack_key(name)
+        for context in list(self._contexts):
+            if context.name is not None and \
+                    self._get_stack_key(context.name) == key:
+                self._contexts.remove(context)
+        if self._context is not None and self._context.name is not None \
+                and self._get_stack_key(self._context.name) == key:
+            self._context.stopped = True
+
+    def _end_context(self):
+        """ Drop the running context (which has finished or failed) and
+        give the next one its turn. Returns False if there is none. """
+        if not self._contexts:
+            return False
+        self._load_context(self._contexts.popleft())
+        return True
+
+    def _reset_contexts(self):
+        self._contexts.clear()
+        self._context = None
+        self._turn_steps = 0
+        self.yield_turn = False
+
     def icall(self, fcn, *args):
         """ Add a function and its arguments to the program stack. """
         self.istack.append(self.step)
@@ -464,13 +687,18 @@ class LogoCode:
         oldiline = self.iline
         self.iline = blklist[:]
         self.arglist = None
+        code = None
+        if self.compile_lines:
+            entry = self._compiled_lines.get(id(blklist))
+            if entry is not None and entry[0] is blklist:
+                code = entry[1]
         while self.iline:
             token = self.iline[0]
             self.bindex = None
             if isinstance(token, tuple):
                 (token, self.bindex) = self.iline[0]
 
-            if self.bindex is not None:
+            if self.bindex is not None and not self._quiet:
                 current_block = self.tw.block_list.list[self.bindex]
                 # If the blocks are visible, highlight the current block.
                 if not self.tw.hide:
@@ -480,12 +708,6 @@ class LogoCode:
                 if current_block.before is not None:
                     current_block.before(self.tw, current_block)
 
-            if not self.tw.hide and self.bindex is not None:
-                current_block = self.tw.block_list.list[self.bindex]
-                current_block.highlight()
-                if current_block.before is not None:
-                    current_block.before(current_block)
-
             # In debugging modes, we pause between steps and show the turtle.
             if self.tw.step_time > 0:
                 self.tw.turtles.get_active_turtle().show()
@@ -502,10 +724,22 @@ class LogoCode:
                     (token, self.bindex) = self.iline[1]
 
             # Process the token and any arguments.
-            self.icall(self._eval, call_me)
-            yield True
+            compiled = None
+            if code is not None:
+                key = (len(blklist) - len(self.iline), call_me)
+                if key not in code:
+                    code[key] = self._compile_statement(blklist, key[0],
+                                                        call_me)
+                compiled = code[key]
+            if compiled is None:
+                self.icall(self._eval, call_me)
+                yield True
+            else:
+                del self.iline[:compiled[1]]
+                self.iresult = compiled[0]()
+                yield True
 
-            if self.bindex is not None:
+            if self.bindex is not None and not self._quiet:
                 current_block = self.tw.block_list.list[self.bindex]
                 # Time to unhighlight the current block.
                 if not self.tw.hide:
@@ -541,12 +775,12 @@ class LogoCode:
         # Either we are processing a symbol or a value.
         if isinstance(token, self.symtype):
             # We highlight blocks here in case an error occurs...
-            if not self.tw.hide and bindex is not None:
+            if bindex is not None and not (self.tw.hide or self._quiet):
                 self.tw.block_list.list[bindex].highlight()
             self.icall(self._evalsym, token, call_me)
             yield True
             # and unhighlight if everything was OK.
-            if not self.tw.hide and bindex is not None:
+            if bindex is not None and not (self.tw.hide or self._quiet):
                 self.tw.block_list.list[bindex].unhighlight()
             res = self.iresult
         else:
@@ -614,13 +848,88 @@ class LogoCode:
         self.ijmp(self.evline, body, call_me)
         yield True
 
+    def _compile_statement(self, line, pos, call_me):
+        """ Compile the statement starting at line[pos]. Return a tuple
+        (closure, number of tokens consumed), or None if the statement
+        has to be run by the interpreter. """
+        token = line[pos]
+        if isinstance(token, tuple):
+            token = token[0]
+        if not isinstance(token, self.symtype) or token == self.symopar:
+            return None
+        try:
+            (closure, end) = self._compile_expr(line, pos, call_me)
+        except _NotCompilable:
+            return None
+        return (closure, end - pos)
+
+    def _compile_expr(self, line, pos, call_me, parent=None):
+        """ Compile the expression starting at line[pos] into a closure
+        that does what _eval and _evalsym would do, without pushing
+        generators onto istack. Return the closure and the position of
+        the next token. Raise _NotCompilable for anything that needs the
+        interpreter: generator (rprim) primitives, user-defined
+        procedures, missing definitions and missing arguments. """
+        token = line[pos]
+        bindex = None
+        if isinstance(token, tuple):
+            (token, bindex) = token
+        pos += 1
+
+        if not isinstance(token, self.symtype):
+            return (lambda: token), pos
+
+        if token.fcn is None or token.nargs is None or token.rprim or \
+                token == self.symopar:
+            raise _NotCompilable()
+        fcn = token.fcn
+        call_args = type(fcn).__name__ not in ('Primitive',
+                                               'PrimitiveDisjunction')
+        args = []
+        for i in range(token.nargs):
+            if pos >= len(line) or line[pos] is self.symnothing:
+                raise _NotCompilable()
+            (arg, pos) = self._compile_expr(line, pos, call_args, token)
+            args.append(arg)
+
+        tw = self.tw
+
+        def _run():
+            # We highlight blocks here in case an error occurs...
+            if bindex is not None and not (tw.hide or self._quiet):
+                tw.block_list.list[bindex].highlight()
+            oldcfun = self.cfun
+            self.cfun = token
+            values = [arg() for arg in args]
+            if call_me:
+                result = fcn(self, *values)
+            else:
+                result = (fcn, self) + tuple(values)
+            self.cfun = oldcfun
+            if parent is not None and result is None:
+                tw.showblocks()
+                raise logoerror("%s %s %s" %
+                                (parent.name, _("did not output to"),
+                                 parent.name))
+            # and unhighlight if everything was OK.
+            if bindex is not None and not (tw.hide or self._quiet):
+                tw.block_list.list[bindex].unhighlight()
+            return result
+
+        return _run, pos
+
     def doevalstep(self):
-        """ evaluate one step """
+        """ Evaluate steps for one slice (as long as the pacer says), then
+        return to the main loop, where the frame is presented """
         starttime = _millisecond()
+        slice_ms = self.pacer.slice_ms
+        steps = 0
         try:
-            while (_millisecond() - starttime) < 120:
+            while (_millisecond() - starttime) < slice_ms:
+                steps += 1
                 try:
                     if self.step is None:
+                        self._end_quiet()
                         self.tw.running_blocks = False
                         return False
                     if self.tw.running_turtleart:
@@ -650,6 +959,19 @@ class LogoCode:
                             raise logoerror("#negroot")
                         except IndexError:
                             raise logoerror("#emptyheap")
+                        if self._context is not None and \
+                                self._context.stopped:
+                            self._end_context()
+                        elif self._contexts:
+                            self._turn_steps += 1
+                            if self.yield_turn or \
+                                    self._turn_steps >= _CONTEXT_TURN_STEPS:
+                                self._next_context()
+                                # Sleep, rather than spin, while they all
+                                # wait
+                                wake = self._contexts_wake()
+                                if wake is not None:
+                                    self._wake_time = wake
                     else:
                         try:
                             next(self.step)
@@ -666,6 +988,8 @@ class LogoCode:
                                 self.tw.running_blocks = False
                                 return False
                 except StopIteration:
+                    if self.tw.running_turtleart and self._end_context():
+                        continue  # Other contexts are still running
                     if self.tw.running_turtleart:
                         # self.tw.turtles.show_all()
                         if self.hidden_turtle is not None:
@@ -673,11 +997,33 @@ class LogoCode:
                             self.hidden_turtle = None
                         else:
                             self.tw.turtles.get_active_turtle().show()
+                        self._end_quiet()
                         self.tw.running_blocks = False
+                        self.report_metrics()
                         return False
                     else:
                         self.ireturn()
+                if self._wake_time is not None:
+                    return self._wait_for_wake()
         except logoerror as e:
+            if self._quiet and self.bindex is not None and \
+                    self.tw.interactive_mode:
+                # Show where the error is, as a turbo run highlights nothing
+                self.tw.block_list.list[self.bindex].highlight()
+            if self.tw.running_turtleart and self._contexts:
+                # Only this context stops; the others carry on
+                self.tw.showlabel('syntaxerror', str(e))
+                if self._main_step in self.istack:
+                    # The main program goes back to waiting for them, and
+                    # then ends the run
+                    i = self.istack.index(self._main_step)
+                    self.step = self._main_step
+                    self.istack = self.istack[:i]
+                    self.iline = None
+                    self.procstop = False
+                else:
+                    self._end_context()
+                return True
             if self.tw.running_turtleart:
                 self.tw.showblocks()
                 self.tw.display_coordinates()
@@ -686,10 +1032,50 @@ class LogoCode:
             else:
                 traceback.print_exc()
                 self.tw.showlabel('status', 'logoerror: ' + str(e))
+            self._end_quiet()
             self.tw.running_blocks = False
             return False
+        finally:
+            self.pacer.end_slice(steps, _millisecond() - starttime)
+            if self._pending_labels:
+                self._flush_label_values()
+            if self.tw.interactive_mode:
+                self.tw.canvas.flush()  # Present what the slice drew
         return True
 
+    def _wait_for_wake(self):
+        """ The program waits until _wake_time: rather than sleeping in
+        the slice, let the main loop paint and resume when it is time """
+        delay = self._wake_time - _millisecond()
+        self._wake_time = None
+        if not (self.tw.interactive_mode and self.tw.running_turtleart):
+            if delay > 0:
+                sleep(delay / 1000.)
+            return True
+        self._resume_id = GLib.timeout_add(max(int(delay), 0), self._resume)
+        return False  # Done with this idle callback
+
+    def _resume(self):
+        self._resume_id = None
+        GLib.idle_add(self.doevalstep)
+        return False
+
+    def _cancel_wake(self):
+        self._wake_time = None
+        if self._resume_id is not None:
+            GLib.source_remove(self._resume_id)
+            self._resume_id = None
+
+    def report_metrics(self):
+        """ Write the pacing metrics of the run out with debug_output """
+        metrics = self.pacer.metrics()
+        debug_output('run: %.0f steps/s, %.1f frames/s, %d of %d slices '
+                     'overran, slice %.1fms, paint %.1fms' %
+                     (metrics['steps_per_second'],
+                      metrics['frames_per_second'], metrics['overruns'],
+                      metrics['slices'], metrics['slice_ms'],
+                      metrics['paint_ms']), self.tw.running_sugar)
+
     def ireturn(self, res=None):
         """ return value """
         self.step = self.istack.pop()
@@ -740,6 +1126,7 @@ class LogoCode:
 
     def prim_clear(self):
         """ Clear screen """
+        self.pacer.request_frame()
         self.tw.clear_plugins()
         self.stop_playing_media()
         self.reset_scale()
@@ -780,7 +1167,7 @@ class LogoCode:
                 raise TypeError("a loop controller must be either an iterator "
                                 "or a callable that returns an iterator")
         while next(controller):
-            self.icall(self.evline, blklist[:])
+            self.icall(self.evline, blklist)
             yield True
             if self.procstop:
                 break
@@ -789,7 +1176,7 @@ class LogoCode:
 
     def prim_clamp(self, blklist):
         """ Run clamp blklist """
-        self.icall(self.evline, blklist[:])
+        self.icall(self.evline, blklist)
         yield True
         self.procstop = False
         self.ireturn()
@@ -807,6 +1194,10 @@ class LogoCode:
         """ Stop execution of a stack """
         self.procstop = True
 
+    def prim_stop_started_stack(self, name):
+        """ Stop a named stack started with 'start action' """
+        self.stop_context(name)
+
     def prim_return(self, value):
         """ Stop execution of a stack and sets return value"""
         # self.boxes['__return__'] = value
@@ -825,9 +1216,16 @@ class LogoCode:
         """ Show the turtle while we wait """
         self.tw.turtles.get_active_turtle().show()
         endtime = _millisecond() + wait_time * 1000.
+        self.pacer.request_frame()
         while _millisecond() < endtime:
-            sleep(wait_time / 10.)
+            if self._contexts:
+                self._context.wake = endtime
+                self.yield_turn = True  # Let the others run meanwhile
+            else:
+                self._wake_time = endtime  # End the slice until then
             yield True
+        if self._context is not None:
+            self._context.wake = None
         self.tw.turtles.get_active_turtle().hide()
         self.ireturn()
         yield True
@@ -835,7 +1233,7 @@ class LogoCode:
     def prim_if(self, boolean, blklist):
         """ If bool, do list """
         if boolean:
-            self.icall(self.evline, blklist[:])
+            self.icall(self.evline, blklist)
             yield True
         self.ireturn()
         yield True
@@ -843,10 +1241,10 @@ class LogoCode:
     def prim_ifelse(self, boolean, list1, list2):
         """ If bool, do list1, else do list2 """
         if boolean:
-            self.ijmp(self.evline, list1[:])
+            self.ijmp(self.evline, list1)
             yield True
         else:
-            self.ijmp(self.evline, list2[:])
+            self.ijmp(self.evline, list2)
             yield True
 
     def prim_set_box(self, name, value):
@@ -899,12 +1297,19 @@ class LogoCode:
         key = self._get_stack_key(name)
         if self.stacks.get(key) is None:
             raise logoerror("#nostack")
-        self.icall(self.evline, self.stacks[key][:])
+        self.icall(self.evline, self.stacks[key])
         yield True
         self.procstop = False
         self.ireturn()
         yield True
 
+    def prim_start_stack(self, name):
+        """ Run a named stack side by side with the rest of the program """
+        key = self._get_stack_key(name)
+        if self.stacks.get(key) is None:
+            raise logoerror("#nostack")
+        self.start_context(self.stacks[key], name)
+
     def prim_invoke_return_stack(self, name):
         """ Process a named stack and return a value"""
         self.prim_invoke_stack(name)
@@ -1066,6 +1471,10 @@ class LogoCode:
             return
         if self.tw.hide:
             return
+        if value is not None and self._quiet:
+            if self.update_values:
+                self._pending_labels[(name, label)] = value
+            return
         self.tw.display_coordinates()
         if value is None:
             if name not in self.value_blocks_to_update:
@@ -1111,6 +1520,22 @@ class LogoCode:
                         for blk in drag_group:
                             blk.spr.move_relative((dx, 0))
 
+    def _end_quiet(self):
+        """ The run is over: show the labels that a turbo run held back,
+        and update them right away from now on """
+        self._flush_label_values()
+        self._quiet = False
+
+    def _flush_label_values(self):
+        """ Update the labels held back during a turbo run """
+        pending = self._pending_labels
+        self._pending_labels = {}
+        quiet = self._quiet
+        self._quiet = False
+        for (name, label), value in pending.items():
+            self.update_label_value(name, value, label=label)
+        self._quiet = quiet
+
     def reskin(self, obj):
         """ Reskin the turtle with an image from a file """
         scale = int(ICON_SIZE * float(self.scale) / DEFAULT_SCALE)
@@ -1155,26 +1580,13 @@ class LogoCode:
             if pen_state:
                 self.tw.turtles.get_active_turtle().set_pen_state(True)
 
-        if self.tw.sharing():
-            if self.tw.running_sugar:
-                tmp_path = get_path(self.tw.activity, 'instance')
-            else:
-                tmp_path = tempfile.gettempdir()
-            tmp_file = os.path.join(get_path(self.tw.activity, 'instance'),
-                                    'tmpfile.png')
-            pixbuf.save(tmp_file, 'png', {'quality': '100'})
-            data = image_to_base64(tmp_file, tmp_path)
+        if self.tw.sharing() and pixbuf is not None:
+            data = self.tw.share_image(pixbuf)
             height = pixbuf.get_height()
             width = pixbuf.get_width()
             event = data_to_string(
                 [self.tw.nick, [round_int(width), round_int(height), data]])
-
-            def send_event(p):
-                self.tw.send_event('R', event)
-                return False
-
-            GLib.idle_add(send_event)
-            os.remove(tmp_file)
+            self.tw.send_event('R', event)
 
     def get_from_url(self, url):
         """ Get contents of URL as text or tempfile to image """
@@ -1383,12 +1795,11 @@ class LogoCode:
                 self.filepath != '':
             try:
                 if not resize:
-                    self.pixbuf = GdkPixbuf.Pixbuf.new_from_file(self.filepath)
+                    self.pixbuf = self._image_cache.load(self.filepath)
                     w = self.pixbuf.get_width()
                     h = self.pixbuf.get_height()
                 else:
-                    self.pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(
-                        self.filepath, w, h)
+                    self.pixbuf = self._image_cache.load(self.filepath, w, h)
             except BaseException:
                 self.tw.showlabel('nojournal', self.filepath)
                 debug_output("Couldn't open filepath %s" % (self.filepath),
@@ -0,0 +1,106 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Pacing of the slices of a running program.
+
+LogoCode.doevalstep computes for one slice and then returns to the main
+loop, where what was drawn is presented (painted). While a program
+animates (it waits, or clears the screen), FramePacer keeps the slices
+short enough for the paint to fit in each frame at the target frame rate,
+using the measured paint cost. Otherwise the slices are long, so that as
+little time as possible goes into painting.
+
+    pacer.slice_ms          # how long to compute for
+    pacer.end_slice(steps, elapsed_ms)
+    pacer.painted(paint_ms)
+    pacer.metrics()         # steps and frames per second, overruns...
+'''
+
+from time import time
+
+TARGET_FPS = 60
+_MIN_SLICE_MS = 2.
+_MAX_SLICE_MS = 120.
+_ANIMATION_TIMEOUT = 0.5  # seconds without a frame request to stop pacing
+_PAINT_SMOOTHING = 0.2  # weight of the latest paint in the average cost
+_OVERRUN_MARGIN_MS = 2.
+
+
+class FramePacer(object):
+
+    ''' Adapt the length of the slices of a run to the paint cost '''
+
+    def __init__(self, target_fps=TARGET_FPS):
+        self.target_fps = target_fps
+        self.paint_ms = 0.  # Average cost of a paint
+        self.slice_ms = _MAX_SLICE_MS
+        self._frame_requested = 0.
+        self.start()
+
+    def start(self):
+        ''' Start counting for a new run '''
+        self._start = time()
+        self._steps = 0
+        self._compute_ms = 0.
+        self._slices = 0
+        self._frames = 0
+        self._overruns = 0
+
+    def request_frame(self):
+        ''' The program animates (e.g. it waits for the frame to be seen),
+        so pace the slices for a while '''
+        self._frame_requested = time()
+        self._set_slice()
+
+    def is_animating(self):
+        return time() - self._frame_requested < _ANIMATION_TIMEOUT
+
+    def _set_slice(self):
+        if self.is_animating():
+            budget = 1000. / self.target_fps - self.paint_ms
+            self.slice_ms = min(max(budget, _MIN_SLICE_MS), _MAX_SLICE_MS)
+        else:
+            self.slice_ms = _MAX_SLICE_MS
+
+    def end_slice(self, steps, elapsed_ms):
+        ''' A slice of steps has been computed '''
+        self._steps += steps
+        self._compute_ms += elapsed_ms
+        self._slices += 1
+        if elapsed_ms > self.slice_ms + _OVERRUN_MARGIN_MS:
+            self._overruns += 1
+        self._set_slice()
+
+    def painted(self, paint_ms):
+        ''' A frame has been presented, in paint_ms '''
+        self._frames += 1
+        self.paint_ms += _PAINT_SMOOTHING * (paint_ms - self.paint_ms)
+
+    def metrics(self):
+        ''' Counts for the current run '''
+        seconds = max(time() - self._start, 1e-6)
+        return {'steps_per_second': self._steps / seconds,
+                'frames_per_second': self._frames / seconds,
+                'compute_share': self._compute_ms / 1000. / seconds,
+                'slices': self._slices,
+                'overruns': self._overruns,
+                'slice_ms': self.slice_ms,
+                'paint_ms': self.paint_ms}
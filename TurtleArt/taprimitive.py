@@ -71,6 +71,9 @@ class Primitive(object):
     but that can also be transformed into a Python AST."""
 
     _DEBUG = False
+    # Bind plain runtime arguments with cached call plans (see
+    # _bind_with_plan) instead of filling the slots of a copy
+    _USE_CALL_PLANS = True
 
     STANDARD_OPERATORS = {'plus': (ast.UAdd, ast.Add),
                           'minus': (ast.USub, ast.Sub),
@@ -113,18 +116,24 @@ class Primitive(object):
         self.call_afterwards = call_afterwards
         self.export_me = export_me
 
+        # signature of the runtime arguments -> call plan (or None)
+        self._call_plans = {}
+        self._first_arg_getter = None
+
     def copy(self):
         """ Return a Primitive object with the same attributes as this one.
         Shallow-copy the arg_descs and kwarg_descs attributes. """
         arg_descs_copy = self.arg_descs[:]
         if isinstance(self.arg_descs, ArgListDisjunction):
             arg_descs_copy = ArgListDisjunction(arg_descs_copy)
-        return Primitive(self.func,
-                         return_type=self.return_type,
-                         arg_descs=arg_descs_copy,
-                         kwarg_descs=self.kwarg_descs.copy(),
-                         call_afterwards=self.call_afterwards,
-                         export_me=self.export_me)
+        new_prim = Primitive(self.func,
+                             return_type=self.return_type,
+                             arg_descs=arg_descs_copy,
+                             kwarg_descs=self.kwarg_descs.copy(),
+                             call_afterwards=self.call_afterwards,
+                             export_me=self.export_me)
+        new_prim._first_arg_getter = self._first_arg_getter
+        return new_prim
 
     def __repr__(self):
         return "Primitive(%s -> %s)" % (repr(self.func), str(self.return_type))
@@ -279,54 +288,160 @@ class Primitive(object):
         if runtime_args and isinstance(runtime_args[0], LogoCode):
             runtime_args = runtime_args[1:]
 
-        if Primitive._DEBUG:
-            debug_output(repr(self))
-            debug_output("  runtime_args: " + repr(runtime_args))
-        # fill the ArgSlots with the runtime arguments
-        new_prim = self.fill_slots(runtime_args, runtime_kwargs,
-                                   convert_to_ast=False)
-        if not new_prim.are_slots_filled():
-            raise logoerror("#syntaxerror")
-        if Primitive._DEBUG:
-            debug_output("  new_prim.arg_descs: " + repr(new_prim.arg_descs))
-
-        # extract the actual values from the (now constant) arguments
-        (new_args, new_kwargs) = new_prim.get_values_of_filled_slots()
-        if Primitive._DEBUG:
-            debug_output("  new_args: " + repr(new_args))
-            debug_output("end " + repr(self))
+        bound = None
+        if Primitive._USE_CALL_PLANS and not runtime_kwargs and \
+                not Primitive._DEBUG:
+            bound = self._bind_with_plan(runtime_args)
 
+        if bound is not None and bound is not _NO_MATCH:
+            (new_args, new_kwargs) = bound
+        else:
+            if Primitive._DEBUG:
+                debug_output(repr(self))
+                debug_output("  runtime_args: " + repr(runtime_args))
+            # fill the ArgSlots with the runtime arguments
+            new_prim = self.fill_slots(runtime_args, runtime_kwargs,
+                                       convert_to_ast=False)
+            if not new_prim.are_slots_filled():
+                raise logoerror("#syntaxerror")
+            if Primitive._DEBUG:
+                debug_output("  new_prim.arg_descs: " +
+                             repr(new_prim.arg_descs))
+
+            # extract the actual values from the (now constant) arguments
+            (new_args, new_kwargs) = new_prim.get_values_of_filled_slots()
+            if Primitive._DEBUG:
+                debug_output("  new_args: " + repr(new_args))
+                debug_output("end " + repr(self))
+
+        return self._call_with_values(new_args, new_kwargs)
+
+    def _call_with_values(self, new_args, new_kwargs):
+        """ Call the function (and self.call_afterwards) with the values
+        of the arguments """
         # what does this primitive want as its first argument?
-        first_arg = None
-        if not is_bound_method(new_prim.func):
-            if new_prim.wants_turtle():
-                first_arg = global_objects["turtles"].get_active_turtle()
-            elif new_prim.wants_turtles():
-                first_arg = global_objects["turtles"]
-            elif new_prim.wants_canvas():
-                first_arg = global_objects["canvas"]
-            elif new_prim.wants_logocode():
-                first_arg = global_objects["logo"]
-            elif new_prim.wants_heap():
-                first_arg = global_objects["logo"].heap
-            elif new_prim.wants_tawindow():
-                first_arg = global_objects["window"]
-            else:
-                result, plugin = new_prim.wants_plugin()
-                if result:
-                    first_arg = plugin
+        if self._first_arg_getter is None:
+            self._first_arg_getter = self._find_first_arg_getter()
+        first_arg = self._first_arg_getter()
 
         # execute the actual function
         if first_arg is None:
-            return_value = new_prim.func(*new_args, **new_kwargs)
+            return_value = self.func(*new_args, **new_kwargs)
         else:
-            return_value = new_prim.func(first_arg, *new_args, **new_kwargs)
+            return_value = self.func(first_arg, *new_args, **new_kwargs)
 
-        if new_prim.call_afterwards is not None:
-            new_prim.call_afterwards(*new_args, **new_kwargs)
+        if self.call_afterwards is not None:
+            self.call_afterwards(*new_args, **new_kwargs)
 
         return return_value
 
+    def _find_first_arg_getter(self):
+        """ Return a function that returns what this Primitive wants as
+        its first argument (or None) """
+        if not is_bound_method(self.func):
+            if self.wants_turtle():
+                return lambda: global_objects["turtles"].get_active_turtle()
+            elif self.wants_turtles():
+                return lambda: global_objects["turtles"]
+            elif self.wants_canvas():
+                return lambda: global_objects["canvas"]
+            elif self.wants_logocode():
+                return lambda: global_objects["logo"]
+            elif self.wants_heap():
+                return lambda: global_objects["logo"].heap
+            elif self.wants_tawindow():
+                return lambda: global_objects["window"]
+            else:
+                result, plugin = self.wants_plugin()
+                if result:
+                    return lambda: plugin
+        return lambda: None
+
+    def _bind_with_plan(self, runtime_args):
+        """ Return the values to call self.func with, as (args, kwargs),
+        using the call plan for the types of the runtime arguments. This
+        does the same as fill_slots followed by get_values_of_filled_slots,
+        but without copying this Primitive. Return None (and leave it to
+        fill_slots) if any argument needs to be called or if there is no
+        plan for this signature, and _NO_MATCH if fill_slots would raise a
+        TATypeError because the types do not fit any slot list. """
+        signature = []
+        for arg in runtime_args:
+            if type(arg) not in _PLAIN_ARG_TYPES:
+                return None
+            signature.append(get_type(arg)[0])
+        signature = tuple(signature)
+        if signature in self._call_plans:
+            plan = self._call_plans[signature]
+        else:
+            plan = self._make_call_plan(signature)
+            self._call_plans[signature] = plan
+        if plan is None or plan is _NO_MATCH:
+            return plan
+
+        (arg_plan, kwarg_consts) = plan
+        values = {}
+        for (i, converter, new_type, old_type) in arg_plan:
+            if i is None:
+                continue
+            try:
+                values[i] = convert(runtime_args[i], new_type,
+                                    old_type=old_type, converter=converter)
+            except TATypeError:
+                # fill_slots will try the remaining alternatives
+                return None
+        new_args = []
+        for (i, const, new_type, old_type) in arg_plan:
+            if i is None:
+                new_args.append(const.get())
+            else:
+                new_args.append(values[i])
+        new_kwargs = {}
+        for key, const in kwarg_consts:
+            new_kwargs[key] = const.get()
+        return new_args, new_kwargs
+
+    def _make_call_plan(self, signature):
+        """ Work out which slots fill_slots would fill with arguments of
+        the types in signature, and with which converters. Return
+        ([(argument index, converter, new type, old type) or
+        (None, ConstantArg, None, None) for each argument], [(key,
+        ConstantArg) for each keyword argument]), _NO_MATCH if the types
+        do not fit any slot list, or None if fill_slots has to do the
+        work. """
+        kwarg_consts = []
+        for key in self.kwarg_descs:
+            kwarg_desc = self.kwarg_descs[key]
+            if isinstance(kwarg_desc, ArgSlot):
+                return None
+            if isinstance(kwarg_desc, ConstantArg):
+                kwarg_consts.append((key, kwarg_desc))
+
+        if isinstance(self.arg_descs, ArgListDisjunction):
+            slot_list_alternatives = list(self.arg_descs)
+        else:
+            slot_list_alternatives = [self.arg_descs]
+        for slot_list in slot_list_alternatives:
+            if len([slot for slot in slot_list
+                    if isinstance(slot, ArgSlot)]) != len(signature):
+                return None
+            arg_plan = []
+            i = 0
+            for slot in slot_list:
+                if isinstance(slot, ArgSlot):
+                    choice = _choose_slot_converter(slot, signature[i])
+                    if choice is _NEEDS_FILL_SLOTS:
+                        return None
+                    if choice is None:
+                        break  # try the next slot list
+                    arg_plan.append((i, ) + choice)
+                    i += 1
+                elif isinstance(slot, ConstantArg):
+                    arg_plan.append((None, slot, None, None))
+            else:
+                return (arg_plan, kwarg_consts)
+        return _NO_MATCH
+
     def get_ast(self, *arg_asts, **kwarg_asts):
         """Transform this object into a Python AST. When serialized and
         executed, the AST will do exactly the same as calling this
@@ -901,6 +1016,15 @@ class PrimitiveDisjunction(Disjunction, Primitive):
         if runtime_args and isinstance(runtime_args[0], LogoCode):
             runtime_args = runtime_args[1:]
 
+        if Primitive._USE_CALL_PLANS and not runtime_kwargs and \
+                not Primitive._DEBUG:
+            for prim in self:
+                bound = prim._bind_with_plan(runtime_args)
+                if bound is None:
+                    break  # let fill_slots do the work
+                elif bound is not _NO_MATCH:
+                    return prim._call_with_values(*bound)
+
         error = None
         for prim in self:
             try:
@@ -1173,6 +1297,31 @@ class ConstantArg(object):
         return "".join(s)
 
 
+# Runtime arguments of these types are bound by call plans
+_PLAIN_ARG_TYPES = (int, float, bool, str, Color, Vector, Media)
+_NEEDS_FILL_SLOTS = object()
+_NO_MATCH = object()
+
+
+def _choose_slot_converter(slot, old_type):
+    """ Return (converter, new type, old type) for the first alternative of
+    the slot that ArgSlot.fill would try for a plain value of old_type,
+    None if there is none, or _NEEDS_FILL_SLOTS if ArgSlot.fill should do
+    the work (wrappers, arguments that are not called). """
+    for alternative in slot.get_alternatives():
+        if alternative.wrapper is not None or not alternative.call_arg:
+            return _NEEDS_FILL_SLOTS
+        if isinstance(alternative.type, TypeDisjunction):
+            slot_types = alternative.type
+        else:
+            slot_types = TypeDisjunction((alternative.type, ))
+        for new_type in slot_types:
+            converter = get_converter(old_type, new_type)
+            if converter is not None:
+                return (converter, new_type, old_type)
+    return None
+
+
 def or_(*disjuncts):
     """ Return a disjunction object of the same type as the disjuncts. If
     the item type cannot be linked to a Disjunction class, return a tuple
@@ -0,0 +1,122 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Write project files and pictures in the background.
+
+The main thread takes a snapshot (the project data from
+assemble_data_to_save, or a copy of the canvas pixels) and hands it to a
+SnapshotWriter, which encodes and writes it on a worker thread. A project
+snapshot that is waiting to be written is replaced by a newer one for the
+same file, so a burst of saves is written once. Pictures are never
+replaced: each one is written.
+
+    writer = SnapshotWriter()
+    writer.save_png(copy_canvas_surface(tw.canvas), path, done)
+    ...
+    writer.flush()  # Before quitting
+'''
+
+import threading
+from collections import OrderedDict
+
+from gi.repository import GLib
+
+from . import tacompact
+from .tautils import (data_to_file, debug_output)
+
+
+class SnapshotWriter(object):
+
+    ''' A worker thread that writes snapshots to files, one at a time. The
+    done callback, done(path, error), of each snapshot that is written is
+    called from the main loop; error is None if the file was written. The
+    callback of a snapshot that is replaced is dropped. '''
+
+    def __init__(self):
+        self._pending = OrderedDict()  # key -> (path, write, done)
+        self._writing = None  # path of the snapshot being written
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def save_project(self, data, path, compact=False, done=None):
+        ''' Write project data (which must not be changed afterwards) to
+        path, as .ta JSON or, if compact is True, as a compact project '''
+        if compact:
+            self._submit(path, path, lambda: tacompact.save(data, path), done)
+        else:
+            self._submit(path, path, lambda: data_to_file(data, path), done)
+
+    def save_png(self, surface, path, done=None):
+        ''' Write an image surface (which must not be drawn on afterwards)
+        to path as PNG '''
+        self._submit(object(), path, lambda: surface.write_to_png(str(path)),
+                     done)
+
+    def _submit(self, key, path, write, done):
+        with self._condition:
+            # Replace any snapshot with the same key that has not been
+            # written yet
+            self._pending.pop(key, None)
+            self._pending[key] = (path, write, done)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='SnapshotWriter')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                key, (path, write, done) = self._pending.popitem(last=False)
+                self._writing = path
+            error = None
+            try:
+                write()
+            except Exception as e:
+                debug_output('Could not write %s: %s' % (path, e))
+                error = e
+            with self._condition:
+                self._writing = None
+                self._condition.notify_all()
+            if done is not None:
+                GLib.idle_add(self._call_done, done, path, error)
+
+    def _call_done(self, done, path, error):
+        done(path, error)
+        return False  # Only once
+
+    def is_writing(self, path=None):
+        ''' Is a snapshot (of path) waiting or being written? '''
+        with self._condition:
+            if path is None:
+                return bool(self._pending) or self._writing is not None
+            return self._writing == path or \
+                any(p == path for p, write, done in self._pending.values())
+
+    def flush(self, timeout=None):
+        ''' Wait until all of the snapshots are written. Returns False if
+        the timeout (in seconds) expired first. '''
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and self._writing is None, timeout)
@@ -0,0 +1,149 @@
+# Copyright (c) 2026 Sugar Labs
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+'''
+Timing of the steps of starting up (importing and setting up each plugin,
+first paint...), reported with debug_output.
+
+The time spent importing each module is also measured when the
+TURTLEART_TRACE_IMPORTS environment variable is set. That is the module's
+own time, without the modules it imports in turn.
+'''
+
+import os
+import sys
+from contextlib import contextmanager
+from time import time
+
+from .tautils import debug_output
+
+TRACE_IMPORTS = bool(os.environ.get('TURTLEART_TRACE_IMPORTS'))
+_REPORTED_MODULES = 20
+
+
+class _TimedLoader(object):
+
+    ''' Wrap a module loader to time exec_module '''
+
+    def __init__(self, loader, trace):
+        self._loader = loader
+        self._trace = trace
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._trace._enter_module()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._trace._exit_module(module.__name__)
+
+
+class _ImportTimer(object):
+
+    ''' A meta path finder that asks the other finders for the module spec
+    and times the loading of the module '''
+
+    def __init__(self, trace):
+        self._trace = trace
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and \
+                    hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimedLoader(spec.loader, self._trace)
+            return spec
+        return None
+
+
+class StartupTrace(object):
+
+    ''' Collect the time spent in the steps of starting up '''
+
+    def __init__(self, trace_imports=TRACE_IMPORTS):
+        self._start = time()
+        self._steps = []  # (label, seconds)
+        self._marks = []  # (label, seconds since start)
+        self._modules = {}  # name -> seconds (own time)
+        self._module_stack = []  # [start, seconds in imported modules]
+        self._import_timer = None
+        if trace_imports:
+            self._import_timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self._import_timer)
+
+    @contextmanager
+    def step(self, label):
+        ''' Time a step:
+
+            with trace.step('setup audio_sensors'):
+                ... '''
+        start = time()
+        try:
+            yield
+        finally:
+            self.add_step(label, time() - start)
+
+    def add_step(self, label, seconds):
+        self._steps.append((label, seconds))
+
+    def mark(self, label):
+        ''' Note the time (since the trace started) that something happened,
+        e.g. the first paint '''
+        self._marks.append((label, time() - self._start))
+
+    def _enter_module(self):
+        self._module_stack.append([time(), 0.])
+
+    def _exit_module(self, name):
+        start, imported = self._module_stack.pop()
+        elapsed = time() - start
+        self._modules[name] = self._modules.get(name, 0.) + elapsed - imported
+        if self._module_stack:
+            self._module_stack[-1][1] += elapsed
+
+    def stop(self):
+        ''' Stop timing imports '''
+        if self._import_timer in sys.meta_path:
+            sys.meta_path.remove(self._import_timer)
+        self._import_timer = None
+
+    def report(self, running_sugar=False):
+        ''' Write the times out with debug_output, slowest first, and stop
+        timing imports '''
+        self.stop()
+        for label, seconds in self._marks:
+            debug_output('startup: %s at %.3fs' % (label, seconds),
+                         running_sugar)
+        for label, seconds in sorted(self._steps, key=lambda s: -s[1]):
+            debug_output('startup: %s took %.3fs' % (label, seconds),
+                         running_sugar)
+        modules = sorted(self._modules.items(), key=lambda m: -m[1])
+        for name, seconds in modules[:_REPORTED_MODULES]:
+            debug_output('startup: import %s took %.3fs' % (name, seconds),
+                         running_sugar)
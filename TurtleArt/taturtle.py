@@ -19,11 +19,10 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 # THE SOFTWARE.
 
-import os
 import cairo
-import tempfile
+import hashlib
+from collections import OrderedDict
 
-from gi.repository import GLib
 from gi.repository import Gdk
 from random import uniform
 from math import sin, cos, pi, sqrt
@@ -32,14 +31,18 @@ from .taconstants import (TURTLE_LAYER, DEFAULT_TURTLE_COLORS, DEFAULT_TURTLE,
 from .tasprite_factory import SVG, svg_str_to_pixbuf
 from .tacanvas import wrap100, COLOR_TABLE
 from .sprites import Sprite
-from .tautils import (debug_output, data_to_string, round_int, get_path,
-                      image_to_base64)
+from .tautils import (debug_output, data_to_string, round_int)
 from TurtleArt.talogo import logoerror
 
 SHAPES = 36
 DEGTOR = pi / 180.
 RTODEG = 180. / pi
 
+# Shared TurtleShapes, by turtle colors or skin; the turtles using one keep
+# it alive after it is dropped from here
+_turtle_shapes = OrderedDict()
+_TURTLE_SHAPES = 32
+
 
 def generate_turtle_pixbufs(colors):
     ''' Generate pixbufs for generic turtles '''
@@ -52,6 +55,90 @@ def generate_turtle_pixbufs(colors):
     return shapes
 
 
+def _pixbuf_to_surface(pixbuf):
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, pixbuf.get_width(),
+                                 pixbuf.get_height())
+    context = cairo.Context(surface)
+    Gdk.cairo_set_source_pixbuf(context, pixbuf, 0, 0)
+    context.paint()
+    return surface
+
+
+class TurtleShapes(object):
+
+    ''' The SHAPES orientations of a turtle, rendered (as cairo surfaces)
+    when they are first shown '''
+
+    def __init__(self, render):
+        self._render = render  # orientation -> surface
+        self._surfaces = [None] * SHAPES
+
+    def __len__(self):
+        return SHAPES
+
+    def __getitem__(self, i):
+        if not -SHAPES <= i < SHAPES:
+            raise IndexError('turtle shape index out of range')
+        if self._surfaces[i] is None:
+            self._surfaces[i] = self._render(i % SHAPES)
+        return self._surfaces[i]
+
+    def __setitem__(self, i, surface):
+        self._surfaces[i] = surface
+
+    def copy(self):
+        ''' Shapes of a turtle of its own, to change some of them '''
+        shapes = TurtleShapes(self._render)
+        shapes._surfaces = self._surfaces[:]
+        return shapes
+
+
+def _shared_shapes(key, render):
+    shapes = _turtle_shapes.get(key)
+    if shapes is None:
+        shapes = TurtleShapes(render)
+        _turtle_shapes[key] = shapes
+        if len(_turtle_shapes) > _TURTLE_SHAPES:
+            _turtle_shapes.popitem(last=False)
+    else:
+        _turtle_shapes.move_to_end(key)
+    return shapes
+
+
+def turtle_shapes(colors):
+    ''' The (shared) shapes of generic turtles of the given colors '''
+    colors = tuple(colors)
+
+    def _render(i):
+        svg = SVG()
+        svg.set_scale(1.0)
+        svg.set_orientation(i * 10)
+        return _pixbuf_to_surface(svg_str_to_pixbuf(svg.turtle(colors)))
+
+    return _shared_shapes(('colors', colors), _render)
+
+
+def skin_shapes(pixbuf):
+    ''' The (shared) shapes of a turtle skin, rotated '''
+    w, h = pixbuf.get_width(), pixbuf.get_height()
+    key = ('skin', w, h, hashlib.sha1(pixbuf.get_pixels()).hexdigest())
+
+    def _render(i):
+        nw = nh = int(sqrt(w * w + h * h))
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, nw, nh)
+        context = cairo.Context(surface)
+        context.translate(nw / 2.0, nh / 2.0)
+        context.rotate(i * 10 * pi / 180.)
+        context.translate(-nw / 2.0, -nh / 2.0)
+        Gdk.cairo_set_source_pixbuf(
+            context, pixbuf, (nw - w) / 2.0, (nh - h) / 2.0)
+        context.rectangle(0, 0, nw, nh)
+        context.fill()
+        return surface
+
+    return _shared_shapes(key, _render)
+
+
 class Turtles:
 
     def __init__(self, turtle_window):
@@ -115,8 +202,7 @@ class Turtles:
     def get_pixbufs(self):
         ''' Get the pixbufs for the default turtle shapes. '''
         if self._default_pixbufs == []:
-            self._default_pixbufs = generate_turtle_pixbufs(
-                ["#008000", "#00A000"])
+            self._default_pixbufs = turtle_shapes(["#008000", "#00A000"])
         return(self._default_pixbufs)
 
     def turtle_to_screen_coordinates(self, pos):
@@ -273,13 +359,13 @@ class Turtle:
 
         if turtle_colors is not None:
             self.colors = turtle_colors[:]
-            self._shapes = generate_turtle_pixbufs(self.colors)
+            self._shapes = turtle_shapes(self.colors)
         elif use_color_table:
             fill = wrap100(int_key)
             stroke = wrap100(fill + 10)
             self.colors = ['#%06x' % (COLOR_TABLE[fill]),
                            '#%06x' % (COLOR_TABLE[stroke])]
-            self._shapes = generate_turtle_pixbufs(self.colors)
+            self._shapes = turtle_shapes(self.colors)
         else:
             if turtles is not None:
                 self.colors = DEFAULT_TURTLE_COLORS
@@ -289,7 +375,7 @@ class Turtle:
         ''' reset the colors of a preloaded turtle '''
         if turtle_colors is not None:
             self.colors = turtle_colors[:]
-            self._shapes = generate_turtle_pixbufs(self.colors)
+            self._shapes = turtle_shapes(self.colors)
             self.set_heading(self._heading, share=False)
 
     def set_shapes(self, shapes, i=0):
@@ -297,6 +383,7 @@ class Turtle:
         n = len(shapes)
         if n == 1 and i > 0:  # set shape[i]
             if i < len(self._shapes):
+                self._shapes = self._own_shapes()
                 self._shapes[i] = shapes[0]
         elif n == SHAPES:  # all shapes have been precomputed
             self._shapes = shapes[:]
@@ -305,29 +392,21 @@ class Turtle:
                 debug_output("%d images passed to set_shapes: ignoring" % (n),
                              self._turtles.turtle_window.running_sugar)
             if self._heading == 0.0:  # rotate the shapes
-                images = []
-                w, h = shapes[0].get_width(), shapes[0].get_height()
-                nw = nh = int(sqrt(w * w + h * h))
-                for i in range(SHAPES):
-                    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, nw, nh)
-                    context = cairo.Context(surface)
-
-                    context.translate(nw / 2.0, nh / 2.0)
-                    context.rotate(i * 10 * pi / 180.)
-                    context.translate(-nw / 2.0, -nh / 2.0)
-                    Gdk.cairo_set_source_pixbuf(
-                        context, shapes[0], (nw - w) / 2.0, (nh - h) / 2.0)
-                    context.rectangle(0, 0, nw, nh)
-                    context.fill()
-                    images.append(surface)
-                self._shapes = images[:]
+                self._shapes = skin_shapes(shapes[0])
             else:  # associate shape with image at current heading
-                j = int(self._heading + 5) % 360 / (360 / SHAPES)
+                j = (int(self._heading + 5) % 360) // (360 // SHAPES)
+                self._shapes = self._own_shapes()
                 self._shapes[j] = shapes[0]
         self._custom_shapes = True
         self.show()
         self._calculate_sizes()
 
+    def _own_shapes(self):
+        ''' Copy shared shapes before changing them '''
+        if isinstance(self._shapes, TurtleShapes):
+            return self._shapes.copy()
+        return self._shapes[:]
+
     def reset_turtle(self):
         self.set_color(0)
         self.set_shade(50)
@@ -353,7 +432,7 @@ class Turtle:
     def reset_shapes(self):
         ''' Reset the shapes to the standard turtle '''
         if self._custom_shapes:
-            self._shapes = generate_turtle_pixbufs(self.colors)
+            self._shapes = turtle_shapes(self.colors)
             self._custom_shapes = False
             self._calculate_sizes()
 
@@ -452,6 +531,15 @@ class Turtle:
                                     round_int(self._pen_size)])
             self._turtles.turtle_window.send_event('w', event)
 
+    def restore_pen(self):
+        ''' Set the canvas pen back to the color and size of this turtle
+        (after another turtle has drawn) '''
+        canvas = self._turtles.turtle_window.canvas
+        canvas.set_fgcolor(shade=self._pen_shade, gray=self._pen_gray,
+                           color=self._pen_color)
+        canvas.set_pen_size(
+            self._pen_size * self._turtles.turtle_window.coord_scale)
+
     def set_pen_state(self, pen_state=None, share=True):
         ''' Set the pen state (down==True) for this turtle. '''
         if pen_state is not None:
@@ -671,16 +759,8 @@ class Turtle:
             pixbuf, a, b, x, y, w, h, self._heading)
 
         if self._turtles.turtle_window.sharing() and share:
-            if self._turtles.turtle_window.running_sugar:
-                tmp_path = get_path(self._turtles.turtle_window.activity,
-                                    'instance')
-            else:
-                tmp_path = tempfile.gettempdir()
-            tmp_file = os.path.join(
-                get_path(self._turtles.turtle_window.activity, 'instance'),
-                'tmpfile.png')
-            pixbuf.save(tmp_file, 'png', {'quality': '100'})
-            data = image_to_base64(tmp_file, tmp_path)
+            # The image itself is sent (once) apart from the event
+            data = self._turtles.turtle_window.share_image(pixbuf)
             height = pixbuf.get_height()
             width = pixbuf.get_width()
 
@@ -694,14 +774,7 @@ class Turtle:
                                      round_int(width),
                                      round_int(height),
                                      data]])
-
-            def send_event():
-                self._turtles.turtle_window.send_event('P', event)
-                return False
-
-            GLib.idle_add(send_event)
-
-            os.remove(tmp_file)
+            self._turtles.turtle_window.send_event('P', event)
 
     def draw_text(self, label, x, y, size, w, share=True):
         ''' Draw text '''
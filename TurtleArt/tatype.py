@@ -90,28 +90,56 @@ TYPE_VECTOR = Type('TYPE_VECTOR', 11)
 # groups/ classes of types
 TYPES_NUMERIC = (TYPE_FLOAT, TYPE_INT, TYPE_NUMBER)
 
+ALL_TYPES = (TYPE_OBJECT, TYPE_CHAR, TYPE_COLOR, TYPE_FLOAT, TYPE_INT,
+             TYPE_BOOL, TYPE_NUMBER, TYPE_NUMERIC_STRING, TYPE_BOX,
+             TYPE_STRING, TYPE_MEDIA, TYPE_VECTOR)
+
 BOX_AST = ast.Name(id='BOX', ctx=ast.Load)
 ACTION_AST = ast.Name(id='ACTION', ctx=ast.Load)
 
+# (type, False) for the most common Python types, looked up before trying
+# the isinstance checks in get_type
+_SCALAR_TYPES = {int: (TYPE_INT, False),
+                 bool: (TYPE_INT, False),
+                 float: (TYPE_FLOAT, False)}
+# string -> (type, False), for strings that have been classified before
+_string_types = {}
+_MAX_STRING_TYPES = 4096
+
+
+def _get_string_type(x):
+    """ Classify a string as a char, a numeric string or a string """
+    if x in _string_types:
+        return _string_types[x]
+    if len(x) == 1:
+        result = (TYPE_CHAR, False)
+    else:
+        try:
+            float(x)
+        except ValueError:
+            result = (TYPE_STRING, False)
+        else:
+            result = (TYPE_NUMERIC_STRING, False)
+    if len(_string_types) >= _MAX_STRING_TYPES:
+        _string_types.clear()
+    _string_types[x] = result
+    return result
+
 
 def get_type(x):
     """ Return the most specific type in the type hierarchy that applies to x
     and a boolean indicating whether x is an AST. If the type cannot be
     determined, return TYPE_OBJECT as the type. """
+    result = _SCALAR_TYPES.get(type(x))
+    if result is not None:
+        return result
     # non-AST types
     if isinstance(x, int):
         return (TYPE_INT, False)
     elif isinstance(x, float):
         return (TYPE_FLOAT, False)
     elif isinstance(x, str):
-        if len(x) == 1:
-            return (TYPE_CHAR, False)
-        try:
-            float(x)
-        except ValueError:
-            return (TYPE_STRING, False)
-        else:
-            return (TYPE_NUMERIC_STRING, False)
+        return _get_string_type(x)
     elif isinstance(x, Color):
         return (TYPE_COLOR, False)
     elif isinstance(x, Media):
@@ -273,6 +301,16 @@ def get_converter(old_type, new_type):
     """ If there is a converter old_type -> new_type, return it. Else return
     None. If a chain of converters is necessary, return it as a tuple or
     list (starting with the innermost, first-to-apply converter). """
+    try:
+        return _CONVERTER_TABLE[(old_type, new_type)]
+    except (KeyError, TypeError):
+        # not a pair of types from ALL_TYPES
+        return _find_converter(old_type, new_type)
+
+
+def _find_converter(old_type, new_type):
+    """ Search the type hierarchy for a converter old_type -> new_type (see
+    get_converter) """
     # every type can be converted to TYPE_OBJECT
     if new_type == TYPE_OBJECT:
         return identity
@@ -320,6 +358,12 @@ def get_converter(old_type, new_type):
     return None
 
 
+# (old_type, new_type) -> converter, for all pairs of types in ALL_TYPES
+_CONVERTER_TABLE = dict(((old_type, new_type),
+                         _find_converter(old_type, new_type))
+                        for old_type in ALL_TYPES for new_type in ALL_TYPES)
+
+
 def convert(x, new_type, old_type=None, converter=None):
     """ Convert x to the new type if possible.
     old_type -- the type of x. If not given, it is computed. """
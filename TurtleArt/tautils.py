@@ -38,8 +38,11 @@ from json import load as jload
 from json import dump as jdump
 from io import StringIO
 
+from . import tacompact
+
 from .taconstants import (HIT_HIDE, HIT_SHOW, XO1, XO15, XO175, XO4, UNKNOWN,
-                          MAGICNUMBER, SUFFIX, ARG_MUST_BE_NUMBER)
+                          MAGICNUMBER, SUFFIX, COMPACT_SUFFIX,
+                          ARG_MUST_BE_NUMBER)
 
 import logging
 _logger = logging.getLogger('turtleart-activity')
@@ -289,6 +292,9 @@ def get_load_name(filefilter, load_save_folder=None):
         Gtk.FileChooserAction.OPEN, (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
                                      Gtk.STOCK_OPEN, Gtk.ResponseType.OK))
     dialog.set_default_response(Gtk.ResponseType.OK)
+    if filefilter == '.t[a-b]':  # Projects, compact ones too
+        return do_dialog(dialog, filefilter, load_save_folder,
+                         [COMPACT_SUFFIX])
     return do_dialog(dialog, filefilter, load_save_folder)
 
 
@@ -338,6 +344,8 @@ def chooser_dialog(parent_window, filter, action):
 
 def data_from_file(ta_file):
     ''' Open the .ta file, ignoring any .png file that might be present. '''
+    if tacompact.is_compact_file(ta_file):
+        return list(tacompact.load(ta_file))
     file_handle = open(ta_file, 'r')
     #
     # We try to maintain read-compatibility with all versions of Turtle Art.
@@ -354,6 +362,43 @@ def data_from_file(ta_file):
     return data
 
 
+def iter_data_from_file(ta_file):
+    ''' Yield the entries of the block array in a .ta file one at a time,
+    decoding each one only when it is asked for. Files that are not a
+    plain JSON array are loaded with data_from_file. '''
+    if tacompact.is_compact_file(ta_file):
+        for entry in tacompact.load(ta_file):
+            yield entry
+        return
+    with open(ta_file, 'r') as file_handle:
+        text = file_handle.read()
+    if text[0:2] == MAGICNUMBER:
+        text = text[2:]
+    decoder = json.JSONDecoder()
+    pos = len(text) - len(text.lstrip())
+    if text[pos:pos + 1] != '[':
+        for entry in data_from_file(ta_file):
+            yield entry
+        return
+    pos += 1
+    count = 0
+    while True:
+        while pos < len(text) and text[pos] in ' \t\r\n\0,':
+            pos += 1
+        if pos >= len(text) or text[pos] == ']':
+            return
+        try:
+            entry, pos = decoder.raw_decode(text, pos)
+        except ValueError:
+            # Let json_load repair what it can, and carry on from there
+            data = data_from_file(ta_file)
+            for entry in data[count:]:
+                yield entry
+            return
+        count += 1
+        yield _tuplify(entry)
+
+
 def data_from_string(text):
     ''' JSON load data from a string. '''
     if isinstance(text, str):
@@ -393,11 +438,13 @@ def data_to_string(data):
     return json_dump(data).replace(']], ', ']],\n')
 
 
-def do_dialog(dialog, suffix, load_save_folder):
+def do_dialog(dialog, suffix, load_save_folder, more_suffixes=()):
     ''' Open a file dialog. '''
     result = None
     file_filter = Gtk.FileFilter()
     file_filter.add_pattern('*' + suffix)
+    for more_suffix in more_suffixes:
+        file_filter.add_pattern('*' + more_suffix)
     file_filter.set_name('Turtle Art')
     dialog.add_filter(file_filter)
 
@@ -412,26 +459,27 @@ def do_dialog(dialog, suffix, load_save_folder):
     return result, load_save_folder
 
 
-def save_picture(canvas, file_name):
-    ''' Save the canvas to a file '''
+def copy_canvas_surface(canvas):
+    ''' Copy the turtle canvas into a new image surface '''
+    canvas.flush()
     x_surface = canvas.canvas.get_target()
     img_surface = cairo.ImageSurface(cairo.FORMAT_RGB24,
                                      canvas.width, canvas.height)
     cr = cairo.Context(img_surface)
     cr.set_source_surface(x_surface)
     cr.paint()
-    img_surface.write_to_png(str(file_name))
+    img_surface.flush()
+    return img_surface
+
+
+def save_picture(canvas, file_name):
+    ''' Save the canvas to a file '''
+    copy_canvas_surface(canvas).write_to_png(str(file_name))
 
 
 def get_canvas_data(canvas):
     ''' Get pixel data from the turtle canvas '''
-    x_surface = canvas.canvas.get_target()
-    img_surface = cairo.ImageSurface(cairo.FORMAT_RGB24,
-                                     canvas.width, canvas.height)
-    cr = cairo.Context(img_surface)
-    cr.set_source_surface(x_surface)
-    cr.paint()
-    return img_surface.get_data()
+    return copy_canvas_surface(canvas).get_data()
 
 
 def get_pixbuf_from_journal(dsobject, w, h):
@@ -475,6 +523,19 @@ def image_to_base64(image_path, tmp_path):
     return data
 
 
+def pixbuf_to_png(pixbuf):
+    ''' Encode a pixbuf as PNG, in memory '''
+    return pixbuf.save_to_bufferv('png', [], [])[1]
+
+
+def png_to_pixbuf(data):
+    ''' Decode a PNG (or other image) in memory '''
+    loader = GdkPixbuf.PixbufLoader()
+    loader.write(data)
+    loader.close()
+    return loader.get_pixbuf()
+
+
 def base64_to_image(data, path_name):
     ''' Convert base64-encoded data to an image '''
     base64 = os.path.join(path_name, 'base64tmp')
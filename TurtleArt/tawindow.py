@@ -24,9 +24,13 @@
 
 import os
 import sys
+import shutil
 import subprocess
+import tempfile
+import configparser
 import errno
 from gettext import gettext as _
+from time import time
 
 import cairo
 import gi
@@ -43,7 +47,7 @@ _GST_AVAILABLE = False
 
 
 from random import uniform
-from math import atan2, pi
+from math import atan2, pi, sqrt
 DEGTOR = 2 * pi / 360
 
 import locale
@@ -91,6 +95,8 @@ from .taconstants import (
     PROTO_LAYER,
     EXPANDABLE_FLOW,
     SUFFIX,
+    COMPACT_SUFFIX,
+    PROJECT_SUFFIXES,
     TMP_SVG_PATH,
     TMP_ODP_PATH,
     Vector,
@@ -105,17 +111,22 @@ from .talogo import (LogoCode, logoerror)
 from .tacanvas import TurtleGraphics
 from .tablock import (Blocks, Block, Media, media_blocks_dictionary)
 from .taturtle import (Turtles, Turtle)
+from . import tacompact
+from .tatrace import StartupTrace
+from .tasnapshot import SnapshotWriter
 from .tautils import (magnitude, get_load_name, get_save_name, data_from_file,
                       data_to_file, round_int, get_id, get_pixbuf_from_journal,
                       movie_media_type, audio_media_type, image_media_type,
-                      save_picture, calc_image_size, get_path, hide_button_hit,
-                      show_button_hit, chooser_dialog, arithmetic_check, xy,
+                      save_picture, copy_canvas_surface, calc_image_size,
+                      get_path, hide_button_hit, show_button_hit,
+                      chooser_dialog, arithmetic_check, xy,
                       find_block_to_run, find_top_block, journal_check,
                       find_group, find_blk_below, data_to_string,
                       find_start_stack, get_hardware, debug_output,
                       error_output, find_hat, find_bot_block,
                       restore_clamp, collapse_clamp, data_from_string,
-                      increment_name, get_screen_dpi, is_writeable)
+                      increment_name, get_screen_dpi, is_writeable,
+                      iter_data_from_file)
 from .tasprite_factory import (svg_str_to_pixbuf, svg_from_file)
 from .tapalette import block_primitives
 from .tapaletteview import PaletteView
@@ -128,7 +139,12 @@ from .tagplay import stop_media
 
 _MOTION_THRESHOLD = 6
 _SNAP_THRESHOLD = 200
+# How far a dock point may lie outside of its block's sprite
+_DOCK_MARGIN = 10
 _NO_DOCK = (100, 100)  # Blocks cannot be docked
+# Seconds of work per idle call when loading a project in the background
+_LOAD_TIME_SLICE = 0.04
+_LOAD_PARSE_BATCH = 500  # Blocks parsed between checks of the time
 _BUTTON_SIZE = 32
 _MARGIN = 5
 _UNFULLSCREEN_VISIBILITY_TIMEOUT = 2
@@ -147,21 +163,29 @@ class TurtleArtWindow():
     def __init__(self, canvas_window, lib_path, share_path, parent=None,
                  activity=None, mycolors=None, mynick=None,
                  turtle_canvas=None, running_sugar=True,
-                 running_turtleart=True):
+                 running_turtleart=True, canvas_size=None):
         '''
         parent: the GTK Window that TA runs in
         activity: the object that instantiated this TurtleArtWindow (in
                   GNOME, a TurtleMain instance, in Sugar, the Activity
                   instance)
         running_turtleart: are we running TA or exported python code?
+        canvas_size: (width, height) of the canvas, instead of the screen
+                     size (used when rendering without a display)
         '''
+        self.startup_trace = StartupTrace()
+        self._painted = False
+        self.snapshot_writer = SnapshotWriter()
         self.parent = parent
         self.turtle_canvas = turtle_canvas
         self._default_turtle_name = DEFAULT_TURTLE
         self._loaded_project = ''
+        self._load_steps = None  # Project being loaded in the background
+        self._load_done = None
         self._sharing = False
         self._timeout_tag = [0]
         self.send_event = None  # method to send events over the network
+        self.share_image = None  # method to share a pixbuf, returns its key
         self.gst_available = _GST_AVAILABLE
         self.running_sugar = False
         self.nick = None
@@ -209,8 +233,11 @@ class TurtleArtWindow():
         self.save_file_name = None
 
         # dimensions
-        self.width = Gdk.Screen.width()
-        self.height = Gdk.Screen.height()
+        if canvas_size is not None:
+            self.width, self.height = canvas_size
+        else:
+            self.width = Gdk.Screen.width()
+            self.height = Gdk.Screen.height()
         self.rect = Gdk.Rectangle()
 
         self.no_help = False
@@ -344,8 +371,14 @@ class TurtleArtWindow():
 
         self.turtleart_plugins = {}
         self.turtleart_favorites_plugins = []
+        # Plugins that are imported when one of their blocks is needed
+        self._deferred_plugins = {}  # dir -> (path, palettes, blocks)
+        self._deferred_plugin_blocks = {}  # block name -> plugin dir
+        self._plugins_ready = False
         # self.turtleart_plugin_list = {}
         self.saved_pictures = []
+        self._pictures_pending = 0  # Pictures on their way to the Journal
+        self._odp_pending = None  # Name of an ODP waiting for them
         self.block_operation = ''
 
         # only in TA: setup basic palettes
@@ -363,6 +396,8 @@ class TurtleArtWindow():
         else:
             self._init_plugins()
             self._setup_plugins()
+            self.startup_trace.report(self.running_sugar)
+            self.startup_trace = None
 
     def get_global_objects(self):
         return global_objects
@@ -456,12 +491,74 @@ class TurtleArtWindow():
                         self.activity._do_toggle_plugin_cb,
                         status)
             if status:
-                self.init_plugin(plugin_dir, plugin_path)
+                info = self._read_plugin_info(plugin_dir, plugin_path)
+                if info is not None:
+                    self._deferred_plugins[plugin_dir] = (plugin_path,) + info
+                    for name in info[1]:
+                        self._deferred_plugin_blocks[name] = plugin_dir
+                else:
+                    with self.startup_trace.step('import %s' % plugin_dir):
+                        self.init_plugin(plugin_dir, plugin_path)
                 self.turtleart_favorites_plugins.append(plugin_dir)
         if not self.running_sugar:
             if hasattr(self.activity, '_plugin_menu'):
                 self.activity._plugin_menu.show_all()
 
+    def _read_plugin_info(self, plugin_dir, plugin_path):
+        ''' The palettes and block names listed in the plugin.info file of
+        a plugin that can be imported later, when it is first needed, or
+        None if the plugin must be imported now. '''
+        info_path = os.path.join(plugin_path, plugin_dir, 'plugin.info')
+        if not os.path.exists(info_path):
+            return None
+        file_info = configparser.ConfigParser()
+        try:
+            file_info.read(info_path)
+            palettes = file_info.get('Plugin', 'palette')
+            blocks = file_info.get('Plugin', 'blocks')
+        except configparser.Error:
+            return None
+        return ([name.strip() for name in palettes.split(',')],
+                [name.strip() for name in blocks.split(',') if name.strip()])
+
+    def load_plugin(self, plugin_dir):
+        ''' Import and set up a plugin that was deferred until it is
+        needed. Returns True if the plugin is loaded. '''
+        if plugin_dir not in self._deferred_plugins:
+            return plugin_dir in self.turtleart_plugins
+        plugin_path, palettes, blocks = self._deferred_plugins.pop(plugin_dir)
+        for name in blocks:
+            if self._deferred_plugin_blocks.get(name) == plugin_dir:
+                del self._deferred_plugin_blocks[name]
+        start = time()
+        self.init_plugin(plugin_dir, plugin_path)
+        if self.startup_trace is not None:
+            self.startup_trace.add_step('import %s' % plugin_dir,
+                                        time() - start)
+        if plugin_dir in self.turtleart_plugins:
+            self._setup_plugin(plugin_dir)
+        if plugin_dir not in self.turtleart_plugins:
+            return False
+        if self.interactive_mode and self._plugins_ready:
+            self.load_media_shapes()  # The plugin may have added some
+        if self.running_blocks and hasattr(
+                self.turtleart_plugins[plugin_dir], 'start'):
+            self.turtleart_plugins[plugin_dir].start()
+        debug_output('Loaded plugin %s in %.3fs' %
+                     (plugin_dir, time() - start), self.running_sugar)
+        return True
+
+    def _load_plugin_for_block(self, name):
+        ''' Load the deferred plugin that defines block name, if any '''
+        if name in self._deferred_plugin_blocks:
+            self.load_plugin(self._deferred_plugin_blocks[name])
+
+    def _load_plugins_for_palette(self, palette_name):
+        ''' Load the deferred plugins that add blocks to a palette '''
+        for plugin_dir in sorted(self._deferred_plugins.keys()):
+            if palette_name in self._deferred_plugins[plugin_dir][1]:
+                self.load_plugin(plugin_dir)
+
     def init_plugin(self, plugin_dir, plugin_path):
         ''' Initialize plugin in plugin_dir '''
         plugin_class = plugin_dir.capitalize()
@@ -499,16 +596,30 @@ class TurtleArtWindow():
         else:
             return None
 
+    def _setup_plugin(self, plugin):
+        start = time()
+        try:
+            self.turtleart_plugins[plugin].setup()
+        except Exception as e:
+            debug_output('Plugin %s failed during setup: %s' %
+                         (plugin, str(e)), self.running_sugar)
+            # If setup fails, remove the plugin from the list
+            self.turtleart_plugins.pop(plugin)
+        if self.startup_trace is not None:
+            self.startup_trace.add_step('setup %s' % plugin, time() - start)
+
     def _setup_plugins(self):
         ''' Initial setup -- called just once. '''
         for plugin in sorted(self.turtleart_plugins.keys()):
-            try:
-                self.turtleart_plugins[plugin].setup()
-            except Exception as e:
-                debug_output('Plugin %s failed during setup: %s' %
-                             (plugin, str(e)), self.running_sugar)
-                # If setup fails, remove the plugin from the list
-                self.turtleart_plugins.pop(plugin)
+            self._setup_plugin(plugin)
+        # A deferred plugin with a palette of its own is needed now, to
+        # show the palette button.
+        for plugin_dir in sorted(self._deferred_plugins.keys()):
+            for palette_name in self._deferred_plugins[plugin_dir][1]:
+                if palette_name not in palette_names:
+                    self.load_plugin(plugin_dir)
+                    break
+        self._plugins_ready = True
 
     def start_plugins(self):
         ''' Start is called everytime we execute blocks. '''
@@ -770,9 +881,24 @@ class TurtleArtWindow():
 
     def _draw_cb(self, win, context):
         ''' Repaint '''
+        start = time()
         self.do_draw(context)
+        self.lc.pacer.painted((time() - start) * 1000.)
+        if self.startup_trace is not None:
+            self._trace_paint()
         return True
 
+    def _trace_paint(self):
+        ''' Note the first paint, and report the startup times once the
+        plugins are set up '''
+        if not self._painted:
+            self._painted = True
+            self.startup_trace.mark('first paint')
+        if self._plugins_ready:
+            self.startup_trace.mark('first paint with palettes')
+            self.startup_trace.report(self.running_sugar)
+            self.startup_trace = None
+
     def do_draw(self, cr):
         ''' Handle the expose-event by drawing '''
 
@@ -781,15 +907,20 @@ class TurtleArtWindow():
         # sw needs new bounds set
         # cr.scale(self.activity.global_x_scale, self.activity.global_y_scale)
 
-        cr.rectangle(self.rect.x, self.rect.y,
-                     self.rect.width, self.rect.height)
+        # Stroke any turtle lines still waiting in the pen path
+        self.canvas.flush()
+
+        # Only the damaged region (the clip gtk hands us) is repainted.
+        has_clip, area = Gdk.cairo_get_clip_rectangle(cr)
+        if not has_clip:
+            area = None
 
         if self.turtle_canvas is not None:
             cr.set_source_surface(self.turtle_canvas)
             cr.paint()
 
-        # Refresh sprite list
-        self.sprite_list.redraw_sprites(cr=cr)
+        # Refresh the sprites that overlap the damaged region
+        self.sprite_list.redraw_sprites(area=area, cr=cr)
 
     def eraser_button(self):
         ''' Eraser_button (hide status block when clearing the screen.) '''
@@ -800,8 +931,13 @@ class TurtleArtWindow():
         self.lc.prim_clear()
         self.display_coordinates()
 
-    def run_button(self, time, running_from_button_push=False):
-        ''' Run turtle! '''
+    def run_button(self, time, running_from_button_push=False, turbo=False,
+                   compiled=False):
+        ''' Run turtle! A turbo run does not highlight the blocks as they
+        run, even when they are shown. A compiled run runs the blocks as
+        Python code (when they can all be compiled). '''
+        if self.is_loading():
+            return  # Not all of the blocks are there yet
         if self.running_sugar:
             self.activity.recenter()
         elif self.interactive_mode:  # autosave in GNOME
@@ -826,7 +962,7 @@ class TurtleArtWindow():
                     # FIX ME: use graphic
                     self.showlabel('emptystart')
                 else:
-                    self._run_stack(blk)
+                    self._run_stack(blk, turbo, compiled)
                 return
 
         # If there is no 'start' block, run stacks that aren't 'def action'
@@ -840,7 +976,7 @@ class TurtleArtWindow():
                     self.selected_blk = None
                 else:
                     self.selected_blk = blk
-                self._run_stack(blk)
+                self._run_stack(blk, turbo, compiled)
         return
 
     def stop_button(self):
@@ -960,7 +1096,12 @@ class TurtleArtWindow():
     def inval_all(self):
         ''' Force a refresh '''
         if self.interactive_mode:
-            self.window.queue_draw_area(0, 0, self.width, self.height)
+            self.sprite_list.add_damage(0, 0, self.width, self.height)
+
+    def inval_area(self, x, y, w, h):
+        ''' Refresh a region of the window '''
+        if self.interactive_mode:
+            self.sprite_list.add_damage(x, y, w, h)
 
     def hideshow_palette(self, state):
         ''' Hide or show palette  '''
@@ -1070,6 +1211,9 @@ class TurtleArtWindow():
         if init_only:
             return
 
+        if n < len(palette_names):
+            self._load_plugins_for_palette(palette_names[n])
+
         if show:
             # Hide the previously displayed palette
             self._hide_previous_palette()
@@ -1232,6 +1376,8 @@ class TurtleArtWindow():
 
     def _buttonpress_cb(self, win, event):
         ''' Button press '''
+        if self.is_loading():
+            return True  # Wait for the project to be loaded
         self.window.grab_focus()
         x, y = xy(event)
         self.mouse_flag = 1
@@ -1955,8 +2101,7 @@ class TurtleArtWindow():
                 blk.spr.hide()
                 remove_list.append(blk)
         for blk in remove_list:
-            if blk in self.block_list.list:
-                self.block_list.list.remove(blk)
+            self.block_list.remove_from_list(blk)
         self.trash_stack = []
         if 'trash' in palette_names:
             self.show_toolbar_palette(palette_names.index('trash'),
@@ -2083,6 +2228,7 @@ class TurtleArtWindow():
 
     def _new_block(self, name, x, y, defaults=None):
         ''' Make a new block. '''
+        self._load_plugin_for_block(name)
         x_pos = x - 20
         y_pos = y - 20
         if name in content_blocks:
@@ -2184,6 +2330,18 @@ class TurtleArtWindow():
         ''' Process block_data (from a macro, a file, or the clipboard). '''
         if self.interactive_mode:
             self.sprite_list.set_defer_draw(True)
+        if not self._read_block_data(block_data):
+            return None
+        # Create the blocks (or turtle).
+        blocks = []
+        for blk in self._process_block_data:
+            blocks.append(self._create_block(blk, offset))
+        return self._connect_blocks(blocks, offset)
+
+    def _read_block_data(self, block_data):
+        ''' Restore the turtles and the font scale, and keep the block
+        entries in self._process_block_data. Return False if an entry is
+        malformed. '''
         self._process_block_data = []
         for blk in block_data:
             if not (self._found_a_turtle(blk) or self._found_font_scale(blk)):
@@ -2194,19 +2352,21 @@ class TurtleArtWindow():
                     self._process_block_data.append(
                         [blk[0], blk[1], blk[2], blk[3], blk[4]])
                 else:
-                    return None
+                    return False
         self._extra_block_data = []
-        # Create the blocks (or turtle).
-        blocks = []
-        for i, blk in enumerate(self._process_block_data):
-            if not (self._found_a_turtle(blk) or self._found_font_scale(blk)):
-                newblk = self.load_block(blk, offset)
-                if newblk is not None:
-                    blocks.append(newblk)
-                    if newblk.spr is not None:
-                        newblk.spr.set_layer(TOP_LAYER)
-                else:
-                    blocks.append(None)
+        return True
+
+    def _create_block(self, blk, offset):
+        ''' Create the block for an entry of self._process_block_data '''
+        newblk = self.load_block(blk, offset)
+        if newblk is not None and newblk.spr is not None:
+            newblk.spr.set_layer(TOP_LAYER)
+        return newblk
+
+    def _connect_blocks(self, blocks, offset):
+        ''' Connect the blocks created from self._process_block_data (in
+        the same order), and fit their shapes and positions together.
+        Return the first block. '''
         # Some extra blocks may have been added by load_block
         for blk in self._extra_block_data:
             self._process_block_data.append(blk)
@@ -2355,6 +2515,128 @@ class TurtleArtWindow():
         else:
             return None
 
+    def _stacks_in_view_first(self, block_data):
+        ''' Return the indices of the entries in block_data, with the
+        stacks that have a block in the visible part of the canvas first '''
+        # Group the entries into stacks by following their connections
+        stack = list(range(len(block_data)))
+
+        def _find(i):
+            while stack[i] != i:
+                stack[i] = stack[stack[i]]
+                i = stack[i]
+            return i
+
+        for i, blk in enumerate(block_data):
+            if not isinstance(blk[4], (list, tuple)):
+                continue
+            for c in blk[4]:
+                if isinstance(c, int) and 0 <= c < len(block_data):
+                    stack[_find(c)] = _find(i)
+        visible = set()
+        for i, blk in enumerate(block_data):
+            try:
+                x, y = float(blk[2]), float(blk[3])
+            except (TypeError, ValueError):
+                continue
+            if 0 <= x < self.width and 0 <= y < self.height:
+                visible.add(_find(i))
+        indices = list(range(len(block_data)))
+        indices.sort(key=lambda i: _find(i) not in visible)
+        return indices
+
+    def load_files_incrementally(self, ta_file, create_new_project=True,
+                                 done=None):
+        ''' Load a project from a file a batch of blocks at a time while
+        idle, the stacks in view first, showing the progress. done (if
+        given) is called as done(cancelled) once all of the blocks are
+        connected, or when the load is cancelled. Windows that are not
+        interactive load the file right away. '''
+        if not self.interactive_mode:
+            self.load_files(ta_file, create_new_project)
+            if done is not None:
+                done(False)
+            return
+        if create_new_project:
+            self.new_project()
+        self._loaded_project = ta_file
+        self._load_steps = self._load_steps_from_file(ta_file)
+        self._load_done = done
+        GLib.idle_add(self._load_idle_cb, self._load_steps)
+
+    def is_loading(self):
+        ''' Is a project still being loaded in the background? '''
+        return self._load_steps is not None
+
+    def finish_loading(self):
+        ''' Load the rest of a project being loaded in the background
+        now, e.g. before it is saved '''
+        steps = self._load_steps
+        if steps is None:
+            return
+        try:
+            for progress in steps:
+                pass
+        except BaseException:
+            self._load_finished(True)
+            raise
+        self._load_finished(False)
+
+    def _load_finished(self, cancelled):
+        self._load_steps = None
+        if self.interactive_mode:
+            self.sprite_list.set_defer_draw(False)
+        if self.status_spr is not None:
+            self.status_spr.hide()
+        done, self._load_done = self._load_done, None
+        if done is not None:
+            done(cancelled)
+
+    def _load_steps_from_file(self, ta_file):
+        ''' Load a project, yielding (blocks created, number of blocks)
+        every now and then '''
+        block_data = []
+        for blk in iter_data_from_file(ta_file):
+            block_data.append(blk)
+            if len(block_data) % _LOAD_PARSE_BATCH == 0:
+                yield (0, 0)
+        if not self._read_block_data(block_data):
+            return
+        n = len(self._process_block_data)
+        blocks = [None] * n
+        self.sprite_list.set_defer_draw(False)
+        for count, i in enumerate(
+                self._stacks_in_view_first(self._process_block_data)):
+            blocks[i] = self._create_block(self._process_block_data[i], 0)
+            yield (count + 1, n)
+        self.sprite_list.set_defer_draw(True)
+        self._connect_blocks(blocks, 0)
+        self.inval_all()
+
+    def _load_idle_cb(self, steps):
+        ''' Run the loader for a while '''
+        if steps is not self._load_steps:
+            return False  # Cancelled
+        start = time()
+        progress = None
+        try:
+            while time() - start < _LOAD_TIME_SLICE:
+                progress = next(steps)
+        except StopIteration:
+            self._load_finished(False)
+            return False
+        except BaseException:
+            self._load_finished(True)
+            raise
+        if progress is not None and progress[1] > 0:
+            self.showlabel('info', _('Loading') + ' %d/%d' % progress)
+        return True
+
+    def _cancel_loading(self):
+        ''' Stop loading a project in the background '''
+        if self._load_steps is not None:
+            self._load_finished(True)
+
     def _adjust_dock_positions(self, blk):
         ''' Adjust the dock x, y positions '''
         if not self.interactive_mode:
@@ -2506,41 +2788,8 @@ class TurtleArtWindow():
                 if by + dy < 0:
                     dy = -by
 
-            # Calculate a bounding box and only invalidate once.
-            minx = blk.spr.rect.x
-            miny = blk.spr.rect.y
-            maxx = blk.spr.rect.x + blk.spr.rect.width
-            maxy = blk.spr.rect.y + blk.spr.rect.height
-
             for blk in self.drag_group:
-                if blk.spr.rect.x < minx:
-                    minx = blk.spr.rect.x
-                if blk.spr.rect.x + blk.spr.rect.width > maxx:
-                    maxx = blk.spr.rect.x + blk.spr.rect.width
-                if blk.spr.rect.y < miny:
-                    miny = blk.spr.rect.y
-                if blk.spr.rect.y + blk.spr.rect.height > maxy:
-                    maxy = blk.spr.rect.y + blk.spr.rect.height
-                blk.spr.rect.x += dx
-                blk.spr.rect.y += dy
-
-            if dx < 0:
-                minx += dx
-            else:
-                maxx += dx
-            if dy < 0:
-                miny += dy
-            else:
-                maxy += dy
-
-            self.rect.x = minx
-            self.rect.y = miny
-            self.rect.width = maxx - minx
-            self.rect.height = maxy - miny
-            self.window.queue_draw_area(self.rect.x,
-                                        self.rect.y,
-                                        self.rect.width,
-                                        self.rect.height)
+                blk.spr.move_relative((dx, dy))
         self.dx += dx
         self.dy += dy
 
@@ -2999,21 +3248,21 @@ class TurtleArtWindow():
             else:
                 break
 
-    def _run_stack(self, blk):
+    def _run_stack(self, blk, turbo=False, compiled=False):
         ''' Run a stack of blocks. '''
         if not self.interactive_mode:
             # Test for forever block
             if len(self.block_list.get_similar_blocks('block', 'forever')) > 0:
                 debug_output('WARNING: Projects with forever blocks \
  may not terminate.', False)
-            self.__run_stack(blk)
+            self.__run_stack(blk, turbo, compiled)
         else:
             self._hide_text_entry()
             self.parent.get_window().set_cursor(
                 Gdk.Cursor.new(Gdk.CursorType.WATCH))
-            GLib.idle_add(self.__run_stack, blk)
+            GLib.idle_add(self.__run_stack, blk, turbo, compiled)
 
-    def __run_stack(self, blk):
+    def __run_stack(self, blk, turbo=False, compiled=False):
         if self.status_spr is not None:
             self.status_spr.hide()
         self._autohide_shape = True
@@ -3027,10 +3276,12 @@ class TurtleArtWindow():
         self.start_plugins()  # Let the plugins know we are running.
         top = find_top_block(blk)
         code = self.lc.generate_code(top, self.just_blocks())
+        self.lc.turbo = turbo
         if self.interactive_mode:
             self.parent.get_window().set_cursor(
                 Gdk.Cursor.new(Gdk.CursorType.LEFT_PTR))
-        self.lc.run_blocks(code)
+        if not (compiled and self.lc.run_compiled(top)):
+            self.lc.run_blocks(code)
         if self.interactive_mode:
             GLib.idle_add(self.lc.doevalstep)
         else:
@@ -3038,20 +3289,32 @@ class TurtleArtWindow():
                 pass
         # self.running_blocks = False  # Should be handled in talogo.py
 
-    def _snap_to_dock(self):
-        ''' Snap a block (selected_block) to the dock of another block
-        (destination_block). '''
-        selected_block = self.drag_group[0]
-        best_destination = None
+    def _find_dock(self, selected_block):
+        ''' Find the closest dock (within _SNAP_THRESHOLD) that the
+        selected block can be docked to. Only the blocks whose sprites lie
+        near a dock of the selected block are considered. '''
+        best = None
         d = _SNAP_THRESHOLD
-        self.inserting_block_mid_stack = False
+        # _SNAP_THRESHOLD is a squared distance (see magnitude)
+        radius = int(sqrt(_SNAP_THRESHOLD)) + 1 + _DOCK_MARGIN
+        drag_group = set(self.drag_group)
+        (sx, sy) = selected_block.spr.get_xy()
         for selected_block_dockn in range(len(selected_block.docks)):
-            for destination_block in self.just_blocks():
+            dock = selected_block.docks[selected_block_dockn]
+            if dock[0] == 'unavailable':
+                continue
+            for spr in self.sprite_list.find_sprites_in_area(
+                    sx + dock[2] - radius, sy + dock[3] - radius,
+                    2 * radius, 2 * radius):
+                destination_block = self.block_list.spr_to_block(spr)
+                if destination_block is None or \
+                   destination_block.type != 'block':
+                    continue
                 # Don't link to a block that is hidden
                 if destination_block.status == 'collapsed':
                     continue
                 # Don't link to a block to which you're already connected
-                if destination_block in self.drag_group:
+                if destination_block in drag_group:
                     continue
                 # Check each dock of destination for a possible connection
                 for destination_dockn in range(len(destination_block.docks)):
@@ -3061,10 +3324,20 @@ class TurtleArtWindow():
                     if magnitude(this_xy) > d:
                         continue
                     d = magnitude(this_xy)
-                    best_xy = this_xy
-                    best_destination = destination_block
-                    best_destination_dockn = destination_dockn
-                    best_selected_block_dockn = selected_block_dockn
+                    best = (this_xy, destination_block, destination_dockn,
+                            selected_block_dockn)
+        return d, best
+
+    def _snap_to_dock(self):
+        ''' Snap a block (selected_block) to the dock of another block
+        (destination_block). '''
+        selected_block = self.drag_group[0]
+        best_destination = None
+        self.inserting_block_mid_stack = False
+        d, best = self._find_dock(selected_block)
+        if best is not None:
+            (best_xy, best_destination, best_destination_dockn,
+             best_selected_block_dockn) = best
         if d < _SNAP_THRESHOLD:
             # Some combinations of blocks are not valid
             if not arithmetic_check(selected_block, best_destination,
@@ -3510,6 +3783,8 @@ class TurtleArtWindow():
 
     def _keypress_cb(self, area, event):
         ''' Keyboard '''
+        if self.is_loading():
+            return True  # Wait for the project to be loaded
         keyname = Gdk.keyval_name(event.keyval)
         keyunicode = Gdk.keyval_to_unicode(event.keyval)
         if event.get_state() & Gdk.ModifierType.MOD1_MASK:
@@ -3898,6 +4173,7 @@ class TurtleArtWindow():
 
     def new_project(self):
         ''' Start a new project '''
+        self._cancel_loading()
         self.lc.stop_logo()
         self._loaded_project = ''
         # Put current project in the trash.
@@ -3939,9 +4215,9 @@ class TurtleArtWindow():
             self.load_save_folder)
         if file_name is None:
             return
-        if not file_name.endswith(SUFFIX):
+        if not file_name.endswith(PROJECT_SUFFIXES):
             file_name = file_name + SUFFIX[1]
-        self.load_files(file_name, create_new_project)
+        self.load_files_incrementally(file_name, create_new_project)
         if create_new_project:
             self.save_file_name = os.path.basename(file_name)
         if self.running_sugar:
@@ -3997,6 +4273,7 @@ class TurtleArtWindow():
             btype, value = btype
         elif isinstance(btype, list):
             btype, value = btype[0], btype[1]
+        self._load_plugin_for_block(btype)
 
         # Replace deprecated sandwich blocks
         if btype == 'sandwichtop_no_label':
@@ -4272,8 +4549,9 @@ class TurtleArtWindow():
             self.process_data(data_from_file(ta_file))
             self._loaded_project = ta_file
 
-    def save_file(self, file_name=None):
-        ''' Start a project to a file '''
+    def save_file(self, file_name=None, compact=False):
+        ''' Start a project to a file (in the compact binary form of
+        tacompact if compact is True) '''
         if self.save_folder is not None:
             self.load_save_folder = self.save_folder
         if file_name is None:
@@ -4298,7 +4576,11 @@ class TurtleArtWindow():
             return
         if file_name is None:
             return
-        if not file_name.endswith(SUFFIX):
+        if compact:
+            # Not .tb, as other versions and tools expect JSON in those
+            if not file_name.endswith(COMPACT_SUFFIX):
+                file_name = os.path.splitext(file_name)[0] + COMPACT_SUFFIX
+        elif not file_name.endswith(SUFFIX):
             file_name = file_name + SUFFIX[1]
         if os.path.exists(file_name) and not is_writeable(file_name):
             if self.running_sugar:  # Shouldn't occur in Sugar
@@ -4317,13 +4599,33 @@ class TurtleArtWindow():
                 dlg.run()
                 dlg.destroy()
             return
-        data_to_file(self.assemble_data_to_save(), file_name)
+        if self.interactive_mode:
+            # Written in the background
+            self.snapshot_writer.save_project(
+                self.assemble_data_to_save(), file_name, compact,
+                self._snapshot_written)
+        elif compact:
+            try:
+                tacompact.save(self.assemble_data_to_save(), file_name)
+            except (IOError, OSError) as e:
+                error_output('Could not write to %s: %s.' % (file_name, e),
+                             self.running_sugar)
+                return
+        else:
+            data_to_file(self.assemble_data_to_save(), file_name)
         self.save_file_name = os.path.basename(file_name)
         if not self.running_sugar:
             self.save_folder = self.load_save_folder
 
+    def _snapshot_written(self, file_name, error):
+        if error is not None:
+            error_output('Could not write to %s: %s.' % (file_name, error),
+                         self.running_sugar)
+
     def assemble_data_to_save(self, save_turtle=True, save_project=True):
         ''' Pack the project (or stack) into a datastream to be serialized '''
+        # Never save part of a project
+        self.finish_loading()
         data = []
         blks = []
 
@@ -4495,6 +4797,10 @@ class TurtleArtWindow():
         dialog.run()
         dialog.destroy()'''
         if not self.interactive_mode:
+            # Let a non-interactive host (e.g. the batch renderer) know
+            if shp not in ['print', 'info', 'help'] and \
+               hasattr(self.activity, 'error_list'):
+                self.activity.error_list.append(str(label) or shp)
             debug_output(label, self.running_sugar)
             return
         # Don't overwrite an error message
@@ -4571,6 +4877,11 @@ class TurtleArtWindow():
     def save_as_odp(self, name=None):
         from .util.odp import TurtleODP
 
+        self.snapshot_writer.flush()  # Pictures saved in the background
+        if self._pictures_pending > 0:
+            # Made once the pictures are in the Journal
+            self._odp_pending = name
+            return
         path_list = []
         if self.running_sugar:
             from sugar3.datastore import datastore
@@ -4781,39 +5092,87 @@ class TurtleArtWindow():
             self.canvas.svg_close()
             self.canvas.svg_reset()
             svg_path = self.canvas.get_svg_path()
-        else:
-            save_picture(self.canvas, file_path)
+            if self.running_sugar:
+                # A copy of its own, as the next run writes to svg_path
+                file_path = self._picture_file(filename, suffix, datapath)
+                shutil.copyfile(svg_path, file_path)
+                self._pictures_pending += 1
+                self._save_image_to_journal(name, file_path, True)
+            else:
+                subprocess.check_output(
+                    ['cp', svg_path, os.path.join(datapath, filename)])
+                self.saved_pictures.append((file_path, svg))
+            return
 
+        # Copy the canvas now; the PNG is written in the background
+        surface = copy_canvas_surface(self.canvas)
         if self.running_sugar:
-            from sugar3.datastore import datastore
-            from sugar3 import profile
+            def _png_written(path, error):
+                if error is None:
+                    self._save_image_to_journal(name, path, False)
+                else:
+                    self._snapshot_written(path, error)
+                    os.remove(path)
+                    self._picture_saved()
 
-            dsobject = datastore.create()
-            if len(name) == 0:
-                dsobject.metadata['title'] = '%s %s' % \
-                    (self.activity.metadata['title'], _('image'))
-            else:
-                dsobject.metadata['title'] = name
-            dsobject.metadata['icon-color'] = profile.get_color().to_string()
-            if svg:
-                dsobject.metadata['mime_type'] = 'image/svg+xml'
-                dsobject.set_file_path(svg_path)
-            else:
-                dsobject.metadata['mime_type'] = 'image/png'
-                dsobject.set_file_path(file_path)
-            datastore.write(dsobject)
-            dsobject.destroy()
-            self.saved_pictures.append((dsobject.object_id, svg))
-            if svg:
-                os.remove(svg_path)
-            else:
-                os.remove(file_path)
+            file_path = self._picture_file(filename, suffix, datapath)
+            self._pictures_pending += 1
+            self.snapshot_writer.save_png(surface, file_path, _png_written)
         else:
-            if svg:
-                subprocess.check_output(
-                    ['cp', svg_path, os.path.join(datapath, filename)])
+            self.snapshot_writer.save_png(surface, file_path,
+                                          self._snapshot_written)
             self.saved_pictures.append((file_path, svg))
 
+    def _picture_file(self, filename, suffix, datapath):
+        ''' A new file for a picture on its way to the Journal, of its own
+        as it is removed once it is there '''
+        fd, file_path = tempfile.mkstemp(
+            suffix=suffix, prefix=filename[:-len(suffix)] + '-',
+            dir=datapath)
+        os.close(fd)
+        return file_path
+
+    def _save_image_to_journal(self, name, file_path, svg):
+        ''' Copy a saved image into the Journal (and remove the file) '''
+        from sugar3.datastore import datastore
+        from sugar3 import profile
+
+        dsobject = datastore.create()
+        if len(name) == 0:
+            dsobject.metadata['title'] = '%s %s' % \
+                (self.activity.metadata['title'], _('image'))
+        else:
+            dsobject.metadata['title'] = name
+        dsobject.metadata['icon-color'] = profile.get_color().to_string()
+        if svg:
+            dsobject.metadata['mime_type'] = 'image/svg+xml'
+        else:
+            dsobject.metadata['mime_type'] = 'image/png'
+        dsobject.set_file_path(file_path)
+
+        def _written(*args):
+            self.saved_pictures.append((dsobject.object_id, svg))
+            dsobject.destroy()
+            os.remove(file_path)
+            self._picture_saved()
+
+        def _failed(error):
+            error_output('Could not write %s to the Journal: %s' %
+                         (file_path, error), self.running_sugar)
+            dsobject.destroy()
+            os.remove(file_path)
+            self._picture_saved()
+
+        datastore.write(dsobject, reply_handler=_written,
+                        error_handler=_failed)
+
+    def _picture_saved(self):
+        ''' A picture is in the Journal (or failed to get there) '''
+        self._pictures_pending -= 1
+        if self._pictures_pending == 0 and self._odp_pending is not None:
+            name, self._odp_pending = self._odp_pending, None
+            self.save_as_odp(name)
+
     def just_blocks(self):
         ''' Filter out 'proto', 'trash', and 'deleted' blocks '''
         just_blocks_list = []
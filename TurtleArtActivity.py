@@ -565,6 +565,30 @@ class TurtleArtActivity(activity.Activity):
         self.tw.display_coordinates(clear=True)
         self.tw.run_button(self.tw.step_time, running_from_button_push=True)
 
+    def do_turbo_cb(self, button):
+        ''' Callback for turbo run: run fast, without highlighting the
+        blocks (which stay shown) '''
+        self._run_palette.popdown(immediate=True)
+        self.run_button.set_icon_name('run-faston')
+        self.step_button.set_icon_name('run-slowoff')
+        self.tw.lc.trace = 0
+        self.tw.step_time = 0
+        self.tw.display_coordinates(clear=True)
+        self.tw.run_button(self.tw.step_time, running_from_button_push=True,
+                           turbo=True)
+
+    def do_compiled_cb(self, button):
+        ''' Callback for compiled run: run the blocks as Python code '''
+        self._run_palette.popdown(immediate=True)
+        self.run_button.set_icon_name('run-faston')
+        self.step_button.set_icon_name('run-slowoff')
+        self.tw.lc.trace = 0
+        self.tw.step_time = 0
+        self.tw.hideblocks()
+        self.tw.display_coordinates(clear=True)
+        self.tw.run_button(self.tw.step_time, running_from_button_push=True,
+                           compiled=True)
+
     def do_step_cb(self, button):
         ''' Callback for step button (turtle) '''
         self.step_button.set_icon_name('run-slowon')
@@ -1266,6 +1290,16 @@ class TurtleArtActivity(activity.Activity):
             'eraseron', _('Clean'), self.do_eraser_cb, toolbar, _('<Ctrl>e'))
         self.run_button = self._add_button(
             'run-fastoff', _('Run'), self.do_run_cb, toolbar, _('<Ctrl>r'))
+        # Other ways to run, in the palette of the run button
+        self._run_palette = self.run_button.get_palette()
+        button_box = Gtk.VBox()
+        self._add_button_and_label(
+            'run-fastoff', _('Turbo'), self.do_turbo_cb, None, button_box)
+        self._add_button_and_label(
+            'run-fastoff', _('Run compiled'), self.do_compiled_cb, None,
+            button_box)
+        button_box.show_all()
+        self._run_palette.set_content(button_box)
         self.step_button = self._add_button(
             'run-slowoff', _('Step'), self.do_step_cb, toolbar, _('<Ctrl>w'))
         self.stop_turtle_button = self._add_button(
@@ -1420,6 +1454,8 @@ class TurtleArtActivity(activity.Activity):
     def can_close(self):
         ''' Override activity class can_close inorder to notify plugins '''
         self.tw.quit_plugins()
+        # Finish writing any files that are being saved in the background
+        self.tw.snapshot_writer.flush()
         # Clean up temporary files
         if os.path.exists(TMP_SVG_PATH):
             os.remove(TMP_SVG_PATH)
@@ -1548,7 +1584,12 @@ class TurtleArtActivity(activity.Activity):
         _logger.debug('Opening:' + file_path)
         if not hasattr(self, '_create_new'):
             self._create_new = False
-        self.tw.load_files(file_path, self._create_new)
+        self.tw.load_files_incrementally(file_path, self._create_new,
+                                         done=self._project_loaded)
+
+    def _project_loaded(self, cancelled=False):
+        ''' Restore the cursor and clean up once the project is loaded (or
+        its loading is cancelled) '''
         self.restore_cursor()
         if hasattr(self, '_tmp_dsobject') and self._tmp_dsobject is not None:
             _logger.debug('cleaning up after %s' %
@@ -57,7 +57,8 @@ import gettext
 from gettext import gettext as _
 
 from TurtleArt.taconstants import (OVERLAY_LAYER, DEFAULT_TURTLE_COLORS,
-                                   TAB_LAYER, SUFFIX, TMP_SVG_PATH,
+                                   TAB_LAYER, PROJECT_SUFFIXES,
+                                   COMPACT_SUFFIX, TMP_SVG_PATH,
                                    TMP_ODP_PATH, PASTE_OFFSET)
 from TurtleArt.tautils import (data_from_string, get_load_name,
                                get_path, get_save_name, is_writeable)
@@ -116,7 +117,8 @@ class TurtleMain():
  \tturtleblocks.py --output_png project.tb
  \tturtleblocks.py -o project
  \tturtleblocks.py --run project.tb
- \tturtleblocks.py -r project'''
+ \tturtleblocks.py -r project
+ \tturtleblocks.py --convert input output'''
         self._init_vars()
         self._parse_command_line()
         self._ensure_sugar_paths()
@@ -243,9 +245,13 @@ return %s(self)" % (p, P, P)
         Gtk.main()
 
     def _project_loader(self, file_name):
-        self.tw.load_start(self._ta_file)
+        self.tw.load_files_incrementally(self._ta_file,
+                                         create_new_project=False,
+                                         done=self._project_loaded)
+
+    def _project_loaded(self, cancelled=False):
         self.tw.lc.trace = 0
-        if self._run_on_launch:
+        if self._run_on_launch and not cancelled:
             self._do_run_cb()
         self.win.get_window().set_cursor(
             Gdk.Cursor.new(Gdk.CursorType.LEFT_PTR))
@@ -353,7 +359,7 @@ return %s(self)" % (p, P, P)
             sys.exit()
 
         if self._ta_file is not None:
-            if not self._ta_file.endswith(SUFFIX):
+            if not self._ta_file.endswith(PROJECT_SUFFIXES):
                 self._ta_file += '.tb'
             if not os.path.exists(self._ta_file):
                 self._ta_file = os.path.join(self._abspath, self._ta_file)
@@ -545,6 +551,8 @@ return %s(self)" % (p, P, P)
         menu = Gtk.Menu()
         make_menu_item(menu, _('Clean'), self._do_eraser_cb)
         make_menu_item(menu, _('Run'), self._do_run_cb)
+        make_menu_item(menu, _('Turbo'), self._do_turbo_cb)
+        make_menu_item(menu, _('Run compiled'), self._do_compiled_cb)
         make_menu_item(menu, _('Step'), self._do_step_cb)
         make_menu_item(menu, _('Debug'), self._do_trace_cb)
         make_menu_item(menu, _('Stop'), self._do_stop_cb)
@@ -596,6 +604,9 @@ return %s(self)" % (p, P, P)
             if hasattr(plugin, 'quit'):
                 plugin.quit()
 
+        # Finish writing any files that are being saved in the background
+        self.tw.snapshot_writer.flush()
+
         # Clean up temporary files
         try:
             os.remove(TMP_SVG_PATH)
@@ -702,13 +713,19 @@ Would you like to save before quitting?'))
         self._save_as()
 
     def autosave(self):
-        ''' Autosave is called each type the run button is pressed '''
+        ''' Autosave is called each type the run button is pressed. The
+        compact form (see TurtleArt/tacompact.py) is quicker to write and
+        is recognized when the file is loaded; it gets a suffix of its own,
+        as .tb files are JSON. '''
         temp_load_save_folder = self.tw.load_save_folder
         temp_save_folder = self.tw.save_folder
+        temp_save_file_name = self.tw.save_file_name
         self.tw.load_save_folder = self._autosavedirname
         self.tw.save_folder = self._autosavedirname
         self.tw.save_file(file_name=os.path.join(
-            self._autosavedirname, 'autosave.tb'))
+            self._autosavedirname, 'autosave' + COMPACT_SUFFIX),
+            compact=True)
+        self.tw.save_file_name = temp_save_file_name
         self.tw.save_folder = temp_save_folder
         self.tw.load_save_folder = temp_load_save_folder
 
@@ -775,8 +792,8 @@ Would you like to save before quitting?'))
         default_name = self.tw.save_file_name
         if default_name is None:
             default_name = _("myproject")
-        elif default_name.endswith(".ta") or default_name.endswith(".tb"):
-            default_name = default_name[:-3]
+        elif default_name.endswith(PROJECT_SUFFIXES):
+            default_name = os.path.splitext(default_name)[0]
         save_type = '.py'
         filename, self.tw.load_save_folder = get_save_name(
             save_type, None, default_name)
@@ -903,6 +920,23 @@ Would you like to save before quitting?'))
         self.tw.run_button(0, running_from_button_push=True)
         return
 
+    def _do_turbo_cb(self, widget):
+        ''' Callback for turbo run: run fast, without highlighting the
+        blocks (which stay shown) '''
+        self.tw.lc.trace = 0
+        self.tw.display_coordinates(clear=True)
+        self.tw.toolbar_shapes['stopiton'].set_layer(TAB_LAYER)
+        self.tw.run_button(0, running_from_button_push=True, turbo=True)
+        return
+
+    def _do_compiled_cb(self, widget):
+        ''' Callback for compiled run: run the blocks as Python code '''
+        self.tw.lc.trace = 0
+        self.tw.display_coordinates(clear=True)
+        self.tw.toolbar_shapes['stopiton'].set_layer(TAB_LAYER)
+        self.tw.run_button(0, running_from_button_push=True, compiled=True)
+        return
+
     def _do_step_cb(self, widget):
         ''' Callback for step button (turtle). '''
         self.tw.lc.trace = 1
@@ -1133,3 +1167,12 @@ Would you like to save before quitting?'))
                 samples.append(os.path.join(path, name))
         samples.sort()
         return samples
+
+
+if __name__ == '__main__':
+    if len(argv) > 1 and argv[1] == '--convert':
+        # Convert between .ta JSON and compact projects (see
+        # TurtleArt/tacompact.py)
+        from TurtleArt.tacompact import main
+        sys.exit(main(argv[2:]))
+    TurtleMain()
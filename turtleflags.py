@@ -29,6 +29,7 @@ import io
 import os
 import os.path
 import sys
+from time import time
 
 import cairo
 from gi.repository import Gio
@@ -52,7 +53,9 @@ import gettext
 
 from TurtleArt.taconstants import (OVERLAY_LAYER, DEFAULT_TURTLE_COLORS,
                                    TAB_LAYER, SUFFIX)
-from TurtleArt.tautils import (data_from_string, get_save_name, get_path)
+from TurtleArt.tautils import (data_from_string, get_save_name, get_path,
+                               debug_output)
+from TurtleArt.taimagecache import (ThumbnailCache, CACHE_HOME)
 from TurtleArt.tapalette import default_values
 from TurtleArt.tawindow import TurtleArtWindow
 from TurtleArt.taexportlogo import save_logo
@@ -68,6 +71,7 @@ class TurtleMain():
     _ICON_SUBPATH = 'images/turtle.png'
     _GNOME_PLUGIN_SUBPATH = 'gnome_plugins'
     _HOVER_HELP = 'hover-help'
+    _FILL_SAMPLES_BUDGET = 0.02  # Seconds of thumbnail loading per idle call
     _COORDINATE_SCALE = 'coordinate-scale'
     _GIO_SETTINGS = 'org.laptop.TurtleArtActivity'
 
@@ -98,13 +102,15 @@ class TurtleMain():
  \tturtleblocks.py --output_png project.tb
  \tturtleblocks.py -o project
  \tturtleblocks.py --run project.tb
- \tturtleblocks.py -r project'''
+ \tturtleblocks.py -r project
+ \tturtleflags.py --batch [-o dir] [-s WxH] [--svg] [-j jobs] directory'''
         self._init_vars()
         self._parse_command_line()
         self._ensure_sugar_paths()
         self._gnome_plugins = []
         self._selected_sample = None
         self._sample_window = None
+        self._thumbnails = None
         self._custom_filepath = None
 
         if self._output_png:
@@ -223,9 +229,13 @@ return %s(self)" % (p, P, P)
         Gtk.main()
 
     def _project_loader(self, file_name):
-        self.tw.load_start(self._ta_file)
+        self.tw.load_files_incrementally(self._ta_file,
+                                         create_new_project=False,
+                                         done=self._project_loaded)
+
+    def _project_loaded(self, cancelled=False):
         self.tw.lc.trace = 0
-        if self._run_on_launch:
+        if self._run_on_launch and not cancelled:
             self._do_run_cb()
         self.win.get_window().set_cursor(Gdk.Cursor.new(Gdk.CursorType.LEFT_PTR))
 
@@ -477,6 +487,9 @@ return %s(self)" % (p, P, P)
         menu = Gtk.Menu()
         menubuilder.make_menu_item(menu, _('Clean'), self._do_eraser_cb)
         menubuilder.make_menu_item(menu, _('Run'), self._do_run_cb)
+        menubuilder.make_menu_item(menu, _('Turbo'), self._do_turbo_cb)
+        menubuilder.make_menu_item(menu, _('Run compiled'),
+                                   self._do_compiled_cb)
         menubuilder.make_menu_item(menu, _('Step'), self._do_step_cb)
         menubuilder.make_menu_item(menu, _('Debug'), self._do_trace_cb)
         menubuilder.make_menu_item(menu, _('Stop'), self._do_stop_cb)
@@ -515,6 +528,8 @@ return %s(self)" % (p, P, P)
         for plugin in self.tw.turtleart_plugins:
             if hasattr(plugin, 'quit'):
                 plugin.quit()
+        # Finish writing any files that are being saved in the background
+        self.tw.snapshot_writer.flush()
         Gtk.main_quit()
         exit()
 
@@ -688,6 +703,23 @@ Would you like to save before quitting?'))
         self.tw.run_button(0, running_from_button_push=True)
         return
 
+    def _do_turbo_cb(self, widget):
+        ''' Callback for turbo run: run fast, without highlighting the
+        blocks (which stay shown) '''
+        self.tw.lc.trace = 0
+        self.tw.display_coordinates(clear=True)
+        self.tw.toolbar_shapes['stopiton'].set_layer(TAB_LAYER)
+        self.tw.run_button(0, running_from_button_push=True, turbo=True)
+        return
+
+    def _do_compiled_cb(self, widget):
+        ''' Callback for compiled run: run the blocks as Python code '''
+        self.tw.lc.trace = 0
+        self.tw.display_coordinates(clear=True)
+        self.tw.toolbar_shapes['stopiton'].set_layer(TAB_LAYER)
+        self.tw.run_button(0, running_from_button_push=True, compiled=True)
+        return
+
     def _do_step_cb(self, widget):
         ''' Callback for step button (turtle). '''
         self.tw.lc.trace = 1
@@ -905,13 +937,28 @@ Would you like to save before quitting?'))
 
     def _fill_samples_list(self, store):
         '''
-        Append images from the artwork_paths to the store.
+        Append images from the artwork_paths to the store, a few at a
+        time while idle, so that the icon view shows up right away.
         '''
-        for filepath in self._scan_for_samples():
-            pixbuf = None
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(
-                filepath, 100, 100)
+        if self._thumbnails is None:
+            self._thumbnails = ThumbnailCache(
+                os.path.join(CACHE_HOME, 'thumbnails-100.cache'), 100, 100)
+        GLib.idle_add(self._fill_samples_cb, store,
+                      iter(self._scan_for_samples()))
+
+    def _fill_samples_cb(self, store, samples):
+        start = time()
+        for filepath in samples:
+            try:
+                pixbuf = self._thumbnails.load(filepath)
+            except GLib.Error as e:
+                debug_output('could not load %s: %s' % (filepath, e))
+                continue
             store.append([pixbuf, filepath])
+            if time() - start > self._FILL_SAMPLES_BUDGET:
+                return True  # Continue when idle again
+        self._thumbnails.save()
+        return False
 
     def _scan_for_samples(self):
         samples = glob.glob(os.path.join(self._get_execution_dir(),
@@ -920,4 +967,8 @@ Would you like to save before quitting?'))
         return samples
 
 if __name__ == '__main__':
+    if len(argv) > 1 and argv[1] in ('-b', '--batch'):
+        # Render many projects without a display (see TurtleArt/tabatch.py)
+        from TurtleArt.tabatch import main
+        sys.exit(main(argv[2:]))
     TurtleMain()